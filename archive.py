@@ -0,0 +1,107 @@
+"""Архив сырых ответов источников: сегменты из gzip-записей и индекс
+
+Каждый ответ сжимается отдельным gzip-членом и дописывается в конец сегмента
+(segment-000001.gz, ...), поэтому сегмент остаётся обычным gzip-файлом и
+читается zcat. Индекс index.jsonl — строка JSON на ответ: источник, URL, время
+загрузки, сегмент, смещение, длина и признак truncated — записан не весь ответ,
+а только прочитанное до остановки. Данные и строка индекса пишутся одним
+write() в файлы с O_APPEND: несколько процессов могут писать в один архив,
+а обрыв посреди записи оставляет лишь недостижимый хвост сегмента.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+INDEX_NAME = 'index.jsonl'
+SEGMENT_NAME = re.compile(r'^segment-(\d{6})\.gz$')
+
+# truncated со значением по умолчанию: в старых индексах этого поля нет
+IndexEntry = namedtuple('IndexEntry', 'source url fetched_at segment offset length size truncated', defaults=(False,))
+Record = namedtuple('Record', 'source url fetched_at body truncated', defaults=(False,))
+
+def _segment_name(number):
+    return f"segment-{number:06d}.gz"
+
+class PayloadArchive:
+    """Дописывает ответы в текущий сегмент, новый сегмент — после segment_bytes"""
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, level=6):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.level = level
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        numbers = [int(m.group(1)) for m in map(SEGMENT_NAME.match, os.listdir(directory)) if m]
+        self._number = max(numbers, default=1)
+        self._segment = None
+        self._index = os.open(os.path.join(directory, INDEX_NAME), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _segment_fd(self):
+        """Дескриптор текущего сегмента, при переполнении — следующего"""
+        if self._segment is not None and os.fstat(self._segment).st_size < self.segment_bytes:
+            return self._segment
+        if self._segment is not None:
+            os.close(self._segment)
+            self._number += 1
+        path = os.path.join(self.directory, _segment_name(self._number))
+        self._segment = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._segment
+
+    def append(self, source, url, body, fetched_at=None, truncated=False):
+        """Сжимает и дописывает ответ; возвращает запись индекса"""
+        fetched_at = fetched_at or datetime.utcnow()
+        data = gzip.compress(body, compresslevel=self.level, mtime=0)
+        with self._lock:
+            fd = self._segment_fd()
+            os.write(fd, data)
+            # O_APPEND: наши байты легли прямо перед текущей позицией
+            offset = os.lseek(fd, 0, os.SEEK_CUR) - len(data)
+            entry = IndexEntry(source, url, fetched_at.isoformat(), _segment_name(self._number),
+                               offset, len(data), len(body), truncated)
+            os.write(self._index, (json.dumps(entry._asdict(), ensure_ascii=False) + '\n').encode())
+        return entry
+
+    def close(self):
+        """Закрывает файлы архива"""
+        with self._lock:
+            if self._segment is not None:
+                os.close(self._segment)
+                self._segment = None
+            os.close(self._index)
+
+def read_index(directory, sources=None, since=None, until=None):
+    """Записи индекса по источникам и интервалу времени, в порядке записи"""
+    entries = []
+    with open(os.path.join(directory, INDEX_NAME), encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = IndexEntry(**json.loads(line))
+            except (ValueError, TypeError):
+                # Строка, оборванная при падении процесса
+                continue
+            fetched_at = datetime.fromisoformat(entry.fetched_at)
+            if sources and entry.source not in sources:
+                continue
+            if (since and fetched_at < since) or (until and fetched_at >= until):
+                continue
+            entries.append(entry._replace(fetched_at=fetched_at))
+    return entries
+
+def iter_records(directory, entries):
+    """Распакованные ответы для записей индекса"""
+    files = {}
+    try:
+        for entry in entries:
+            f = files.get(entry.segment)
+            if f is None:
+                f = files[entry.segment] = open(os.path.join(directory, entry.segment), 'rb')
+            f.seek(entry.offset)
+            yield Record(entry.source, entry.url, entry.fetched_at, gzip.decompress(f.read(entry.length)),
+                         entry.truncated)
+    finally:
+        for f in files.values():
+            f.close()
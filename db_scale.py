@@ -0,0 +1,350 @@
+"""Масштабирование БД: синтетическая история на 10k/1M/10M игр и замеры хелперов и маршрутов
+
+Для каждого масштаба отдельный процесс заполняет `games`, `statistics` и
+`settings` правдоподобными данными (доли источников, свежие игры чаще старых,
+цены с длинным хвостом, статистика — четыре источника каждые 5 минут), затем
+меряет медиану каждого хелпера БД и каждого HTTP-маршрута. Итог — таблица
+«операция × число строк» с показателем роста: ~1 значит O(n).
+
+По умолчанию каждый масштаб — на своей временной базе SQLite. С --database-url
+(например, локальный PostgreSQL) таблицы `games`, `statistics` и `settings`
+этой базы очищаются — нужен флаг --reset.
+
+Пример:
+    python db_scale.py --scales 10000 1000000 10000000 --dir .
+    python db_scale.py --database-url postgresql://localhost/bench --reset --scales 10000 1000000
+"""
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import queue
+import random
+import statistics
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+# Доли источников и платформ в истории бота
+SOURCES = [('reddit', 0.60), ('dealabs', 0.20), ('steamdb', 0.15), ('epic', 0.05)]
+PLATFORMS = {
+    'reddit': [('steam', 0.55), ('epic', 0.15), ('gog', 0.10), ('itch', 0.10), ('unknown', 0.10)],
+    'dealabs': [('steam', 0.40), ('epic', 0.20), ('gog', 0.10), ('unknown', 0.30)],
+    'steamdb': [('steam', 1.0)],
+    'epic': [('epic', 1.0)],
+}
+TITLE_PREFIX = {'steam': '[Steam]', 'epic': '[Epic Games]', 'gog': '[GOG]', 'itch': '[itch.io]', 'unknown': '[Other]'}
+ADJECTIVES = [
+    'Dark', 'Lost', 'Ancient', 'Super', 'Tiny', 'Endless', 'Broken', 'Silent', 'Cosmic', 'Wild',
+    'Hidden', 'Final', 'Iron', 'Crystal', 'Neon', 'Frozen', 'Hollow', 'Rogue', 'Little', 'Red'
+]
+NOUNS = [
+    'Portal', 'Kingdom', 'Dungeon', 'Legends', 'Odyssey', 'Tactics', 'Survivor', 'Frontier', 'Garden', 'Empire',
+    'Knight', 'Station', 'Racer', 'Island', 'Quest', 'Shadows', 'Colony', 'Arena', 'Tower', 'Voyage',
+    'Dragon', 'Circuit', 'Harbor', 'Outpost', 'Realm', 'Citadel', 'Hunter', 'Galaxy', 'Factory', 'Mirror'
+]
+SUFFIXES = ['is free', '(Free to keep)', 'free weekend', '100% off', 'FREE', 'giveaway']
+
+# История: полупериод «свежести» и максимальная давность
+AGE_HALF_LIFE_DAYS = 120
+MAX_AGE_DAYS = 5 * 365
+# Статистика: четыре источника каждые 5 минут
+STATS_PER_DAY = 4 * 288
+# Сколько игр на одного пользователя с настройками
+GAMES_PER_USER = 100
+
+INSERT_BATCH = 10000
+
+def weighted(rng, choices):
+    """Случайный элемент по весам"""
+    x = rng.random()
+    for value, weight in choices:
+        x -= weight
+        if x <= 0:
+            return value
+    return choices[-1][0]
+
+def game_rows(main, rng, count, now, start=0):
+    """Пачки строк games: источник, платформа, давность и цена по распределениям"""
+    decay = math.log(2) / AGE_HALF_LIFE_DAYS
+    rows = []
+    for i in range(start, start + count):
+        source = weighted(rng, SOURCES)
+        platform = weighted(rng, PLATFORMS[source])
+        age = min(rng.expovariate(decay), MAX_AGE_DAYS)
+        # Около трети раздач — изначально бесплатные игры, остальные — лог-нормальная цена
+        price = 0.0 if rng.random() < 0.3 else round(min(rng.lognormvariate(2.5, 0.8), 120.0), 2)
+        title = f"{TITLE_PREFIX[platform]} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i} {rng.choice(SUFFIXES)}"
+        item_id = f"url:example.com/{source}/{i}"
+        rows.append({
+            'item_id': item_id,
+            'item_key': main.item_key(item_id),
+            'title': title,
+            'link': f"https://example.com/{source}/{i}",
+            'source': source,
+            'platform': platform,
+            'price_before': price,
+            'found_at': now - timedelta(days=age),
+            'sent': True
+        })
+        if len(rows) == INSERT_BATCH:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+def stats_rows(rng, count, now):
+    """Пачки строк statistics: одна на проверку источника, от новых к старым"""
+    sources = [source for source, _ in SOURCES]
+    rows = []
+    for i in range(count):
+        found = rng.choices((0, 1, 2, 3), weights=(85, 10, 3, 2))[0]
+        rows.append({
+            'date': now - timedelta(days=i / STATS_PER_DAY),
+            'source': sources[i % len(sources)],
+            'games_found': found,
+            'checks': 1
+        })
+        if len(rows) == INSERT_BATCH:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+def settings_rows(rng, count):
+    """Строки settings: большинство с настройками по умолчанию"""
+    return [{
+        'user_id': str(100000 + i),
+        'platforms': 'all' if rng.random() < 0.7 else rng.choice(['steam', 'epic', 'gog', 'steam,epic']),
+        'regions': 'all',
+        'min_price': 0.0 if rng.random() < 0.8 else rng.choice([5.0, 10.0, 20.0, 50.0]),
+        'notifications': rng.random() < 0.9,
+        'instant': True
+    } for i in range(count)]
+
+def reset_tables(main):
+    """Очищает заполняемые таблицы"""
+    with main.write_transaction() as conn:
+        for model in (main.Game, main.Statistics, main.UserSettings):
+            conn.execute(model.__table__.delete())
+
+def generate(main, rows, seed=1):
+    """Заполняет games, statistics и settings; возвращает секунды"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    for table, batches in (
+        (main.Game.__table__, game_rows(main, rng, rows, now)),
+        (main.Statistics.__table__, stats_rows(rng, rows, now)),
+        (main.UserSettings.__table__, [settings_rows(rng, max(10, rows // GAMES_PER_USER))]),
+    ):
+        for batch in batches:
+            with main.write_transaction() as conn:
+                conn.execute(table.insert(), batch)
+
+    with main.write_transaction() as conn:
+        conn.exec_driver_sql('ANALYZE')
+    return time.perf_counter() - started
+
+
+# ========================================
+# ЗАМЕРЫ
+# ========================================
+
+class Rollback(Exception):
+    """Откатывает единицу работы после замера"""
+
+def timed(func, repeat):
+    """Медиана времени вызова, мс"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 2)
+
+def rolled_back(main, func):
+    """Вызов внутри единицы работы, которая затем откатывается"""
+    def run():
+        try:
+            with main.unit_of_work():
+                func()
+                raise Rollback()
+        except Rollback:
+            pass
+    return run
+
+def middle_cursor(main, rows):
+    """Курсор страницы из середины истории"""
+    games = main.Game.__table__
+    with main.read_engine.connect() as conn:
+        row = conn.execute(
+            select(games.c.found_at, games.c.id).order_by(games.c.found_at, games.c.id).offset(rows // 2).limit(1)
+        ).first()
+    return main.encode_cursor(row.found_at, row.id) if row else ''
+
+def helper_cases(main, rows):
+    """Хелперы БД: (название, вызов, повторов; None — --repeat)"""
+    counter = iter(range(10 ** 9))
+    cursor = middle_cursor(main, rows)
+    user_id = str(100000 + max(10, rows // GAMES_PER_USER) // 2)
+    return [
+        ('game_exists (есть)', lambda: main.game_exists(f"url:example.com/reddit/{rows // 2}"), None),
+        ('game_exists (нет)', lambda: main.game_exists('url:example.com/missing'), None),
+        ('add_game', lambda: main.add_game(
+            f"url:example.com/bench/{next(counter)}", 'Bench game', 'https://example.com/bench', 'reddit', 'steam'
+        ), None),
+        ('get_user_settings', lambda: main.get_user_settings(user_id), None),
+        ('get_statistics(7)', lambda: main.get_statistics(7), None),
+        ('get_recent_games(10)', lambda: main.get_recent_games(10), None),
+        ('query_recent_games(10)', lambda: main.query_recent_games(10), None),
+        ('get_total_games', main.get_total_games, None),
+        ('count_games', main.count_games, None),
+        ('list_games', lambda: main.list_games(limit=50), None),
+        ('list_games (середина)', lambda: main.list_games(limit=50, cursor=cursor), None),
+        ('search_games (редкое)', lambda: main.search_games('citadel hunter'), None),
+        ('search_games (частое)', lambda: main.search_games('free'), None),
+        ('game_store.hydrate', main.game_store.hydrate, None),
+        ('clear_database (откат)', rolled_back(main, main.clear_database), 1),
+    ]
+
+def route_cases(main, rows, export_limit):
+    """HTTP-маршруты через тестовый клиент Flask"""
+    client = main.app.test_client()
+    cursor = middle_cursor(main, rows)
+
+    def get(path):
+        def run():
+            response = client.get(path)
+            # Потоковые ответы дочитываем до конца
+            response.get_data()
+            assert response.status_code == 200, (path, response.status_code)
+        return run
+
+    cases = [
+        ('GET /', get('/'), None),
+        ('GET /health', get('/health'), None),
+        ('GET /api/stats', get('/api/stats'), None),
+        ('GET /api/games', get('/api/games'), None),
+        ('GET /api/games?cursor=', get(f'/api/games?cursor={cursor}'), None),
+        ('GET /api/search?q=free', get('/api/search?q=free'), None),
+    ]
+    if rows <= export_limit:
+        cases.append(('GET /api/games/export', get('/api/games/export'), 1))
+    return cases
+
+def run_scale(rows, args, database_url, results):
+    """Один масштаб: заполнение базы и замеры; отчёт уходит и при ошибке"""
+    os.environ.update({'DATABASE_URL': database_url, 'TRACE_ENABLED': '0', 'CHAT_ID': '100500'})
+    report = {'rows': rows, 'error': None}
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        import main
+        if args.reset:
+            reset_tables(main)
+        generate_seconds = generate(main, rows, args.seed)
+        main.game_store.hydrate()
+
+        report.update({'backend': main.engine.dialect.name,
+                       'generate_s': round(generate_seconds, 1), 'ms': {}})
+        if not args.generate_only:
+            for name, func, repeat in helper_cases(main, rows) + route_cases(main, rows, args.export_limit):
+                func()
+                report['ms'][name] = timed(func, repeat or args.repeat)
+    except Exception:
+        report['error'] = traceback.format_exc()
+    finally:
+        sys.stdout = stdout
+        results.put(report)
+
+def wait_report(process, results):
+    """Отчёт дочернего процесса; None — процесс умер, не отправив отчёт"""
+    while True:
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                # Отчёт мог попасть в очередь перед самым выходом
+                try:
+                    return results.get(timeout=1)
+                except queue.Empty:
+                    return None
+
+def short(rows):
+    """10000 -> 10k"""
+    for unit, size in (('M', 10 ** 6), ('k', 10 ** 3)):
+        if rows >= size and rows % size == 0:
+            return f"{rows // size}{unit}"
+    return str(rows)
+
+def growth(reports, name):
+    """Показатель роста времени от числа строк: 0 — константа, 1 — линейно"""
+    points = [(r['rows'], r['ms'][name]) for r in reports if name in r['ms']]
+    if len(points) < 2:
+        return None
+    (n1, t1), (n2, t2) = points[0], points[-1]
+    return round(math.log(max(t2, 0.01) / max(t1, 0.01)) / math.log(n2 / n1), 2)
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='Масштабирование БД: заполнение и замеры хелперов и маршрутов')
+    parser.add_argument('--scales', type=int, nargs='+', default=[10000, 1000000, 10000000], help='число игр')
+    parser.add_argument('--database-url', help='база для замеров (по умолчанию — временная SQLite на масштаб)')
+    parser.add_argument('--reset', action='store_true', help='очистить games, statistics и settings в --database-url')
+    parser.add_argument('--dir', help='каталог для временных баз SQLite')
+    parser.add_argument('--repeat', type=int, default=5, help='повторов на замер (медиана)')
+    parser.add_argument('--export-limit', type=int, default=1000000, help='до скольких строк мерить выгрузку')
+    parser.add_argument('--seed', type=int, default=1, help='seed генератора')
+    parser.add_argument('--generate-only', action='store_true', help='только заполнить --database-url')
+    parser.add_argument('--json', action='store_true', help='отчёт в JSON')
+    args = parser.parse_args(argv)
+
+    if args.database_url and not args.reset:
+        parser.error('--database-url очищает таблицы games, statistics и settings: добавьте --reset')
+    if args.generate_only and not args.database_url:
+        parser.error('--generate-only заполняет --database-url')
+
+    ctx = mp.get_context('spawn')
+    reports = []
+    for rows in sorted(args.scales):
+        database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(dir=args.dir), 'scale.db')}"
+        results = ctx.Queue()
+        process = ctx.Process(target=run_scale, args=(rows, args, database_url, results))
+        process.start()
+        report = wait_report(process, results)
+        process.join()
+        if report is None or report['error'] or process.exitcode:
+            detail = report['error'] if report else f"процесс завершился с кодом {process.exitcode}"
+            print(f"❌ {short(rows)}: замер не удался\n{detail}", file=sys.stderr)
+            sys.exit(1)
+        reports.append(report)
+        if not args.json:
+            print(f"📦 {short(rows)}: заполнено за {reports[-1]['generate_s']} с", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False))
+        return
+    if args.generate_only:
+        return
+
+    names = list(reports[-1]['ms'])
+    width = 28 + 12 * len(reports) + 10
+    print("=" * width)
+    print(f"📈 Масштабирование БД ({reports[0]['backend']}), медиана в мс")
+    print("=" * width)
+    print(f"{'':28}" + ''.join(f"{short(r['rows']):>12}" for r in reports) + f"{'рост':>10}")
+    for name in names:
+        exponent = growth(reports, name)
+        mark = '' if exponent is None else f"{exponent:>8}" + (' ⚠️' if exponent >= 0.5 else '')
+        cells = ''.join(f"{r['ms'].get(name, '—')!s:>12}" for r in reports)
+        print(f"{name:28}{cells}  {mark}")
+    print("=" * width)
+    print("рост — показатель степени между крайними масштабами: 0 — не зависит от числа строк, 1 — O(n)")
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,115 @@
+"""Локальная заглушка Steam Store API (appdetails/packagedetails) для тестов обогащения"""
+import json
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qsl, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeStore:
+    """Отдаёт цены из словарей apps/subs (id -> центы) и считает запросы"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, apps=None, subs=None):
+        self.latency = latency
+        self.apps = dict(apps or {})
+        self.subs = dict(subs or {})
+        self.calls = Counter()
+        self.ids = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """Адрес для STORE_API"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Запускает сервер в фоновом потоке"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-store', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает сервер"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def total_calls(self):
+        """Сколько раз вызывали API"""
+        with self._lock:
+            return sum(self.calls.values())
+
+    def _details(self, prices, ids, price_key):
+        """Ответ в формате Steam: неизвестный id — success: false, цена 0 — без блока цены"""
+        result = {}
+        for store_id in ids:
+            if store_id not in prices:
+                result[store_id] = {'success': False}
+            elif not prices[store_id]:
+                result[store_id] = {'success': True, 'data': []}
+            else:
+                cents = prices[store_id]
+                result[store_id] = {'success': True, 'data': {price_key: {
+                    'currency': 'USD', 'initial': cents, 'final': cents, 'discount_percent': 0
+                }}}
+        return result
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                method = parts.path.rsplit('/', 1)[-1]
+                params = dict(parse_qsl(parts.query))
+
+                if method == 'appdetails':
+                    ids = params.get('appids', '').split(',')
+                    result = fake._details(fake.apps, ids, 'price_overview')
+                elif method == 'packagedetails':
+                    ids = params.get('packageids', '').split(',')
+                    result = fake._details(fake.subs, ids, 'price')
+                else:
+                    ids, result = [], None
+
+                with fake._lock:
+                    fake.calls[method] += 1
+                    fake.ids.update(ids)
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                body = json.dumps(result).encode()
+                self.send_response(200 if result is not None else 404)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа, сек')
+    parser.add_argument('--app', action='append', default=[], metavar='ID=ЦЕНТЫ', help='цена приложения')
+    parser.add_argument('--sub', action='append', default=[], metavar='ID=ЦЕНТЫ', help='цена пакета')
+    args = parser.parse_args()
+
+    apps = dict((k, int(v)) for k, v in (item.split('=', 1) for item in args.app))
+    subs = dict((k, int(v)) for k, v in (item.split('=', 1) for item in args.sub))
+    fake = FakeStore(port=args.port, latency=args.latency, apps=apps, subs=subs)
+    print(f"🛒 Fake Steam Store: {fake.url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
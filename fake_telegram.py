@@ -0,0 +1,125 @@
+"""Локальная заглушка Telegram Bot API для нагрузочных тестов"""
+import json
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qsl, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _Server(ThreadingHTTPServer):
+    # Очередь соединений как у настоящего сервера: при параллельных запросах
+    # бота стандартные 5 переполняются и connect ждёт повтора SYN
+    daemon_threads = True
+    request_queue_size = 128
+
+class FakeTelegram:
+    """Отвечает {"ok": true} на любые методы и считает вызовы"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.updates = []
+        self._lock = threading.Lock()
+        self._arrived = threading.Condition(self._lock)
+        self._server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        """Адрес для TELEGRAM_API"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Запускает сервер в фоновом потоке"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-telegram', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает сервер"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def push_updates(self, updates):
+        """Кладёт апдейты в очередь getUpdates"""
+        with self._arrived:
+            self.updates.extend(updates)
+            self._arrived.notify_all()
+
+    def total_calls(self):
+        """Сколько раз вызывали API"""
+        with self._lock:
+            return sum(self.calls.values())
+
+    def _get_updates(self, params):
+        """getUpdates: апдейты с update_id >= offset, не больше limit; пусто — ждёт до timeout"""
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + float(params.get('timeout') or 0)
+        with self._arrived:
+            while True:
+                # Подтверждённые апдейты Telegram больше не отдаёт
+                self.updates = [u for u in self.updates if u['update_id'] >= offset]
+                remaining = deadline - time.monotonic()
+                if self.updates or remaining <= 0:
+                    return self.updates[:limit]
+                self._arrived.wait(remaining)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                method = self.path.rsplit('/', 1)[-1].split('?', 1)[0]
+
+                with fake._lock:
+                    fake.calls[method] += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                result = True
+                if method == 'getUpdates':
+                    params = dict(parse_qsl(urlsplit(self.path).query))
+                    if raw:
+                        try:
+                            params.update(json.loads(raw))
+                        except ValueError:
+                            params.update(parse_qsl(raw.decode()))
+                    result = fake._get_updates(params)
+                elif method in ('sendMessage', 'editMessageText'):
+                    result = {'message_id': 1, 'date': int(time.time())}
+
+                body = json.dumps({'ok': True, 'result': result}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа, сек')
+    args = parser.parse_args()
+
+    fake = FakeTelegram(port=args.port, latency=args.latency)
+    print(f"🤖 Fake Telegram: {fake.url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,210 @@
+"""Нагрузочный тест /webhook: воспроизводит апдейты Telegram и меряет задержки
+
+Пример:
+    python loadtest.py --rate 50 --concurrency 16 --duration 30
+    python loadtest.py --database-url postgresql://localhost/bot --corpus updates.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from fake_telegram import FakeTelegram
+
+CHAT_ID = '100500'
+
+# ========================================
+# КОРПУС АПДЕЙТОВ
+# ========================================
+
+# Команды, которые запускают проверку источников (сеть), в корпус не входят
+SKIP_TEXTS = {'/check', '🔍 Проверить'}
+SKIP_CALLBACKS = {'confirm_clear'}
+
+def synthetic_corpus(main, size):
+    """Апдейты из кнопок главной клавиатуры, команд и callback-кнопок"""
+    texts = [button['text'] for row in main.get_main_keyboard()['keyboard'] for button in row]
+    texts += ['/start', '/help', '/stats', '/recent', '/search free', '/search portal platform:steam']
+    texts = [t for t in texts if t not in SKIP_TEXTS]
+    callbacks = ['plat_steam', 'plat_epic', 'plat_all', 'toggle_notif', 'settings_done', 'cancel_clear', 'menu_price']
+
+    corpus = []
+    for i in range(size):
+        if random.random() < 0.6:
+            corpus.append({
+                'update_id': i,
+                'message': {
+                    'message_id': i,
+                    'chat': {'id': int(CHAT_ID), 'type': 'private'},
+                    'text': random.choice(texts)
+                }
+            })
+        else:
+            corpus.append({
+                'update_id': i,
+                'callback_query': {
+                    'id': str(i),
+                    'data': random.choice(callbacks),
+                    'message': {'message_id': i, 'chat': {'id': int(CHAT_ID)}}
+                }
+            })
+    return corpus
+
+def load_corpus(path):
+    """Записанные апдейты: по одному JSON на строку"""
+    corpus = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            update = json.loads(line)
+            text = update.get('message', {}).get('text')
+            data = update.get('callback_query', {}).get('data')
+            if text in SKIP_TEXTS or data in SKIP_CALLBACKS:
+                continue
+            corpus.append(update)
+    return corpus
+
+# ========================================
+# ЗАПУСК
+# ========================================
+
+def percentile(values, p):
+    """Перцентиль отсортированного списка"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+def start_app(main, port):
+    """Поднимает Flask-приложение бота на локальном порту"""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', port, main.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='webhook-server', daemon=True).start()
+    return server
+
+def count_queries(main):
+    """Счётчик SQL-запросов движка бота"""
+    from sqlalchemy import event
+
+    counter = {'queries': 0}
+    lock = threading.Lock()
+
+    @event.listens_for(main.engine, 'before_cursor_execute')
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        with lock:
+            counter['queries'] += 1
+
+    return counter
+
+def run(args):
+    fake = FakeTelegram(latency=args.telegram_latency).start()
+
+    # Бот читает настройки при импорте
+    os.environ['TELEGRAM_API'] = fake.url
+    os.environ['TOKEN'] = 'loadtest'
+    os.environ['CHAT_ID'] = CHAT_ID
+    os.environ['TRACE_ENABLED'] = '0'
+    # Рабочую базу из DATABASE_URL не трогаем: только явно переданную --database-url
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'loadtest.db')}"
+
+    import main
+
+    server = start_app(main, args.port)
+    url = f"http://127.0.0.1:{server.server_port}/webhook"
+    counter = count_queries(main)
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(main, 1000)
+    total = args.count or int(args.rate * args.duration)
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    http = requests.Session()
+    http.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+    def send(update):
+        nonlocal errors
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = http.post(url, json=update, timeout=30)
+            ok = response.status_code == 200 and response.json().get('ok') is True
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    queries_before = counter['queries']
+    calls_before = fake.total_calls()
+    started = time.perf_counter()
+
+    # Открытая модель: апдейты приходят с заданной частотой, независимо от ответов
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in range(total):
+            due = started + i / args.rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, corpus[i % len(corpus)])
+
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    fake.stop()
+
+    latencies.sort()
+    report = {
+        'database': main.engine.dialect.name,
+        'updates': total,
+        'rate_target': args.rate,
+        'throughput': round(total / elapsed, 1),
+        'concurrency': args.concurrency,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'db_queries_per_update': round((counter['queries'] - queries_before) / total, 2) if total else 0.0,
+        'telegram_calls_per_update': round((fake.total_calls() - calls_before) / total, 2) if total else 0.0
+    }
+    return report
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='Нагрузочный тест /webhook')
+    parser.add_argument('--database-url', help='БД бота (по умолчанию — временная SQLite; DATABASE_URL окружения не используется)')
+    parser.add_argument('--corpus', help='файл с апдейтами Telegram (JSON на строку)')
+    parser.add_argument('--rate', type=float, default=20, help='апдейтов в секунду')
+    parser.add_argument('--concurrency', type=int, default=8, help='параллельных соединений')
+    parser.add_argument('--duration', type=float, default=10, help='длительность, сек')
+    parser.add_argument('--count', type=int, help='число апдейтов (вместо --duration)')
+    parser.add_argument('--port', type=int, default=0, help='порт приложения (0 — любой свободный)')
+    parser.add_argument('--telegram-latency', type=float, default=0.0, help='задержка заглушки Telegram, сек')
+    parser.add_argument('--json', action='store_true', help='отчёт в JSON')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+    else:
+        print("=" * 50)
+        print("📊 НАГРУЗОЧНЫЙ ТЕСТ /webhook")
+        print("=" * 50)
+        for key, value in report.items():
+            print(f"{key:28} {value}")
+        print("=" * 50)
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -1,16 +1,35 @@
-import feedparser
 import requests
 import time
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from datetime import datetime, timedelta
 import threading
 import json
-from bs4 import BeautifulSoup
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Float, desc
+import re
+import sys
+import hmac
+import hashlib
+import functools
+import codecs
+import socket
+import base64
+import csv
+import io
+import html
+from html.parser import HTMLParser
+import multiprocessing
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, and_, or_, func, inspect, select, text, update, bindparam, Index, UniqueConstraint, Column, BigInteger, Integer, String, DateTime, Boolean, Float, desc
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from collections import defaultdict
+from collections import Counter, OrderedDict, defaultdict, deque, namedtuple
+from parsing import SteamDBRows, iter_feed_entries, parse_feed, parse_feed_date, parse_steamdb
+from archive import PayloadArchive
 
 # ========================================
 # НАСТРОЙКИ
@@ -18,24 +37,313 @@ from collections import defaultdict
 TOKEN = os.environ.get('TOKEN')
 CHAT_ID = os.environ.get('CHAT_ID')
 DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///games.db')
+# Адрес Bot API (для тестов — локальная заглушка)
+TELEGRAM_API = os.environ.get('TELEGRAM_API', 'https://api.telegram.org').rstrip('/')
+# Приём апдейтов: webhook — Telegram шлёт их на WEBHOOK_URL, polling — бот сам забирает getUpdates
+UPDATES_MODE = os.environ.get('UPDATES_MODE', 'webhook')
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', 'https://botiphone.onrender.com/webhook')
+UPDATES_LIMIT = int(os.environ.get('UPDATES_LIMIT', 100))
+UPDATES_TIMEOUT = int(os.environ.get('UPDATES_TIMEOUT', 30))
+
+# Ручная проверка переиспользует результат, если он свежее N секунд
+MANUAL_CHECK_FRESH = int(os.environ.get('MANUAL_CHECK_FRESH', 60))
+# Последних игр в памяти
+RECENT_GAMES_SIZE = int(os.environ.get('RECENT_GAMES_SIZE', 50))
+# Живая лента /api/stream
+SSE_HEARTBEAT = int(os.environ.get('SSE_HEARTBEAT', 15))
+SSE_BUFFER = int(os.environ.get('SSE_BUFFER', 100))
+SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', 500))
+# Срок аренды межпроцессной блокировки проверки
+SWEEP_LEASE_SECONDS = int(os.environ.get('SWEEP_LEASE_SECONDS', 1800))
+# Режим опроса: cycle — один поток проверяет всё, jobs — воркеры разбирают задания
+POLL_MODE = os.environ.get('POLL_MODE', 'cycle')
+POLL_INTERVAL = int(os.environ.get('POLL_INTERVAL', 300))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 120))
+# Срок жизни кэша последних игр (0 — без перезагрузки из БД); с воркерами
+# игры пишут другие процессы, и кэш веб-процесса без перезагрузки устаревает
+GAME_STORE_TTL = int(os.environ.get('GAME_STORE_TTL', 60 if POLL_MODE == 'jobs' else 0))
+# Очередь уведомлений
+OUTBOX_BATCH = int(os.environ.get('OUTBOX_BATCH', 20))
+OUTBOX_SEND_DELAY = float(os.environ.get('OUTBOX_SEND_DELAY', 2))
+OUTBOX_IDLE = int(os.environ.get('OUTBOX_IDLE', 30))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 10))
+OUTBOX_MAX_BACKOFF = int(os.environ.get('OUTBOX_MAX_BACKOFF', 3600))
+# Цены и метаданные магазинов
+STORE_API = os.environ.get('STORE_API', 'https://store.steampowered.com').rstrip('/')
+STORE_COUNTRY = os.environ.get('STORE_COUNTRY', 'us')
+ENRICH_BATCH = int(os.environ.get('ENRICH_BATCH', 50))
+ENRICH_CACHE_SIZE = int(os.environ.get('ENRICH_CACHE_SIZE', 2000))
+ENRICH_CACHE_TTL = int(os.environ.get('ENRICH_CACHE_TTL', 6 * 3600))
+# Трассировка циклов и профилирование
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', '0') == '1'
+TRACE_SLOW_SECONDS = float(os.environ.get('TRACE_SLOW_SECONDS', 120))
+TRACE_LOG = os.environ.get('TRACE_LOG')
+DEBUG_TOKEN = os.environ.get('DEBUG_TOKEN')
+# Сабреддитов в одном мультиреддит-запросе
+REDDIT_GROUP_SIZE = int(os.environ.get('REDDIT_GROUP_SIZE', 20))
+# Как часто сверять расписание раздач Epic (сек)
+EPIC_VERIFY_SECONDS = int(os.environ.get('EPIC_VERIFY_SECONDS', 8 * 3600))
+# Лимит тела ответа источника (байт после распаковки)
+FETCH_MAX_BYTES = int(os.environ.get('FETCH_MAX_BYTES', 2 * 1024 * 1024))
+# Процессов для разбора лент и страниц (0 — разбор в потоке опроса)
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', 0))
+# Архив сырых ответов источников для повтора (пусто — не пишем)
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR')
+ARCHIVE_SEGMENT_MB = int(os.environ.get('ARCHIVE_SEGMENT_MB', 64))
+# SQLite: WAL, пул читателей и ожидание блокировки (SQLITE_TUNED=0 — как раньше)
+SQLITE_TUNED = os.environ.get('SQLITE_TUNED', '1') == '1'
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 30000))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_READ_POOL = int(os.environ.get('SQLITE_READ_POOL', 8))
 
 # Исправление для PostgreSQL на Render
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# ========================================
+# ТРАССИРОВКА
+# ========================================
+
+_trace_local = threading.local()
+_trace_log_lock = threading.Lock()
+
+class Span:
+    """Узел дерева трассировки"""
+    __slots__ = ('name', 'attrs', 'start', 'duration', 'children', 'error')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.children = []
+        self.error = None
+
+    def to_dict(self):
+        """Полное дерево спана"""
+        node = {'name': self.name, 'ms': round(self.duration * 1000, 1)}
+        if self.attrs:
+            node['attrs'] = self.attrs
+        if self.error:
+            node['error'] = self.error
+        if self.children:
+            node['children'] = [child.to_dict() for child in self.children]
+        return node
+
+    def summary(self):
+        """Количество и суммарное время по именам вложенных спанов"""
+        totals = defaultdict(lambda: {'count': 0, 'ms': 0.0})
+        pending = list(self.children)
+        while pending:
+            node = pending.pop()
+            totals[node.name]['count'] += 1
+            totals[node.name]['ms'] += node.duration * 1000
+            pending.extend(node.children)
+        return {name: {'count': t['count'], 'ms': round(t['ms'], 1)} for name, t in totals.items()}
+
+@contextmanager
+def span(name, **attrs):
+    """Вложенный спан; вне трассировки ничего не делает"""
+    stack = getattr(_trace_local, 'stack', None)
+    if not stack:
+        yield None
+        return
+    
+    node = Span(name, attrs)
+    stack[-1].children.append(node)
+    stack.append(node)
+    try:
+        yield node
+    except Exception as e:
+        node.error = repr(e)
+        raise
+    finally:
+        node.duration = time.perf_counter() - node.start
+        stack.pop()
+
+@contextmanager
+def trace(name, **attrs):
+    """Корневой спан: по завершении пишет одну JSON-запись"""
+    if not TRACE_ENABLED or getattr(_trace_local, 'stack', None):
+        with span(name, **attrs) as node:
+            yield node
+        return
+    
+    root = Span(name, attrs)
+    _trace_local.stack = [root]
+    try:
+        yield root
+    except Exception as e:
+        root.error = repr(e)
+        raise
+    finally:
+        root.duration = time.perf_counter() - root.start
+        _trace_local.stack = None
+        write_trace(root)
+
+def traced(name):
+    """Декоратор: оборачивает вызов функции в спан"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not getattr(_trace_local, 'stack', None):
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def write_trace(root):
+    """Пишет запись трассировки; медленный цикл — с полным деревом"""
+    slow = root.duration >= TRACE_SLOW_SECONDS
+    record = {
+        'trace': root.name,
+        'at': datetime.utcnow().isoformat(),
+        'ms': round(root.duration * 1000, 1),
+        'slow': slow,
+        'attrs': root.attrs,
+        'error': root.error,
+        'top': {child.name: round(child.duration * 1000, 1) for child in root.children},
+        'spans': root.summary()
+    }
+    if slow:
+        record['tree'] = root.to_dict()
+    
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    if TRACE_LOG:
+        with _trace_log_lock, open(TRACE_LOG, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+    else:
+        print(line)
+    if slow:
+        print(f"🐢 Медленный цикл {root.name}: {record['ms']} мс")
+
+def sample_stacks(seconds, interval=0.005):
+    """Семплирующий профайлер всех потоков: свёрнутые стеки и счётчики"""
+    counts = Counter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    
+    return counts
+
 # ========================================
 # БАЗА ДАННЫХ
 # ========================================
 Base = declarative_base()
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-Session = sessionmaker(bind=engine)
+Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+_begin_mode = threading.local()
+
+def sqlite_file():
+    """Путь к файлу SQLite или None (не SQLite или база в памяти)"""
+    if engine.dialect.name != 'sqlite':
+        return None
+    database = engine.url.database
+    if not database or database == ':memory:' or database.startswith('file:'):
+        return None
+    return os.path.abspath(database)
+
+SQLITE_FILE = sqlite_file()
+sqlite_tuned = SQLITE_TUNED and SQLITE_FILE is not None
+
+def _sqlite_pragmas(dbapi_connection, readonly=False):
+    """Настройки соединения для режима SQLITE_TUNED"""
+    cursor = dbapi_connection.cursor()
+    if not readonly:
+        # WAL: читатели не ждут писателя, коммит не ждёт читателей
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # В WAL безопасно: теряются только последние коммиты при сбое питания
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+if DATABASE_URL.startswith('sqlite'):
+    # pysqlite сам управляет транзакциями и ломает SAVEPOINT —
+    # отдаём BEGIN под контроль SQLAlchemy
+    @event.listens_for(engine, "connect")
+    def _sqlite_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        if sqlite_tuned:
+            _sqlite_pragmas(dbapi_connection)
+
+    @event.listens_for(engine, "begin")
+    def _sqlite_begin(conn):
+        # Пишущая транзакция сразу берёт блокировку записи: апгрейд читающего
+        # снимка SQLite отклоняет без ожидания («database is locked»)
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if getattr(_begin_mode, 'immediate', 0) else "BEGIN")
+
+def _sqlite_read_connection():
+    """Соединение только для чтения; если mode=ro не открывается — обычное с query_only"""
+    connection = sqlite3.connect(f"file:{SQLITE_FILE}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        # Файлы -wal/-shm открываются при первом чтении: без них (и без права
+        # их создать) соединение mode=ro падает здесь, а не на запросе
+        connection.execute("PRAGMA schema_version").fetchone()
+        return connection
+    except sqlite3.OperationalError as e:
+        connection.close()
+        print(f"⚠️ SQLite только для чтения недоступен ({e}), читаю обычным соединением")
+    connection = sqlite3.connect(SQLITE_FILE, check_same_thread=False)
+    connection.execute("PRAGMA query_only=ON")
+    return connection
+
+if sqlite_tuned:
+    # Пул только для чтения: веб-запросы не занимают соединения писателей
+    read_engine = create_engine(
+        f"sqlite:///{SQLITE_FILE}",
+        creator=_sqlite_read_connection,
+        pool_size=SQLITE_READ_POOL,
+        max_overflow=SQLITE_READ_POOL
+    )
+
+    @event.listens_for(read_engine, "connect")
+    def _sqlite_read_connect(dbapi_connection, connection_record):
+        _sqlite_pragmas(dbapi_connection, readonly=True)
+else:
+    read_engine = engine
+
+ReadSession = sessionmaker(bind=read_engine, expire_on_commit=False)
+
+@contextmanager
+def immediate_writes():
+    """Транзакции SQLite, начатые внутри блока, сразу берут блокировку записи"""
+    depth = getattr(_begin_mode, 'immediate', 0)
+    _begin_mode.immediate = depth + 1
+    try:
+        yield
+    finally:
+        _begin_mode.immediate = depth
+
+@contextmanager
+def write_transaction():
+    """engine.begin() для транзакции, которая будет писать"""
+    with immediate_writes(), engine.begin() as conn:
+        yield conn
 
 class Game(Base):
     """Модель игры"""
     __tablename__ = 'games'
     
     id = Column(Integer, primary_key=True)
-    item_id = Column(String, unique=True, nullable=False)
+    # Канонический ключ в читаемом виде и его 64-битный хеш для уникального индекса
+    item_id = Column(String, nullable=False)
+    item_key = Column(BigInteger, nullable=True)
     title = Column(String, nullable=False)
     link = Column(String, nullable=False)
     source = Column(String, nullable=False)
@@ -43,6 +351,26 @@ class Game(Base):
     price_before = Column(Float, default=0.0)
     found_at = Column(DateTime, default=datetime.utcnow)
     sent = Column(Boolean, default=False)
+    
+    __table_args__ = (
+        # Курсорная пагинация по (found_at, id)
+        Index('ix_games_found_at_id', 'found_at', 'id'),
+        Index('ux_games_item_key', 'item_key', unique=True),
+    )
+
+class DroppedGame(Base):
+    """Игра, удалённая миграцией ключей как дубль другой"""
+    __tablename__ = 'games_dropped'
+    
+    id = Column(Integer, primary_key=True)
+    item_id = Column(String, nullable=False)
+    title = Column(String, nullable=False)
+    link = Column(String, nullable=False)
+    source = Column(String, nullable=False)
+    platform = Column(String, nullable=True)
+    found_at = Column(DateTime, nullable=True)
+    duplicate_of = Column(Integer, nullable=False)
+    dropped_at = Column(DateTime, default=datetime.utcnow)
 
 class UserSettings(Base):
     """Настройки пользователя"""
@@ -66,9 +394,75 @@ class Statistics(Base):
     games_found = Column(Integer, default=0)
     checks = Column(Integer, default=0)
 
+class Lease(Base):
+    """Межпроцессная блокировка и последний результат операции"""
+    __tablename__ = 'leases'
+    
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+    result = Column(Integer, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class FeedMark(Base):
+    """Отметка последней обработанной записи ленты"""
+    __tablename__ = 'feed_marks'
+    
+    feed = Column(String, primary_key=True)
+    entry_id = Column(String, nullable=True)
+    published = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class PollJob(Base):
+    """Задание распределённого опроса: источник и его URL"""
+    __tablename__ = 'poll_jobs'
+    
+    id = Column(Integer, primary_key=True)
+    source = Column(String, nullable=False)
+    target = Column(String, nullable=False)
+    interval = Column(Integer, default=300)
+    enabled = Column(Boolean, default=True)
+    next_run_at = Column(DateTime, default=datetime.utcnow)
+    lease_holder = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    runs = Column(Integer, default=0)
+    
+    __table_args__ = (
+        UniqueConstraint('source', 'target'),
+        Index('ix_poll_jobs_due', 'enabled', 'next_run_at'),
+    )
+
+class Notification(Base):
+    """Исходящее уведомление об игре (transactional outbox)"""
+    __tablename__ = 'outbox'
+    
+    id = Column(Integer, primary_key=True)
+    game_id = Column(Integer, nullable=True)
+    chat_id = Column(String, nullable=False)
+    text = Column(String, nullable=False)
+    reply_markup = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    lease_holder = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_outbox_due', 'next_attempt_at'),
+    )
+
 # Создаём таблицы
 try:
     Base.metadata.create_all(engine)
+    # create_all не добавляет колонки и индексы в уже существующие таблицы
+    if 'item_key' not in {column['name'] for column in inspect(engine).get_columns('games')}:
+        with write_transaction() as conn:
+            conn.execute(text("ALTER TABLE games ADD COLUMN item_key BIGINT"))
+    for index in Game.__table__.indexes:
+        index.create(engine, checkfirst=True)
     print("✅ База данных подключена!")
 except Exception as e:
     print(f"❌ Ошибка БД: {e}")
@@ -77,98 +471,315 @@ except Exception as e:
 # ФУНКЦИИ БД
 # ========================================
 
-def add_game(item_id, title, link, source, platform='unknown', price=0.0):
-    """Добавляет игру в БД"""
-    session = Session()
-    try:
-        exists = session.query(Game).filter_by(item_id=item_id).first()
-        if exists:
-            return False
+_uow_local = threading.local()
+_metrics_lock = threading.Lock()
+
+db_metrics = {
+    'commits': 0,
+    'last_cycle_commits': 0
+}
+
+def _count_commit():
+    """Учитывает коммит в метриках"""
+    with _metrics_lock:
+        db_metrics['commits'] += 1
+    uow = current_unit_of_work()
+    if uow is not None:
+        uow.commits += 1
+
+class UnitOfWork:
+    """Единица работы: одна сессия и один коммит на цикл или апдейт"""
+
+    def __init__(self):
+        self.session = Session()
+        self.pending_stats = []
+        self.settings_cache = {}
+        self.after_commit = []
+        self.commits = 0
+        self.writing = False
+
+    def begin_write(self):
+        """Переводит сессию в пишущую транзакцию (SQLite — BEGIN IMMEDIATE)"""
+        if self.writing:
+            return
+        self.writing = True
+        if engine.dialect.name != 'sqlite':
+            return
+        session = self.session
+        if session.in_transaction():
+            # Закрываем читающий снимок: он мог устареть, пока мы читали
+            session.commit()
+        with immediate_writes():
+            session.connection()
+
+    def flush_pending(self):
+        """Сбрасывает отложенные записи в сессию"""
+        if self.pending_stats:
+            self.session.add_all([
+                Statistics(source=source, games_found=games_found, checks=checks)
+                for source, games_found, checks in self.pending_stats
+            ])
+            self.pending_stats = []
+
+    def has_changes(self):
+        """Есть ли записи для коммита; читающая транзакция не в счёт"""
+        session = self.session
+        return bool(self.pending_stats or session.new or session.dirty
+                    or session.deleted or self.writing)
+
+    def commit(self):
+        """Промежуточный коммит: снимает блокировки записи до конца работы"""
+        if self.pending_stats:
+            self.begin_write()
+        self.flush_pending()
+        changed = self.has_changes()
+        if self.session.in_transaction():
+            # Читающий снимок тоже закрываем, но коммитом в метриках его не считаем
+            self.session.commit()
+            if changed:
+                _count_commit()
+        self.writing = False
         
-        game = Game(
-            item_id=item_id,
-            title=title,
-            link=link,
-            source=source,
-            platform=platform,
-            price_before=price
-        )
-        session.add(game)
-        session.commit()
-        return True
+        callbacks, self.after_commit = self.after_commit, []
+        for callback in callbacks:
+            _run_callback(callback)
+
+def _run_callback(callback):
+    """Выполняет отложенный callback, не роняя вызывающего"""
+    try:
+        callback()
     except Exception as e:
-        print(f"❌ Ошибка добавления игры: {e}")
-        session.rollback()
-        return False
+        print(f"❌ Ошибка callback: {e}")
+
+def on_commit(callback):
+    """Выполняет callback после коммита единицы работы (или сразу)"""
+    uow = current_unit_of_work()
+    if uow is None:
+        _run_callback(callback)
+    else:
+        uow.after_commit.append(callback)
+
+def current_unit_of_work():
+    """Текущая единица работы потока (или None)"""
+    return getattr(_uow_local, 'uow', None)
+
+def end_transaction():
+    """Коммитит единицу работы перед сетевым запросом: транзакция не ждёт сеть"""
+    uow = current_unit_of_work()
+    if uow is None or uow.session.in_nested_transaction():
+        return
+    if uow.has_changes() or uow.session.in_transaction():
+        uow.commit()
+
+@contextmanager
+def unit_of_work():
+    """Открывает единицу работы; вложенные вызовы переиспользуют внешнюю"""
+    uow = current_unit_of_work()
+    if uow is not None:
+        yield uow
+        return
+
+    uow = UnitOfWork()
+    _uow_local.uow = uow
+    try:
+        yield uow
+        uow.commit()
+    except Exception:
+        uow.after_commit = []
+        uow.session.rollback()
+        raise
     finally:
-        session.close()
+        _uow_local.uow = None
+        uow.session.close()
+        with _metrics_lock:
+            db_metrics['last_cycle_commits'] = uow.commits
+
+@contextmanager
+def db_session(write=False):
+    """Сессия текущей единицы работы или отдельная короткая сессия"""
+    uow = current_unit_of_work()
+    if uow is not None:
+        if write:
+            uow.begin_write()
+            # SAVEPOINT: ошибка одной записи не ломает весь цикл
+            with uow.session.begin_nested():
+                yield uow.session
+        else:
+            yield uow.session
+        return
 
-def game_exists(item_id):
-    """Проверяет существование игры"""
     session = Session()
     try:
-        exists = session.query(Game).filter_by(item_id=item_id).first()
-        return exists is not None
+        if write:
+            with immediate_writes():
+                yield session
+                session.commit()
+            _count_commit()
+        else:
+            yield session
+    except Exception:
+        session.rollback()
+        raise
     finally:
         session.close()
 
-def get_user_settings(user_id):
-    """Получает настройки пользователя"""
-    session = Session()
+@contextmanager
+def read_session():
+    """Сессия для чтения: в единице работы — её, иначе из пула читателей"""
+    uow = current_unit_of_work()
+    if uow is not None:
+        yield uow.session
+        return
+    
+    session = ReadSession()
     try:
-        settings = session.query(UserSettings).filter_by(user_id=str(user_id)).first()
-        if not settings:
-            settings = UserSettings(user_id=str(user_id))
-            session.add(settings)
-            session.commit()
-            session.refresh(settings)
-        return settings
+        yield session
     finally:
         session.close()
 
+@traced('db.add_game')
+def add_game(item_id, title, link, source, platform='unknown', price=0.0, notify=None):
+    """Добавляет игру в БД; notify=(текст, кнопки) — вместе с уведомлением
+
+    False — игра уже есть; ошибка БД пробрасывается, чтобы отметка ленты не ушла за игру
+    """
+    try:
+        with db_session(write=True) as session:
+            key = item_key(item_id)
+            exists = session.query(Game.id).filter_by(item_key=key).first()
+            if exists:
+                return False
+            
+            game = Game(
+                item_id=item_id,
+                item_key=key,
+                title=title,
+                link=link,
+                source=source,
+                platform=platform,
+                price_before=price
+            )
+            session.add(game)
+            session.flush()
+            
+            if notify is not None:
+                message, reply_markup = notify
+                session.add(Notification(
+                    game_id=game.id,
+                    chat_id=str(CHAT_ID),
+                    text=message,
+                    reply_markup=json.dumps(reply_markup) if reply_markup else None,
+                    attempts=0,
+                    next_attempt_at=datetime.utcnow()
+                ))
+            
+            live_event = game_event(game)
+            record = RecentGame(game.id, game.title, game.source, game.platform, game.found_at)
+        
+        on_commit(lambda: game_store.add(record))
+        on_commit(lambda: game_broker.publish(live_event))
+        if notify is not None:
+            on_commit(outbox_wakeup.set)
+        return True
+    except IntegrityError:
+        # Ту же игру только что записал другой воркер
+        return False
+    except Exception as e:
+        print(f"❌ Ошибка добавления игры: {e}")
+        raise
+
+@traced('db.game_exists')
+def game_exists(*item_ids):
+    """Проверяет существование игры по любому из канонических ключей"""
+    keys = [item_key(item_id) for item_id in item_ids]
+    with read_session() as session:
+        exists = session.query(Game.id).filter(Game.item_key.in_(keys)).first()
+        return exists is not None
+
+def _load_settings(session, user_id):
+    """Находит или создаёт (без коммита) настройки пользователя"""
+    uow = current_unit_of_work()
+    if uow is not None and user_id in uow.settings_cache:
+        return uow.settings_cache[user_id]
+    
+    query = session.query(UserSettings).filter_by(user_id=user_id)
+    settings = query.first()
+    if not settings and uow is not None:
+        uow.begin_write()
+        # Снимок до begin_write мог не видеть строку, которую создал параллельный апдейт
+        settings = query.first()
+    if not settings:
+        settings = UserSettings(
+            user_id=user_id,
+            platforms='all',
+            regions='all',
+            min_price=0.0,
+            notifications=True,
+            instant=True
+        )
+        try:
+            # INSERT сразу в SAVEPOINT, а не при коммите: гонку первых апдейтов ловим здесь
+            with session.begin_nested():
+                session.add(settings)
+        except IntegrityError:
+            settings = query.one()
+    
+    if uow is not None:
+        uow.settings_cache[user_id] = settings
+    return settings
+
+@traced('db.get_user_settings')
+def get_user_settings(user_id):
+    """Получает настройки пользователя"""
+    user_id = str(user_id)
+    with db_session() as session:
+        # В единице работы автосоздание уйдёт в БД общим коммитом
+        if current_unit_of_work() is not None:
+            return _load_settings(session, user_id)
+        settings = session.query(UserSettings).filter_by(user_id=user_id).first()
+        if settings:
+            return settings
+    
+    # Первое обращение — в пишущей транзакции: она видит строку параллельного запроса
+    with db_session(write=True) as session:
+        return _load_settings(session, user_id)
+
+@traced('db.update_settings')
 def update_settings(user_id, **kwargs):
     """Обновляет настройки"""
-    session = Session()
     try:
-        settings = session.query(UserSettings).filter_by(user_id=str(user_id)).first()
-        if not settings:
-            settings = UserSettings(user_id=str(user_id))
-            session.add(settings)
-        
-        for key, value in kwargs.items():
-            if hasattr(settings, key):
-                setattr(settings, key, value)
-        
-        session.commit()
+        with db_session(write=True) as session:
+            settings = _load_settings(session, str(user_id))
+            
+            for key, value in kwargs.items():
+                if hasattr(settings, key):
+                    setattr(settings, key, value)
         return True
     except Exception as e:
         print(f"❌ Ошибка обновления: {e}")
-        session.rollback()
         return False
-    finally:
-        session.close()
 
 def add_statistics(source, games_found=0, checks=1):
     """Добавляет статистику"""
-    session = Session()
+    uow = current_unit_of_work()
+    if uow is not None:
+        uow.pending_stats.append((source, games_found, checks))
+        return
+    
     try:
-        stat = Statistics(
-            source=source,
-            games_found=games_found,
-            checks=checks
-        )
-        session.add(stat)
-        session.commit()
+        with db_session(write=True) as session:
+            session.add(Statistics(
+                source=source,
+                games_found=games_found,
+                checks=checks
+            ))
     except Exception as e:
         print(f"❌ Ошибка статистики: {e}")
-        session.rollback()
-    finally:
-        session.close()
 
+@traced('db.get_statistics')
 def get_statistics(days=7):
     """Получает статистику"""
-    session = Session()
-    try:
+    with read_session() as session:
         since = datetime.utcnow() - timedelta(days=days)
         stats = session.query(Statistics).filter(Statistics.date >= since).all()
         
@@ -176,7 +787,12 @@ def get_statistics(days=7):
         total_games = 0
         total_checks = 0
         
+        by_feed = defaultdict(int)
         for stat in stats:
+            if ':' in stat.source:
+                # Разбивка источника по лентам (reddit:<сабреддит>) — уже в строке источника
+                by_feed[stat.source] += stat.games_found
+                continue
             by_source[stat.source]['games'] += stat.games_found
             by_source[stat.source]['checks'] += stat.checks
             total_games += stat.games_found
@@ -186,23 +802,46 @@ def get_statistics(days=7):
             'total_games': total_games,
             'total_checks': total_checks,
             'by_source': dict(by_source),
+            'by_feed': dict(by_feed),
             'days': days
         }
-    finally:
-        session.close()
 
 def get_total_games():
     """Общее количество игр"""
-    session = Session()
-    try:
+    if game_store.ready():
+        return game_store.total
+    return count_games()
+
+@traced('db.count_games')
+def count_games():
+    """Общее количество игр (запрос к БД)"""
+    with read_session() as session:
         return session.query(Game).count()
-    finally:
-        session.close()
+
+def get_game_counts():
+    """Игры по источникам и по платформам"""
+    if game_store.ready():
+        return game_store.counts()
+    return query_game_counts()
+
+@traced('db.query_game_counts')
+def query_game_counts():
+    """Игры по источникам и по платформам (запрос к БД)"""
+    with read_session() as session:
+        by_source = session.query(Game.source, func.count()).group_by(Game.source).all()
+        by_platform = session.query(Game.platform, func.count()).group_by(Game.platform).all()
+        return dict(by_source), dict(by_platform)
 
 def get_recent_games(limit=10):
     """Последние игры"""
-    session = Session()
-    try:
+    if game_store.ready() and limit <= game_store.size:
+        return game_store.recent(limit)
+    return query_recent_games(limit)
+
+@traced('db.query_recent_games')
+def query_recent_games(limit=10):
+    """Последние игры (запрос к БД)"""
+    with read_session() as session:
         games = session.query(Game).order_by(desc(Game.found_at)).limit(limit).all()
         return [{
             'title': g.title,
@@ -210,22 +849,482 @@ def get_recent_games(limit=10):
             'platform': g.platform,
             'found_at': g.found_at.strftime('%d.%m %H:%M')
         } for g in games]
-    finally:
-        session.close()
 
+def get_feed_marks(prefix=''):
+    """Отметки лент, ключ которых начинается с prefix"""
+    with db_session() as session:
+        marks = session.query(FeedMark).filter(FeedMark.feed.startswith(prefix, autoescape=True)).all()
+        return {mark.feed: mark for mark in marks}
+
+def set_feed_mark(feed, entry):
+    """Сдвигает отметку ленты на запись entry"""
+    try:
+        with db_session(write=True) as session:
+            mark = session.get(FeedMark, feed)
+            if mark is None:
+                mark = FeedMark(feed=feed)
+                session.add(mark)
+            mark.entry_id = entry.id
+            mark.published = entry.published
+            mark.updated_at = datetime.utcnow()
+    except Exception as e:
+        print(f"❌ Ошибка отметки ленты {feed}: {e}")
+
+GAME_COLUMNS = ('id', 'item_id', 'title', 'link', 'source', 'platform', 'price_before', 'found_at', 'sent')
+
+def _games_select(source=None, platform=None, since=None, until=None):
+    """SELECT по таблице games с фильтрами, от новых к старым"""
+    games = Game.__table__
+    query = select(*[games.c[name] for name in GAME_COLUMNS])
+    if source:
+        query = query.where(games.c.source == source)
+    if platform:
+        query = query.where(games.c.platform == platform)
+    if since:
+        query = query.where(games.c.found_at >= since)
+    if until:
+        query = query.where(games.c.found_at < until)
+    return query.order_by(desc(games.c.found_at), desc(games.c.id))
+
+def encode_cursor(found_at, game_id):
+    """Непрозрачный курсор страницы"""
+    raw = f"{found_at.isoformat()}|{game_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Разбирает курсор страницы"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        found_at, game_id = raw.split('|')
+        return datetime.fromisoformat(found_at), int(game_id)
+    except Exception:
+        raise ValueError('invalid cursor')
+
+def list_games(limit=50, cursor=None, **filters):
+    """Страница игр по ключу (found_at, id) без OFFSET"""
+    games = Game.__table__
+    query = _games_select(**filters)
+    if cursor:
+        found_at, game_id = decode_cursor(cursor)
+        query = query.where(or_(
+            games.c.found_at < found_at,
+            and_(games.c.found_at == found_at, games.c.id < game_id)
+        ))
+    
+    with read_session() as session:
+        rows = session.execute(query.limit(limit + 1)).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].found_at, rows[-1].id)
+    return [dict(row._mapping) for row in rows], next_cursor
+
+def iter_games(batch_size=1000, **filters):
+    """Потоково отдаёт все игры серверным курсором"""
+    with read_engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+            _games_select(**filters)
+        )
+        for row in result:
+            yield dict(row._mapping)
+
+@traced('db.clear_database')
 def clear_database():
     """Очищает БД"""
-    session = Session()
     try:
-        session.query(Game).delete()
-        session.commit()
+        with db_session(write=True) as session:
+            # Неотправленные уведомления об играх уходят вместе с ними: повторная
+            # проверка поставит те же игры в очередь заново
+            session.query(Notification).filter(Notification.game_id.isnot(None)).delete(synchronize_session=False)
+            session.query(Game).delete()
+        
+        on_commit(game_store.clear)
+        on_commit(game_broker.forget)
         return True
     except Exception as e:
         print(f"❌ Ошибка очистки: {e}")
-        session.rollback()
         return False
-    finally:
-        session.close()
+
+# ========================================
+# ПАМЯТЬ
+# ========================================
+
+class RecentGame:
+    """Компактная запись последней игры"""
+    __slots__ = ('id', 'title', 'source', 'platform', 'found_at')
+
+    def __init__(self, id, title, source, platform, found_at):
+        self.id = id
+        self.title = title
+        self.source = source
+        self.platform = platform
+        self.found_at = found_at
+
+class GameStore:
+    """Кольцо последних игр и счётчики по источникам и платформам в памяти"""
+
+    def __init__(self, size=RECENT_GAMES_SIZE, ttl=GAME_STORE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=size)
+        self._loaded_at = None
+        # Наибольший id на момент загрузки: игры до него уже посчитаны
+        self._max_id = 0
+        self.total = 0
+        self.by_source = Counter()
+        self.by_platform = Counter()
+
+    def ready(self):
+        """Загружен ли кэш (при первом обращении загружает из БД)"""
+        loaded_at = self._loaded_at
+        if loaded_at is None or (self.ttl and time.time() - loaded_at > self.ttl):
+            try:
+                self.hydrate()
+            except Exception as e:
+                print(f"❌ Ошибка загрузки кэша игр: {e}")
+                return False
+        return True
+
+    def hydrate(self):
+        """Загружает кэш из БД одним проходом без ORM-объектов"""
+        games = Game.__table__
+        # Под блокировкой: вставки ждут, чтобы не потеряться между чтением и заменой
+        with self._lock, read_engine.connect() as conn:
+            by_source = Counter(dict(conn.execute(
+                select(games.c.source, func.count()).group_by(games.c.source)
+            ).all()))
+            by_platform = Counter(dict(conn.execute(
+                select(games.c.platform, func.count()).group_by(games.c.platform)
+            ).all()))
+            rows = conn.execute(
+                select(games.c.id, games.c.title, games.c.source, games.c.platform, games.c.found_at)
+                .order_by(desc(games.c.found_at), desc(games.c.id))
+                .limit(self.size)
+            ).all()
+            max_id = conn.execute(select(func.max(games.c.id))).scalar() or 0
+            
+            self._max_id = max_id
+            self._recent = deque((RecentGame(*row) for row in reversed(rows)), maxlen=self.size)
+            self.by_source = by_source
+            self.by_platform = by_platform
+            self.total = sum(by_source.values())
+            self._loaded_at = time.time()
+
+    def add(self, record):
+        """Учитывает закоммиченную игру"""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            # Перезагрузка по TTL между коммитом и этим вызовом уже учла игру
+            if record.id <= self._max_id and any(r.id == record.id for r in self._recent):
+                return
+            self._recent.append(record)
+            self.total += 1
+            self.by_source[record.source] += 1
+            self.by_platform[record.platform] += 1
+
+    def clear(self):
+        """Сбрасывает кэш после очистки БД"""
+        with self._lock:
+            self._recent.clear()
+            self._max_id = 0
+            self.total = 0
+            self.by_source = Counter()
+            self.by_platform = Counter()
+
+    def counts(self):
+        """Игры по источникам и по платформам"""
+        with self._lock:
+            return dict(self.by_source), dict(self.by_platform)
+
+    def recent(self, limit):
+        """Последние limit игр в формате get_recent_games"""
+        with self._lock:
+            records = list(self._recent)[-limit:] if limit > 0 else []
+        return [{
+            'title': r.title,
+            'source': r.source,
+            'platform': r.platform,
+            'found_at': r.found_at.strftime('%d.%m %H:%M')
+        } for r in reversed(records)]
+
+game_store = GameStore()
+
+# ========================================
+# ПОИСК
+# ========================================
+
+SEARCH_BACKEND = None
+
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS games_fts USING fts5(
+        title, content='games', content_rowid='id', tokenize='unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS games_fts_ai AFTER INSERT ON games BEGIN
+        INSERT INTO games_fts(rowid, title) VALUES (new.id, new.title);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS games_fts_ad AFTER DELETE ON games BEGIN
+        INSERT INTO games_fts(games_fts, rowid, title) VALUES ('delete', old.id, old.title);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS games_fts_au AFTER UPDATE OF title ON games BEGIN
+        INSERT INTO games_fts(games_fts, rowid, title) VALUES ('delete', old.id, old.title);
+        INSERT INTO games_fts(rowid, title) VALUES (new.id, new.title);
+    END""",
+]
+
+POSTGRES_SEARCH_DDL = [
+    """ALTER TABLE games ADD COLUMN IF NOT EXISTS search tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(title, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_games_search ON games USING GIN (search)",
+]
+
+def setup_search_index():
+    """Создаёт полнотекстовый индекс по играм (FTS5 или tsvector + GIN)"""
+    global SEARCH_BACKEND
+    try:
+        with write_transaction() as conn:
+            if engine.dialect.name == 'sqlite':
+                created = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'games_fts'"
+                )).first() is None
+                for ddl in SQLITE_SEARCH_DDL:
+                    conn.execute(text(ddl))
+                if created:
+                    # Индексируем уже накопленную историю один раз
+                    conn.execute(text("INSERT INTO games_fts(games_fts) VALUES ('rebuild')"))
+                SEARCH_BACKEND = 'fts5'
+            elif engine.dialect.name == 'postgresql':
+                for ddl in POSTGRES_SEARCH_DDL:
+                    conn.execute(text(ddl))
+                SEARCH_BACKEND = 'tsvector'
+    except Exception as e:
+        print(f"⚠️ Полнотекстовый индекс недоступен: {e}")
+        SEARCH_BACKEND = None
+
+def _search_terms(query):
+    """Разбивает запрос на слова для префиксного поиска"""
+    return re.findall(r'\w+', query.lower())
+
+def search_games(query, source=None, platform=None, since=None, until=None, limit=20):
+    """Ищет игры по названию с ранжированием"""
+    terms = _search_terms(query)
+    if not terms:
+        return []
+    
+    params = {'limit': limit}
+    filters = []
+    for name, value, condition in (
+        ('source', source, 'g.source = :source'),
+        ('platform', platform, 'g.platform = :platform'),
+        ('since', since, 'g.found_at >= :since'),
+        ('until', until, 'g.found_at < :until'),
+    ):
+        if value is not None:
+            params[name] = value
+            filters.append(condition)
+    
+    if SEARCH_BACKEND == 'fts5':
+        params['q'] = ' '.join(f'"{t}"*' for t in terms)
+        sql = f"""
+            SELECT g.id, g.title, g.link, g.source, g.platform, g.found_at
+            FROM games_fts JOIN games g ON g.id = games_fts.rowid
+            WHERE games_fts MATCH :q {''.join(' AND ' + f for f in filters)}
+            ORDER BY bm25(games_fts), g.found_at DESC
+            LIMIT :limit
+        """
+    elif SEARCH_BACKEND == 'tsvector':
+        params['q'] = ' & '.join(f'{t}:*' for t in terms)
+        sql = f"""
+            SELECT g.id, g.title, g.link, g.source, g.platform, g.found_at
+            FROM games g, to_tsquery('simple', :q) q
+            WHERE g.search @@ q {''.join(' AND ' + f for f in filters)}
+            ORDER BY ts_rank(g.search, q) DESC, g.found_at DESC
+            LIMIT :limit
+        """
+    else:
+        # Без индекса: медленный, но рабочий запасной вариант
+        for i, t in enumerate(terms):
+            params[f't{i}'] = f'%{t}%'
+            filters.append(f'lower(g.title) LIKE :t{i}')
+        sql = f"""
+            SELECT g.id, g.title, g.link, g.source, g.platform, g.found_at
+            FROM games g
+            WHERE {' AND '.join(filters)}
+            ORDER BY g.found_at DESC
+            LIMIT :limit
+        """
+    
+    with read_session() as session:
+        rows = session.execute(text(sql).columns(found_at=DateTime), params).all()
+    
+    return [{
+        'id': r.id,
+        'title': r.title,
+        'link': r.link,
+        'source': r.source,
+        'platform': r.platform,
+        'found_at': r.found_at
+    } for r in rows]
+
+def parse_search_command(text):
+    """Разбирает «/search запрос source:x platform:y»"""
+    filters = {}
+    words = []
+    for word in text.split()[1:]:
+        key, sep, value = word.partition(':')
+        if sep and key in ('source', 'platform') and value:
+            filters[key] = value.lower()
+        else:
+            words.append(word)
+    return ' '.join(words), filters
+
+# ========================================
+# ЖИВАЯ ЛЕНТА
+# ========================================
+
+def game_event(game):
+    """Событие ленты для записи Game"""
+    return {
+        'id': game.id,
+        'title': game.title,
+        'link': game.link,
+        'source': game.source,
+        'platform': game.platform,
+        'found_at': game.found_at.isoformat() if game.found_at else None
+    }
+
+class GameBroker:
+    """Внутрипроцессный pub/sub новых игр с ограниченными буферами"""
+
+    def __init__(self, buffer_size=SSE_BUFFER):
+        self.buffer_size = buffer_size
+        self._cond = threading.Condition()
+        self._buffers = {}
+        # id последних разосланных игр: опрос БД не повторяет их второй раз
+        self._recent = OrderedDict()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self):
+        """Новый буфер подписчика; при переполнении теряются старые события"""
+        buffer = deque(maxlen=self.buffer_size)
+        with self._cond:
+            self._buffers[id(buffer)] = buffer
+        return buffer
+
+    def unsubscribe(self, buffer):
+        """Отписывает буфер"""
+        with self._cond:
+            self._buffers.pop(id(buffer), None)
+
+    def subscriber_count(self):
+        """Количество подписчиков"""
+        with self._cond:
+            return len(self._buffers)
+
+    def publish(self, event):
+        """Рассылает событие всем подписчикам; уже разосланное — пропускает"""
+        with self._cond:
+            if event['id'] in self._recent:
+                return
+            self._recent[event['id']] = True
+            while len(self._recent) > self.buffer_size * 10:
+                self._recent.popitem(last=False)
+            self.published += 1
+            for buffer in self._buffers.values():
+                if len(buffer) == buffer.maxlen:
+                    self.dropped += 1
+                buffer.append(event)
+            self._cond.notify_all()
+
+    def forget(self):
+        """Забывает разосланные id: после очистки базы они выдаются заново"""
+        with self._cond:
+            self._recent.clear()
+
+    def wait(self, buffer, timeout):
+        """Ждёт событий не дольше timeout и забирает их из буфера"""
+        with self._cond:
+            if not buffer:
+                self._cond.wait(timeout)
+            events = list(buffer)
+            buffer.clear()
+        return events
+
+game_broker = GameBroker()
+
+def games_after(last_id, limit=500):
+    """Игры с id больше last_id — для возобновления ленты"""
+    with read_session() as session:
+        games = session.query(Game).filter(Game.id > last_id).order_by(Game.id).limit(limit).all()
+        return [game_event(g) for g in games]
+
+def games_since(last_id, limit=500):
+    """Все игры с id больше last_id, пачками по limit"""
+    while True:
+        games = games_after(last_id, limit)
+        yield from games
+        if len(games) < limit:
+            return
+        last_id = games[-1]['id']
+
+def last_game_id():
+    """Наибольший id игры (0 — игр нет)"""
+    with read_session() as session:
+        return session.query(func.max(Game.id)).scalar() or 0
+
+class GamePoller:
+    """Один на процесс опрос БД: игры воркеров (main.py worker) — в брокер"""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.last_id = None
+        self.polls = 0
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Запускает опрос при первом подписчике"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            # Отметка — до того, как подписчик прочитает свою: игры между ними не теряются
+            self.last_id = last_game_id()
+            self._thread = threading.Thread(target=self._run, name='stream-poller', daemon=True)
+            self._thread.start()
+
+    def poll(self):
+        """Публикует игры новее отметки; свои брокер уже разослал"""
+        with self._poll_lock:
+            published = 0
+            for game in games_since(self.last_id):
+                self.last_id = max(self.last_id, game['id'])
+                self.broker.publish(game)
+                published += 1
+            if not published:
+                # После очистки базы id начинаются заново — отметку сдвигаем назад
+                self.last_id = min(self.last_id, last_game_id())
+            self.polls += 1
+
+    def _run(self):
+        while True:
+            time.sleep(SSE_HEARTBEAT)
+            if not self.broker.subscriber_count():
+                continue
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"❌ Опрос ленты: {e}")
+
+stream_poller = GamePoller(game_broker)
+
+def format_sse(event):
+    """Событие в формате Server-Sent Events"""
+    data = json.dumps(event, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: game\ndata: {data}\n\n"
 
 # ========================================
 # ИСТОЧНИКИ
@@ -254,10 +1353,532 @@ stats_runtime = {
     'last_check': None
 }
 
+# ========================================
+# ЗАГРУЗКА
+# ========================================
+
+SOURCE_MAX_BYTES = {
+    'steamdb': 3 * 1024 * 1024,
+    'epic': 4 * 1024 * 1024,
+}
+
+FETCH_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+fetch_metrics = {
+    'bytes': 0,
+    'too_large': 0,
+    'feed_gaps': 0
+}
+
+parse_metrics = {
+    'pool': 0,
+    'inline': 0,
+    'pool_failures': 0,
+    'timeouts': 0
+}
+
+# Сколько ждать разбора в пуле, прежде чем разобрать в потоке
+PARSE_TIMEOUT = 30
+
+archive_metrics = {
+    'records': 0,
+    'bytes': 0,
+    'truncated': 0,
+    'errors': 0
+}
+
+_parse_pool = None
+
+payload_archive = PayloadArchive(ARCHIVE_DIR, ARCHIVE_SEGMENT_MB * 1024 * 1024) if ARCHIVE_DIR else None
+
+class FetchError(Exception):
+    """Источник вернул не 200"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class ResponseTooLarge(FetchError):
+    """Тело ответа больше лимита источника"""
+
+def stream_body(url, source, headers=None, chunk_size=16 * 1024):
+    """Отдаёт тело ответа кусками, распаковывая на лету и соблюдая лимит"""
+    chunks = _response_chunks(url, source, headers, chunk_size)
+    if payload_archive is not None:
+        return capture_body(chunks, url, source)
+    return chunks
+
+def _response_chunks(url, source, headers, chunk_size):
+    """Куски тела ответа с проверкой статуса и лимита"""
+    limit = SOURCE_MAX_BYTES.get(source, FETCH_MAX_BYTES)
+    end_transaction()
+    
+    with requests.get(url, headers=headers or FETCH_HEADERS, stream=True, timeout=10) as response:
+        if response.status_code != 200:
+            raise FetchError(f"HTTP {response.status_code}", response.status_code)
+        
+        if int(response.headers.get('Content-Length') or 0) > limit:
+            fetch_metrics['too_large'] += 1
+            raise ResponseTooLarge(f"{url}: больше {limit} байт")
+        
+        total = 0
+        # iter_content распаковывает gzip/deflate — считаем уже распакованные байты
+        for chunk in response.iter_content(chunk_size):
+            total += len(chunk)
+            if total > limit:
+                fetch_metrics['too_large'] += 1
+                raise ResponseTooLarge(f"{url}: больше {limit} байт")
+            fetch_metrics['bytes'] += len(chunk)
+            yield chunk
+
+def capture_body(chunks, url, source):
+    """Пропускает куски тела через себя и пишет прочитанное в архив"""
+    received = []
+    truncated = True
+    try:
+        for chunk in chunks:
+            received.append(chunk)
+            yield chunk
+        truncated = False
+    finally:
+        chunks.close()
+        # Читатель остановился на отметке или тело упёрлось в лимит: ради архива
+        # не дочитываем — пишем прочитанное с пометкой truncated
+        if received or not truncated:
+            archive_payload(source, url, b''.join(received), truncated)
+
+def archive_payload(source, url, body, truncated=False):
+    """Дописывает ответ в архив; ошибка архива не мешает опросу"""
+    try:
+        payload_archive.append(source, url, body, truncated=truncated)
+        archive_metrics['records'] += 1
+        archive_metrics['bytes'] += len(body)
+        archive_metrics['truncated'] += truncated
+    except Exception as e:
+        archive_metrics['errors'] += 1
+        print(f"⚠️ Архив ответов: {e}")
+
+def read_body(url, source, headers=None):
+    """Читает тело ответа целиком, но не больше лимита источника"""
+    return b''.join(stream_body(url, source, headers))
+
+def start_parse_pool():
+    """Поднимает пул разбора; вызывать до запуска потоков — fork копирует процесс"""
+    global _parse_pool
+    if PARSE_WORKERS <= 0 or _parse_pool is not None:
+        return
+    # Дочерние процессы не должны унаследовать открытые соединения с БД
+    engine.dispose()
+    if read_engine is not engine:
+        read_engine.dispose()
+    # fork, а не spawn: spawn заново выполнил бы main.py (БД, миграции) в каждом процессе
+    _parse_pool = ProcessPoolExecutor(
+        max_workers=PARSE_WORKERS,
+        mp_context=multiprocessing.get_context('fork')
+    )
+    # С fork первая задача сразу запускает все процессы пула
+    _parse_pool.submit(len, b'').result()
+
+def stop_parse_pool():
+    """Останавливает процессы пула разбора"""
+    global _parse_pool
+    pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def parse_in_pool(func, *args):
+    """Разбор в пуле процессов, если он есть, иначе в текущем потоке"""
+    global _parse_pool
+    pool = _parse_pool
+    if pool is not None:
+        try:
+            result = pool.submit(func, *args).result(timeout=PARSE_TIMEOUT)
+            parse_metrics['pool'] += 1
+            return result
+        except FutureTimeoutError:
+            # Процесс пула занят или завис — цикл опроса его не ждёт
+            print(f"⚠️ Разбор в пуле дольше {PARSE_TIMEOUT} с, разбираю в потоке")
+            parse_metrics['timeouts'] += 1
+        except BrokenProcessPool as e:
+            # Процесс пула умер — новый fork из многопоточного процесса небезопасен
+            print(f"⚠️ Пул разбора недоступен, разбираю в потоке: {e}")
+            _parse_pool = None
+            parse_metrics['pool_failures'] += 1
+    parse_metrics['inline'] += 1
+    return func(*args)
+
+@contextmanager
+def open_feed(url, source):
+    """Записи ленты: разбор в пуле процессов или потоково по мере чтения"""
+    if _parse_pool is not None:
+        yield parse_in_pool(parse_feed, read_body(url, source))
+        return
+    
+    body = stream_body(url, source)
+    try:
+        yield iter_feed_entries(body)
+    finally:
+        body.close()
+
+# Записей с первого опроса ленты, у которой ещё нет отметки
+FEED_BOOTSTRAP = 5
+# Сколько страниц листаем назад, пока не дойдём до отметки
+FEED_MAX_PAGES = 5
+
+def is_seen(entry, mark):
+    """Запись не новее отметки ленты"""
+    if mark is None:
+        return False
+    if entry.id and entry.id == mark.entry_id:
+        return True
+    return bool(entry.published and mark.published and entry.published < mark.published)
+
+def fetch_new_entries(url, source, mark, next_page=None):
+    """Записи новее отметки (лента от новых к старым); дальше не читаем"""
+    entries = []
+    for _ in range(FEED_MAX_PAGES):
+        read = 0
+        with open_feed(url, source) as feed:
+            for entry in feed:
+                read += 1
+                if is_seen(entry, mark):
+                    return entries
+                entries.append(entry)
+                if mark is None and len(entries) >= FEED_BOOTSTRAP:
+                    return entries
+        # Окно ленты кончилось раньше отметки: листаем дальше, если лента умеет
+        if mark is None or not read or next_page is None:
+            break
+        url = next_page(url, entries[-1])
+    
+    if mark is not None and entries:
+        fetch_metrics['feed_gaps'] += 1
+        print(f"⚠️ {source}: отметка ленты не найдена, часть записей могла выпасть из окна ({url})")
+    return entries
+
+def process_new_entries(feed, entries, process):
+    """Обрабатывает записи от старых к новым; отметка — только за обработанными"""
+    new_items = 0
+    processed = None
+    try:
+        for entry in reversed(entries):
+            if process(entry):
+                new_items += 1
+            processed = entry
+    except Exception as e:
+        # Упавшую запись и всё, что новее, перечитаем в следующем цикле
+        print(f"❌ {feed}: {e}")
+    if processed is not None:
+        set_feed_mark(feed, processed)
+    return new_items
+
+def fetch_steamdb_rows(url, limit):
+    """(title, href) первых limit строк таблицы; None — строка без ссылки"""
+    if _parse_pool is not None:
+        return parse_in_pool(parse_steamdb, read_body(url, 'steamdb'), limit)
+    
+    parser = SteamDBRows(limit)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    body = stream_body(url, 'steamdb')
+    try:
+        for chunk in body:
+            parser.feed(decoder.decode(chunk))
+            if parser.done:
+                break
+    finally:
+        body.close()
+    return parser.rows
+
+# ========================================
+# ОБОГАЩЕНИЕ
+# ========================================
+
+StoreInfo = namedtuple('StoreInfo', 'store store_id platform price')
+
+# Первая ссылка на магазин в тексте записи: (магазин, платформа, шаблон id)
+STORE_LINKS = [
+    ('steam_app', 'steam', re.compile(r'(?:store\.steampowered\.com|steamdb\.info)/app/(\d+)')),
+    ('steam_sub', 'steam', re.compile(r'(?:store\.steampowered\.com|steamdb\.info)/sub/(\d+)')),
+    ('epic', 'epic', re.compile(r'store\.epicgames\.com/(?:[a-z]{2}(?:-[A-Z]{2})?/)?p/([\w-]+)')),
+    ('gog', 'gog', re.compile(r'gog\.com/(?:[a-z]{2}/)?game/(\w+)')),
+]
+
+enrich_metrics = {
+    'requests': 0,
+    'hits': 0,
+    'misses': 0,
+    'errors': 0
+}
+
+class TTLCache:
+    """LRU-кэш ограниченного размера с временем жизни записей"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def get(self, key, default=None):
+        """Значение по ключу, если оно не устарело"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Кладёт значение, вытесняя самые давние записи"""
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+# (магазин, id) -> исходная цена в $; None — магазин цену не знает
+store_cache = TTLCache(ENRICH_CACHE_SIZE, ENRICH_CACHE_TTL)
+
+def store_ref(text):
+    """(магазин, id, платформа) первой ссылки на магазин в тексте"""
+    for store, platform, pattern in STORE_LINKS:
+        match = pattern.search(text or '')
+        if match:
+            return store, match.group(1), platform
+    return None
+
+# Эндпоинты Steam Store API: магазин, параметр со списком id и ключ цены
+STEAM_ENDPOINTS = {
+    'appdetails': ('steam_app', 'appids', 'price_overview'),
+    'packagedetails': ('steam_sub', 'packageids', 'price'),
+}
+
+def _steam_prices(endpoint, ids):
+    """Исходные цены пачки id одним запросом к Steam Store API"""
+    _, param, price_key = STEAM_ENDPOINTS[endpoint]
+    url = f"{STORE_API}/api/{endpoint}?{param}={','.join(ids)}&cc={STORE_COUNTRY}"
+    if endpoint == 'appdetails':
+        # Несколько appids Steam принимает только с этим фильтром
+        url += '&filters=price_overview'
+    return parse_steam_prices(json.loads(read_body(url, 'store')), ids, price_key)
+
+def parse_steam_prices(data, ids, price_key):
+    """Исходные цены пачки id из ответа Steam Store API"""
+    prices = {}
+    for store_id in ids:
+        block = data.get(store_id) or {}
+        if not block.get('success'):
+            prices[store_id] = None
+            continue
+        # Бесплатные навсегда приложения отдают [] вместо объекта
+        details = block.get('data') or {}
+        price = details.get(price_key) if isinstance(details, dict) else None
+        prices[store_id] = price['initial'] / 100 if price else 0.0
+    return prices
+
+def resolve_steam_apps(ids):
+    """Цены приложений Steam"""
+    return _steam_prices('appdetails', ids)
+
+def resolve_steam_subs(ids):
+    """Цены пакетов Steam"""
+    return _steam_prices('packagedetails', ids)
+
+# Магазины, цены которых умеем запрашивать пачкой
+STORE_RESOLVERS = {
+    'steam_app': resolve_steam_apps,
+    'steam_sub': resolve_steam_subs,
+}
+
+def prefetch_store_info(texts):
+    """Запрашивает цены всех ссылок из texts, которых нет в кэше, пачками по магазинам"""
+    wanted = defaultdict(set)
+    for text in texts:
+        ref = store_ref(text)
+        if not ref or ref[0] not in STORE_RESOLVERS:
+            continue
+        if ref[:2] in store_cache:
+            enrich_metrics['hits'] += 1
+        else:
+            enrich_metrics['misses'] += 1
+            wanted[ref[0]].add(ref[1])
+    
+    for store, ids in wanted.items():
+        ids = sorted(ids)
+        for i in range(0, len(ids), ENRICH_BATCH):
+            batch = ids[i:i + ENRICH_BATCH]
+            enrich_metrics['requests'] += 1
+            try:
+                with span('enrich', store=store, ids=len(batch)):
+                    prices = STORE_RESOLVERS[store](batch)
+            except Exception as e:
+                # Не кэшируем — попробуем в следующем цикле
+                enrich_metrics['errors'] += 1
+                print(f"⚠️ Цены {store}: {e}")
+                continue
+            for store_id in batch:
+                store_cache.set((store, store_id), prices.get(store_id))
+
+def store_info(*texts):
+    """StoreInfo первой ссылки на магазин; цена только из кэша, без запросов"""
+    for text in texts:
+        ref = store_ref(text)
+        if ref:
+            store, store_id, platform = ref
+            return StoreInfo(store, store_id, platform, store_cache.get((store, store_id)))
+    return None
+
+def format_price(price):
+    """Строка с ценой для уведомления"""
+    return f"\n💰 Обычная цена: ${price:.2f}" if price else ""
+
+# ========================================
+# КЛЮЧИ ИГР
+# ========================================
+
+REDDIT_POST = re.compile(r'reddit\.com/(?:r/\w+/)?comments/([a-z0-9]+)', re.I)
+DEALABS_DEAL = re.compile(r'dealabs\.com/bons-plans/[^?#]*?-(\d+)(?:[/?#]|$)')
+
+# Хосты-зеркала и параметры, которые не меняют страницу
+HOST_PREFIXES = ('www.', 'old.', 'new.', 'np.', 'm.')
+TRACKING_PARAM = re.compile(r'^(?:utm_\w+|ref|ref_src|ref_url|fbclid|gclid|mc_\w+|snr|curator_clanid|share_id)$', re.I)
+
+def normalize_url(url):
+    """URL без схемы, зеркал хоста, хвостового слэша, якоря и трекинговых параметров"""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    path = parts.path.rstrip('/')
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING_PARAM.match(key)
+    )
+    return host + path + ('?' + urlencode(query) if query else '')
+
+def canonical_key(link):
+    """Стабильный ключ игры по ссылке: id поста, приложения, сделки или нормализованный URL"""
+    match = REDDIT_POST.search(link)
+    if match:
+        return f"reddit:{match.group(1).lower()}"
+    
+    ref = store_ref(link)
+    if ref and ref[0] in ('steam_app', 'steam_sub'):
+        return f"steam:{ref[0][len('steam_'):]}:{ref[1]}"
+    
+    # Id сделки в конце адреса не меняется при правке заголовка
+    match = DEALABS_DEAL.search(link)
+    if match:
+        return f"dealabs:{match.group(1)}"
+    
+    return f"url:{normalize_url(link)}"
+
+def epic_title_key(title):
+    """Ключ раздачи Epic, записанной до появления id предложений (epic_{title})"""
+    return f"epic:title:{title.strip().lower()}"
+
+def item_key(key):
+    """64-битный знаковый хеш канонического ключа (влезает в BIGINT)"""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+def legacy_canonical_key(item_id, link):
+    """Канонический ключ строки, записанной со старым item_id"""
+    if item_id.startswith('epic_'):
+        return epic_title_key(item_id[len('epic_'):])
+    return canonical_key(link or item_id)
+
+def migrate_item_keys(batch=1000):
+    """Переводит строки без item_key на канонические ключи; дубли переносит в games_dropped"""
+    migrated = removed = 0
+    last_id = 0
+    try:
+        if engine.dialect.name == 'postgresql':
+            with write_transaction() as conn:
+                # Уникальность теперь держит компактный индекс по хешу
+                conn.execute(text("ALTER TABLE games DROP CONSTRAINT IF EXISTS games_item_id_key"))
+        # На SQLite старый UNIQUE(item_id) остаётся: без пересборки таблицы его не удалить.
+        # Он лишь дублирует ux_games_item_key — канонический item_id однозначен, как и его хеш
+        
+        games = Game.__table__
+        while True:
+            # Пачками по id: и память, и транзакция — на пачку, а не на всю таблицу
+            with write_transaction() as conn:
+                rows = conn.execute(
+                    select(games).where(games.c.item_key.is_(None), games.c.id > last_id)
+                    .order_by(games.c.id).limit(batch)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                
+                canonical = {row.id: legacy_canonical_key(row.item_id, row.link) for row in rows}
+                keys = {row_id: item_key(key) for row_id, key in canonical.items()}
+                kept = dict(conn.execute(
+                    select(games.c.item_key, games.c.id).where(games.c.item_key.in_(set(keys.values())))
+                ).all())
+                
+                updates, duplicates = [], []
+                for row in rows:
+                    key = keys[row.id]
+                    if key in kept:
+                        # Та же игра, записанная под другим адресом, — оставляем раннюю
+                        duplicates.append(dict(
+                            id=row.id, item_id=row.item_id, title=row.title, link=row.link,
+                            source=row.source, platform=row.platform, found_at=row.found_at,
+                            duplicate_of=kept[key]
+                        ))
+                        continue
+                    kept[key] = row.id
+                    updates.append({'row_id': row.id, 'new_item_id': canonical[row.id], 'new_item_key': key})
+                
+                if duplicates:
+                    ids = [row['id'] for row in duplicates]
+                    conn.execute(DroppedGame.__table__.insert(), duplicates)
+                    conn.execute(Notification.__table__.delete().where(Notification.game_id.in_(ids)))
+                    conn.execute(games.delete().where(games.c.id.in_(ids)))
+                    for row in duplicates:
+                        print(f"🗑️ Дубль игры {row['id']} ({row['link']}) → {row['duplicate_of']}")
+                
+                if updates:
+                    conn.execute(
+                        update(games).where(games.c.id == bindparam('row_id')).values(
+                            item_id=bindparam('new_item_id'), item_key=bindparam('new_item_key')
+                        ),
+                        updates
+                    )
+                
+                migrated += len(updates)
+                removed += len(duplicates)
+        
+        if migrated or removed:
+            print(f"🔑 Ключи игр: {migrated} строк переведено, {removed} дублей перенесено в games_dropped")
+    except Exception as e:
+        print(f"❌ Миграция ключей: {e}")
+    return migrated
+
 # ========================================
 # TELEGRAM
 # ========================================
 
+@traced('telegram.send')
 def send_telegram(text, chat_id=None, reply_markup=None):
     """Отправка сообщения"""
     if chat_id is None:
@@ -266,8 +1887,22 @@ def send_telegram(text, chat_id=None, reply_markup=None):
     settings = get_user_settings(chat_id)
     if not settings.notifications:
         return False
-        
-    url = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
+    
+    batch = current_reply_batch()
+    if batch is not None:
+        batch.messages[str(chat_id)].append((text, reply_markup))
+        return True
+    
+    ok, error, _ = deliver_telegram(
+        text, chat_id, json.dumps(reply_markup) if reply_markup else None
+    )
+    if not ok:
+        print(f"Ошибка отправки: {error}")
+    return ok
+
+def deliver_telegram(text, chat_id, reply_markup=None):
+    """sendMessage без проверки настроек: (ok, ошибка, retry_after)"""
+    url = f"{TELEGRAM_API}/bot{TOKEN}/sendMessage"
     data = {
         "chat_id": chat_id, 
         "text": text, 
@@ -276,14 +1911,172 @@ def send_telegram(text, chat_id=None, reply_markup=None):
     }
     
     if reply_markup:
-        data["reply_markup"] = json.dumps(reply_markup)
+        data["reply_markup"] = reply_markup
     
     try:
         response = requests.post(url, data=data, timeout=10)
-        return response.status_code == 200
     except Exception as e:
-        print(f"Ошибка отправки: {e}")
-        return False
+        return False, str(e), None
+    
+    if response.status_code == 200:
+        return True, None, None
+    
+    retry_after = None
+    try:
+        retry_after = response.json().get('parameters', {}).get('retry_after')
+    except ValueError:
+        pass
+    return False, f"HTTP {response.status_code}: {response.text[:200]}", retry_after
+
+def answer_callback(callback_id, text):
+    """answerCallbackQuery; в пачке апдейтов — при отправке ответов пачки"""
+    payload = {
+        "callback_query_id": callback_id,
+        "text": text
+    }
+    
+    batch = current_reply_batch()
+    if batch is not None:
+        batch.answers.append(payload)
+        return
+    requests.post(f"{TELEGRAM_API}/bot{TOKEN}/answerCallbackQuery", json=payload)
+
+def edit_message(chat_id, message_id, text, reply_markup=None):
+    """editMessageText; в пачке апдейтов уходит только последняя правка сообщения"""
+    payload = {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text,
+        "parse_mode": "HTML"
+    }
+    if reply_markup:
+        payload["reply_markup"] = reply_markup
+    
+    batch = current_reply_batch()
+    if batch is not None:
+        key = (str(chat_id), message_id)
+        batch.edits.pop(key, None)
+        batch.edits[key] = payload
+        return
+    requests.post(f"{TELEGRAM_API}/bot{TOKEN}/editMessageText", json=payload)
+
+# Лимит длины сообщения Telegram
+TELEGRAM_TEXT_LIMIT = 4096
+# Параллельных запросов при отправке ответов пачки
+REPLY_WORKERS = 8
+
+_reply_local = threading.local()
+
+class ReplyBatch:
+    """Ответы пачки апдейтов: сообщения по чатам, последние правки сообщений и ответы на кнопки"""
+
+    def __init__(self):
+        self.messages = defaultdict(list)
+        self.edits = OrderedDict()
+        self.answers = []
+
+    def flush(self):
+        """Отправляет накопленное параллельно; сообщения одного чата — по порядку и склеенными"""
+        tasks = [functools.partial(_post_reply, 'answerCallbackQuery', payload) for payload in self.answers]
+        tasks += [functools.partial(_post_reply, 'editMessageText', payload) for payload in self.edits.values()]
+        tasks += [functools.partial(_send_replies, chat_id, replies) for chat_id, replies in self.messages.items()]
+        self.messages, self.edits, self.answers = defaultdict(list), OrderedDict(), []
+        
+        if len(tasks) == 1:
+            tasks[0]()
+        elif tasks:
+            with ThreadPoolExecutor(max_workers=min(REPLY_WORKERS, len(tasks))) as pool:
+                list(pool.map(lambda task: task(), tasks))
+
+def _post_reply(method, payload):
+    """Вызов Bot API без результата"""
+    try:
+        requests.post(f"{TELEGRAM_API}/bot{TOKEN}/{method}", json=payload, timeout=10)
+    except Exception as e:
+        print(f"Ошибка {method}: {e}")
+
+def _send_replies(chat_id, replies):
+    """Склеенные сообщения одного чата по порядку"""
+    for text, reply_markup in coalesce_messages(replies):
+        ok, error, _ = deliver_telegram(text, chat_id, json.dumps(reply_markup) if reply_markup else None)
+        if not ok:
+            print(f"Ошибка отправки: {error}")
+
+# Разметка, которую Telegram принимает в parse_mode=HTML
+TELEGRAM_TAGS = {'b', 'strong', 'i', 'em', 'u', 'ins', 's', 'strike', 'del', 'a', 'code', 'pre',
+                 'span', 'tg-spoiler', 'tg-emoji', 'blockquote'}
+TELEGRAM_ENTITIES = {'lt', 'gt', 'amp', 'quot'}
+
+class _TelegramMarkup(HTMLParser):
+    """Проверяет, что Telegram разберёт разметку: известные теги, закрытые по порядку, без голых <, > и &"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.open = []
+        self.valid = True
+
+    def handle_starttag(self, tag, attrs):
+        self.valid &= tag in TELEGRAM_TAGS
+        self.open.append(tag)
+
+    def handle_endtag(self, tag):
+        self.valid &= bool(self.open) and self.open.pop() == tag
+
+    def handle_data(self, data):
+        self.valid &= not any(char in data for char in '<>&')
+
+    def handle_entityref(self, name):
+        self.valid &= name in TELEGRAM_ENTITIES
+
+    def handle_startendtag(self, tag, attrs):
+        self.valid = False
+
+    handle_comment = handle_decl = handle_pi = unknown_decl = lambda self, data: setattr(self, 'valid', False)
+
+def telegram_html(text):
+    """Текст как есть, если Telegram примет его разметку, иначе экранированный"""
+    markup = _TelegramMarkup()
+    markup.feed(text)
+    markup.close()
+    if markup.valid and not markup.open:
+        return text
+    return html.escape(text, quote=False)
+
+def coalesce_messages(replies, limit=TELEGRAM_TEXT_LIMIT):
+    """Склеивает подряд идущие сообщения чата; сообщение с кнопками закрывает склейку"""
+    parts, size = [], 0
+    for text, reply_markup in replies:
+        # Одна битая разметка не должна отклонить всю склейку: проверяем каждую часть
+        text = telegram_html(text.strip())
+        if parts and size + len(text) > limit:
+            yield "\n\n".join(parts), None
+            parts, size = [], 0
+        parts.append(text)
+        size += len(text) + 2
+        if reply_markup:
+            yield "\n\n".join(parts), reply_markup
+            parts, size = [], 0
+    if parts:
+        yield "\n\n".join(parts), None
+
+def current_reply_batch():
+    """Текущая пачка ответов потока (или None)"""
+    return getattr(_reply_local, 'batch', None)
+
+@contextmanager
+def reply_batch():
+    """Копит ответы до конца блока; при ошибке они отбрасываются вместе с пачкой"""
+    batch = ReplyBatch()
+    _reply_local.batch = batch
+    try:
+        yield batch
+    finally:
+        _reply_local.batch = None
+    try:
+        batch.flush()
+    except Exception as e:
+        # Пачка уже закоммичена: повтор её апдейтов по одному разослал бы ответы второй раз
+        print(f"❌ Ответы пачки: {e}")
 
 def get_main_keyboard():
     """Главная клавиатура"""
@@ -329,7 +2122,7 @@ def get_settings_keyboard(user_id):
 # ПАРСЕРЫ
 # ========================================
 
-def check_game_filter(title, link, source, user_id):
+def check_game_filter(title, link, source, user_id, platform=None, price=None):
     """Проверяет фильтры пользователя"""
     settings = get_user_settings(user_id)
     
@@ -340,68 +2133,235 @@ def check_game_filter(title, link, source, user_id):
         
         match = False
         for p in platforms:
-            if p in link_lower or p in source.lower():
+            if p == platform or p in link_lower or p in source.lower():
                 match = True
                 break
         
         if not match:
             return False
     
+    # Минимальная цена: если исходная цена неизвестна, не отсекаем
+    if settings.min_price and price is not None and price < settings.min_price:
+        return False
+    
     return True
 
-def check_reddit():
-    """Парсит Reddit"""
-    new_items = 0
+REDDIT_REGROUP_SECONDS = 3600
+
+# Слова в заголовке, по которым пост или сделка считается раздачей
+REDDIT_KEYWORDS = ['free', 'бесплатно', '100%', 'giveaway', 'раздача', 'freebie']
+DEALABS_KEYWORDS = ['gratuit', 'free', '0€', '0$']
+# Сколько первых строк таблицы SteamDB смотрим
+STEAMDB_ROWS = 10
+
+reddit_state = {
+    'groups': None,
+    'grouped_at': 0.0,
+    'requests': 0,
+    'rate_limited': 0,
+    'splits': 0,
+    'gaps': 0
+}
+
+def subreddit_name(url):
+    """Имя сабреддита из URL ленты или поста"""
+    match = re.search(r'/r/([^/]+)', url)
+    return match.group(1) if match else None
+
+def reddit_groups():
+    """Группы сабреддитов для мультиреддит-запросов"""
+    now = time.time()
+    # Разбитые после ошибок группы периодически пробуем склеить обратно
+    if reddit_state['groups'] is None or now - reddit_state['grouped_at'] > REDDIT_REGROUP_SECONDS:
+        names = [subreddit_name(url) for url in RSS_SOURCES['reddit']]
+        names = [name for name in names if name]
+        reddit_state['groups'] = [
+            names[i:i + REDDIT_GROUP_SIZE] for i in range(0, len(names), REDDIT_GROUP_SIZE)
+        ]
+        reddit_state['grouped_at'] = now
+    return list(reddit_state['groups'])
+
+# Больше постов за запрос лента Reddit не отдаёт
+REDDIT_WINDOW = 100
+
+def multireddit_url(group):
+    """URL общей ленты новых постов группы сабреддитов"""
+    return f"https://www.reddit.com/r/{'+'.join(group)}/new/.rss?limit={REDDIT_WINDOW}"
+
+def subreddit_feed_url(sub):
+    """URL ленты новых постов одного сабреддита"""
+    return f"https://www.reddit.com/r/{sub}/new/.rss?limit={REDDIT_WINDOW}"
+
+def reddit_next_page(url, entry):
+    """URL следующей (более старой) страницы ленты Reddit после записи entry"""
+    return f"{url.split('&after=')[0]}&after={entry.id}"
+
+def fetch_reddit_group(group, marks):
+    """Новые посты каждого сабреддита группы одним запросом и недочитанные сабреддиты"""
+    by_sub = {name.lower(): [] for name in group}
+    done = set()
+    read = 0
     
-    for rss_url in RSS_SOURCES['reddit']:
-        try:
-            feed = feedparser.parse(rss_url)
+    reddit_state['requests'] += 1
+    with open_feed(multireddit_url(group), 'reddit') as feed:
+        for entry in feed:
+            read += 1
+            sub = (subreddit_name(entry.link) or '').lower()
+            if sub not in by_sub or sub in done:
+                continue
             
-            for entry in feed.entries[:5]:
-                item_id = entry.link
-                
-                if game_exists(item_id):
-                    continue
-                    
-                title = entry.title
-                keywords = ['free', 'бесплатно', '100%', 'giveaway', 'раздача', 'freebie']
-                
-                if not any(word in title.lower() for word in keywords):
-                    continue
-                
-                # Определяем платформу
-                platform = 'unknown'
-                if 'steam' in title.lower() or 'steam' in entry.link.lower():
-                    platform = 'steam'
-                elif 'epic' in title.lower():
-                    platform = 'epic'
-                
-                # Проверяем фильтры
-                if not check_game_filter(title, entry.link, 'reddit', CHAT_ID):
-                    continue
-                
-                # Добавляем в БД
-                if add_game(item_id, title, entry.link, 'reddit', platform):
-                    message = f"""
+            mark = marks.get(f"reddit:{sub}")
+            if is_seen(entry, mark):
+                done.add(sub)
+            else:
+                by_sub[sub].append(entry)
+                if mark is None and len(by_sub[sub]) >= FEED_BOOTSTRAP:
+                    done.add(sub)
+            
+            if len(done) == len(by_sub):
+                break
+    
+    # Окно заполнено, а отметка сабреддита в него не попала: его посты
+    # между отметкой и окном вытеснили более активные соседи по группе
+    gaps = []
+    if read >= REDDIT_WINDOW:
+        gaps = [sub for sub in by_sub if sub not in done and marks.get(f"reddit:{sub}") is not None]
+    return by_sub, gaps
+
+def split_reddit_group(group):
+    """Делит сбойную группу пополам и запоминает разбиение"""
+    middle = len(group) // 2
+    halves = [group[:middle], group[middle:]]
+    groups = reddit_state['groups'] or []
+    if group in groups:
+        index = groups.index(group)
+        groups[index:index + 1] = halves
+    reddit_state['splits'] += 1
+    return halves
+
+def isolate_reddit_sub(group, sub):
+    """Выносит активный сабреддит группы в отдельную группу"""
+    groups = reddit_state['groups'] or []
+    if len(group) < 2 or group not in groups:
+        return
+    index = groups.index(group)
+    groups[index:index + 1] = [
+        [name for name in group if name.lower() == sub],
+        [name for name in group if name.lower() != sub]
+    ]
+    reddit_state['splits'] += 1
+
+def reddit_platform(entry, info):
+    """Платформа поста: по ссылке на магазин, иначе по заголовку"""
+    if info:
+        return info.platform
+    if 'steam' in entry.title.lower() or 'steam' in entry.link.lower():
+        return 'steam'
+    if 'epic' in entry.title.lower():
+        return 'epic'
+    return 'unknown'
+
+def process_reddit_entry(entry):
+    """Проверяет пост Reddit и отправляет его; True — если отправлен, ошибка БД пробрасывается"""
+    item_id = canonical_key(entry.link)
+    
+    if game_exists(item_id):
+        return False
+        
+    title = entry.title
+    
+    if not any(word in title.lower() for word in REDDIT_KEYWORDS):
+        return False
+    
+    info = store_info(entry.link, entry.links)
+    price = info.price if info else None
+    platform = reddit_platform(entry, info)
+    
+    # Проверяем фильтры
+    if not check_game_filter(title, entry.link, 'reddit', CHAT_ID, platform, price):
+        return False
+    
+    message = f"""
 🎮 <b>БЕСПЛАТНАЯ ИГРА!</b>
 
 🎁 <b>{title}</b>
 
 📦 Источник: Reddit
-🎯 Платформа: {platform.upper()}
+🎯 Платформа: {platform.upper()}{format_price(price)}
 🔗 {entry.link}
 
 ⏰ <i>Успей забрать!</i>
-                    """
-                    
-                    if send_telegram(message, reply_markup=get_game_buttons(entry.link)):
-                        new_items += 1
-                        print(f"✅ [REDDIT] {title[:50]}...")
-                        time.sleep(2)
-                        
+    """
+    
+    # Игра и уведомление в одной транзакции — отправит диспетчер
+    if add_game(item_id, title, entry.link, 'reddit', platform, price or 0.0,
+                notify=(message, get_game_buttons(entry.link))):
+        print(f"✅ [REDDIT] {title[:50]}...")
+        return True
+    
+    return False
+
+def poll_reddit_groups(groups):
+    """Опрашивает группы сабреддитов; сбойные группы делит пополам"""
+    new_items = 0
+    pending = list(groups)
+    marks = get_feed_marks('reddit:')
+    
+    while pending:
+        group = pending.pop(0)
+        try:
+            with span('fetch', url=multireddit_url(group)):
+                by_sub, gaps = fetch_reddit_group(group, marks)
         except Exception as e:
-            print(f"❌ Reddit: {e}")
+            if isinstance(e, FetchError) and e.status == 429:
+                # Дробление только умножит запросы — ждём следующего цикла
+                reddit_state['rate_limited'] += 1
+                print(f"❌ Reddit: лимит запросов ({'+'.join(group)})")
+                continue
+            if len(group) > 1:
+                print(f"⚠️ Reddit: {e}, делю группу {'+'.join(group)}")
+                pending[:0] = split_reddit_group(group)
+                continue
+            print(f"❌ Reddit r/{group[0]}: {e}")
+            continue
+        
+        if gaps:
+            reddit_state['gaps'] += 1
+            # Делим группу по активности: самый активный сабреддит больше не вытесняет соседей
+            isolate_reddit_sub(group, max(by_sub, key=lambda sub: len(by_sub[sub])))
+            for sub in gaps:
+                url = subreddit_feed_url(sub)
+                try:
+                    with span('fetch', url=url):
+                        by_sub[sub] = fetch_new_entries(url, 'reddit', marks.get(f"reddit:{sub}"), reddit_next_page)
+                except Exception as e:
+                    # Без пропущенных постов не сдвигаем отметку — дочитаем в следующем цикле
+                    by_sub[sub] = []
+                    print(f"❌ Reddit r/{sub}: {e}")
+        
+        # Цены всех новых постов группы — несколькими пачечными запросами
+        prefetch_store_info(
+            text for entries in by_sub.values() for entry in entries
+            for text in (entry.link, entry.links)
+        )
+        
+        for sub, entries in by_sub.items():
+            found = process_new_entries(f"reddit:{sub}", entries, process_reddit_entry)
+            new_items += found
+            if found:
+                add_statistics(f"reddit:{sub}", found, 0)
     
+    return new_items
+
+def check_reddit():
+    """Парсит Reddit"""
+    new_items = poll_reddit_groups(reddit_groups())
+    add_statistics('reddit', new_items, 1)
+    return new_items
+
+def check_reddit_group(target):
+    """Задание распределённого опроса: группа «a+b+c»"""
+    new_items = poll_reddit_groups([target.split('+')])
     add_statistics('reddit', new_items, 1)
     return new_items
 
@@ -410,43 +2370,43 @@ def check_steamdb():
     new_items = 0
     
     try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(DIRECT_SOURCES['steamdb'], headers=headers, timeout=10)
+        with span('fetch', url=DIRECT_SOURCES['steamdb']):
+            packages = fetch_steamdb_rows(DIRECT_SOURCES['steamdb'], limit=STEAMDB_ROWS)
         
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            packages = soup.find_all('tr', limit=10)
+        if packages:
+            prefetch_store_info(f"steamdb.info{package[1]}" for package in packages if package and package[1])
             
             for package in packages:
                 try:
-                    link_tag = package.find('a')
-                    if not link_tag:
+                    if not package or not package[1]:
                         continue
                     
-                    title = link_tag.text.strip()
-                    link = f"https://steamdb.info{link_tag['href']}"
-                    item_id = link
+                    title, href = package
+                    link = f"https://steamdb.info{href}"
+                    item_id = canonical_key(link)
                     
                     if game_exists(item_id):
                         continue
                     
-                    if not check_game_filter(title, link, 'steamdb', CHAT_ID):
+                    info = store_info(link)
+                    price = info.price if info else None
+                    
+                    if not check_game_filter(title, link, 'steamdb', CHAT_ID, 'steam', price):
                         continue
                     
-                    if add_game(item_id, title, link, 'steamdb', 'steam'):
-                        message = f"""
+                    message = f"""
 🎮 <b>STEAM РАЗДАЧА!</b>
 
 🎁 <b>{title}</b>
 
-📦 SteamDB Free Package
+📦 SteamDB Free Package{format_price(price)}
 🔗 {link}
-                        """
-                        
-                        if send_telegram(message, reply_markup=get_game_buttons(link)):
-                            new_items += 1
-                            print(f"✅ [STEAMDB] {title[:50]}...")
-                            time.sleep(2)
+                    """
+                    
+                    if add_game(item_id, title, link, 'steamdb', 'steam', price or 0.0,
+                                notify=(message, get_game_buttons(link))):
+                        new_items += 1
+                        print(f"✅ [STEAMDB] {title[:50]}...")
                             
                 except:
                     continue
@@ -457,54 +2417,159 @@ def check_steamdb():
     add_statistics('steamdb', new_items, 1)
     return new_items
 
-def check_epic_games():
-    """Парсит Epic Games"""
-    new_items = 0
+EpicOffer = namedtuple('EpicOffer', 'item_id title link start end price')
+
+epic_state = {
+    'offers': [],
+    'fetched_at': 0.0,
+    'requests': 0,
+    'timers': []
+}
+
+_epic_lock = threading.Lock()
+
+# Блокировка процесса, который держит таймеры окон Epic
+EPIC_TIMERS_LEASE = 'epic_timers'
+
+def parse_epic_offers(data):
+    """Окна бесплатных раздач из ответа freeGamesPromotions"""
+    offers = []
+    games = data.get('data', {}).get('Catalog', {}).get('searchStore', {}).get('elements', [])
     
-    try:
-        response = requests.get(DIRECT_SOURCES['epic'], timeout=10)
+    for game in games:
+        promotions = game.get('promotions') or {}
+        title = game.get('title', 'Unknown')
+        slug = game.get('productSlug') or ''
+        if not slug:
+            mappings = (game.get('catalogNs') or {}).get('mappings') or [{}]
+            slug = mappings[0].get('pageSlug', '')
+        link = f"https://store.epicgames.com/en-US/p/{slug}"
+        if game.get('namespace') and game.get('id'):
+            item_id = f"epic:{game['namespace']}:{game['id']}"
+        else:
+            item_id = epic_title_key(title)
         
-        if response.status_code == 200:
-            data = response.json()
-            games = data.get('data', {}).get('Catalog', {}).get('searchStore', {}).get('elements', [])
-            
-            for game in games:
-                try:
-                    promotions = game.get('promotions')
-                    if not promotions:
-                        continue
-                    
-                    title = game.get('title', 'Unknown')
-                    item_id = f"epic_{title}"
-                    
-                    if game_exists(item_id):
-                        continue
-                    
-                    slug = game.get('productSlug', '')
-                    link = f"https://store.epicgames.com/en-US/p/{slug}"
-                    
-                    if not check_game_filter(title, link, 'epic', CHAT_ID):
+        # Исходная цена приходит в том же ответе — отдельный запрос не нужен
+        total = (game.get('price') or {}).get('totalPrice') or {}
+        decimals = (total.get('currencyInfo') or {}).get('decimals', 2)
+        price = total['originalPrice'] / 10 ** decimals if 'originalPrice' in total else None
+        
+        for kind in ('promotionalOffers', 'upcomingPromotionalOffers'):
+            for block in promotions.get(kind) or []:
+                for offer in block.get('promotionalOffers') or []:
+                    # Скидка 0% от цены — значит бесплатно; обычные скидки пропускаем
+                    if (offer.get('discountSetting') or {}).get('discountPercentage') != 0:
                         continue
-                    
-                    if add_game(item_id, title, link, 'epic', 'epic'):
-                        message = f"""
+                    start = parse_feed_date(offer.get('startDate'))
+                    end = parse_feed_date(offer.get('endDate'))
+                    if start and end:
+                        offers.append(EpicOffer(item_id, title, link, start, end, price))
+    
+    return offers
+
+def refresh_epic_schedule():
+    """Загружает расписание раздач Epic и ставит таймеры на начало окон"""
+    epic_state['requests'] += 1
+    with span('fetch', url=DIRECT_SOURCES['epic']):
+        body = read_body(DIRECT_SOURCES['epic'], 'epic')
+    with span('parse'):
+        offers = parse_epic_offers(json.loads(body))
+    
+    epic_state['offers'] = offers
+    epic_state['fetched_at'] = time.time()
+    schedule_epic_timers()
+
+def schedule_epic_timers():
+    """Таймеры на начало каждого будущего окна раздачи — в одном процессе"""
+    for timer in epic_state['timers']:
+        timer.cancel()
+    epic_state['timers'] = []
+    
+    # Остальные процессы (веб, воркеры) объявят окно обычным циклом опроса
+    try:
+        if not acquire_lease(EPIC_TIMERS_LEASE, 2 * EPIC_VERIFY_SECONDS):
+            return
+    except Exception:
+        return
+    
+    now = datetime.utcnow()
+    timers = []
+    for start in sorted({offer.start for offer in epic_state['offers'] if offer.start > now}):
+        timer = threading.Timer((start - now).total_seconds() + 1, on_epic_window)
+        timer.daemon = True
+        timer.start()
+        timers.append(timer)
+    epic_state['timers'] = timers
+
+def on_epic_window():
+    """Началось окно раздачи: объявляем сразу, расписание сверим в цикле"""
+    epic_state['fetched_at'] = 0.0
+    try:
+        # Пока таймер ждал, таймеры мог перехватить другой процесс
+        lease = get_lease(EPIC_TIMERS_LEASE)
+        if lease is None or lease.holder != HOLDER_ID:
+            return
+        with unit_of_work():
+            found = announce_epic_offers()
+            add_statistics('epic', found, 0)
+    except Exception as e:
+        print(f"❌ Epic: {e}")
+
+def next_epic_window():
+    """Ближайшее начало будущей раздачи"""
+    now = datetime.utcnow()
+    starts = [offer.start for offer in epic_state['offers'] if offer.start > now]
+    return min(starts) if starts else None
+
+def announce_epic_offers(now=None):
+    """Объявляет раздачи, окно которых открыто сейчас"""
+    now = now or datetime.utcnow()
+    new_items = 0
+    
+    with _epic_lock:
+        for offer in epic_state['offers']:
+            try:
+                # Ещё не началась или уже закончилась
+                if not offer.start <= now < offer.end:
+                    continue
+                
+                # Старые записи Epic хранят только название
+                if game_exists(offer.item_id, epic_title_key(offer.title)):
+                    continue
+                
+                if not check_game_filter(offer.title, offer.link, 'epic', CHAT_ID, 'epic', offer.price):
+                    continue
+                
+                message = f"""
 🎁 <b>EPIC GAMES!</b>
 
-🎮 <b>{title}</b>
+🎮 <b>{offer.title}</b>
 
-📦 Epic Games Store
-🔗 {link}
+📦 Epic Games Store{format_price(offer.price)}
+🔗 {offer.link}
 
-⏰ <i>Бесплатно на этой неделе!</i>
-                        """
+⏰ <i>Бесплатно до {offer.end.strftime('%d.%m %H:%M')} UTC!</i>
+                """
+                
+                if add_game(offer.item_id, offer.title, offer.link, 'epic', 'epic', offer.price or 0.0,
+                            notify=(message, get_game_buttons(offer.link))):
+                    new_items += 1
+                    print(f"✅ [EPIC] {offer.title[:50]}...")
                         
-                        if send_telegram(message, reply_markup=get_game_buttons(link)):
-                            new_items += 1
-                            print(f"✅ [EPIC] {title[:50]}...")
-                            time.sleep(2)
-                            
-                except:
-                    continue
+            except Exception:
+                continue
+    
+    return new_items
+
+def check_epic_games():
+    """Парсит Epic Games"""
+    new_items = 0
+    
+    try:
+        # Между окнами раздач — только редкая сверка расписания
+        if time.time() - epic_state['fetched_at'] >= EPIC_VERIFY_SECONDS:
+            refresh_epic_schedule()
+        new_items = announce_epic_offers()
                     
     except Exception as e:
         print(f"❌ Epic: {e}")
@@ -512,44 +2577,70 @@ def check_epic_games():
     add_statistics('epic', new_items, 1)
     return new_items
 
-def check_dealabs():
-    """Парсит Dealabs"""
-    new_items = 0
+def process_dealabs_entry(entry):
+    """Проверяет сделку Dealabs и отправляет её; True — если отправлена, ошибка БД пробрасывается"""
+    item_id = canonical_key(entry.link)
     
-    for rss_url in RSS_SOURCES['dealabs']:
-        try:
-            feed = feedparser.parse(rss_url)
-            
-            for entry in feed.entries[:5]:
-                item_id = entry.link
-                
-                if game_exists(item_id):
-                    continue
-                
-                title = entry.title
-                
-                if any(word in title.lower() for word in ['gratuit', 'free', '0€', '0$']):
-                    if add_game(item_id, title, entry.link, 'dealabs'):
-                        message = f"""
+    if game_exists(item_id):
+        return False
+    
+    title = entry.title
+    
+    if not any(word in title.lower() for word in DEALABS_KEYWORDS):
+        return False
+    
+    info = store_info(entry.link, entry.links)
+    platform = info.platform if info else 'unknown'
+    price = info.price if info else None
+    
+    if not check_game_filter(title, entry.link, 'dealabs', CHAT_ID, platform, price):
+        return False
+    
+    message = f"""
 💎 <b>ЕВРОПЕЙСКАЯ РАЗДАЧА!</b>
 
 🎁 <b>{title}</b>
 
-📦 Dealabs
+📦 Dealabs{format_price(price)}
 🔗 {entry.link}
-                        """
-                        
-                        if send_telegram(message, reply_markup=get_game_buttons(entry.link)):
-                            new_items += 1
-                            print(f"✅ [DEALABS] {title[:50]}...")
-                            time.sleep(2)
-                        
+    """
+    
+    if add_game(item_id, title, entry.link, 'dealabs', platform, price or 0.0,
+                notify=(message, get_game_buttons(entry.link))):
+        print(f"✅ [DEALABS] {title[:50]}...")
+        return True
+    
+    return False
+
+def poll_dealabs_feed(rss_url, mark):
+    """Опрашивает одну ленту Dealabs начиная с отметки"""
+    with span('fetch', url=rss_url):
+        entries = fetch_new_entries(rss_url, 'dealabs', mark)
+    
+    prefetch_store_info(text for entry in entries for text in (entry.link, entry.links))
+    
+    return process_new_entries(f"dealabs:{rss_url}", entries, process_dealabs_entry)
+
+def check_dealabs():
+    """Парсит Dealabs"""
+    new_items = 0
+    marks = get_feed_marks('dealabs:')
+    
+    for rss_url in RSS_SOURCES['dealabs']:
+        try:
+            new_items += poll_dealabs_feed(rss_url, marks.get(f"dealabs:{rss_url}"))
         except Exception as e:
             print(f"❌ Dealabs: {e}")
     
     add_statistics('dealabs', new_items, 1)
     return new_items
 
+def check_dealabs_feed(rss_url):
+    """Задание распределённого опроса: одна лента Dealabs"""
+    new_items = poll_dealabs_feed(rss_url, get_feed_marks(f"dealabs:{rss_url}").get(f"dealabs:{rss_url}"))
+    add_statistics('dealabs', new_items, 1)
+    return new_items
+
 def check_all_sources():
     """Проверяет все источники"""
     total = 0
@@ -565,11 +2656,23 @@ def check_all_sources():
         ("Dealabs", check_dealabs)
     ]
     
-    for name, func in sources:
-        print(f"📱 {name}...")
-        found = func()
-        total += found
-        print(f"   └─ Найдено: {found}")
+    with trace('check_all_sources') as root:
+        for name, func in sources:
+            print(f"📱 {name}...")
+            with span(f"source:{name}") as node:
+                found = func()
+                if node is not None:
+                    node.attrs['found'] = found
+            total += found
+            
+            # Транзакция — на источник: записи одного источника не ждут запросов следующего
+            uow = current_unit_of_work()
+            if uow is not None:
+                uow.commit()
+            print(f"   └─ Найдено: {found}")
+        
+        if root is not None:
+            root.attrs['found'] = total
     
     print("="*50)
     print(f"✅ ВСЕГО: {total}")
@@ -577,6 +2680,473 @@ def check_all_sources():
     
     return total
 
+# ========================================
+# КООРДИНАЦИЯ ПРОВЕРОК
+# ========================================
+
+HOLDER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+def acquire_lease(name, seconds, holder=HOLDER_ID):
+    """Пытается взять аренду блокировки в БД"""
+    session = Session()
+    try:
+        with immediate_writes():
+            return _acquire_lease(session, name, seconds, holder)
+    except Exception as e:
+        # Ошибка БД — не «блокировка занята»: ждать её бессмысленно
+        print(f"❌ Ошибка блокировки {name}: {e}")
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def _acquire_lease(session, name, seconds, holder):
+    """Создаёт строку блокировки при необходимости и берёт аренду"""
+    if session.get(Lease, name) is None:
+        session.add(Lease(name=name))
+        try:
+            session.commit()
+        except Exception:
+            # Строку успел создать другой процесс
+            session.rollback()
+    
+    now = datetime.utcnow()
+    taken = session.query(Lease).filter(
+        Lease.name == name,
+        or_(Lease.holder.is_(None), Lease.holder == holder, Lease.expires_at < now)
+    ).update({
+        'holder': holder,
+        'expires_at': now + timedelta(seconds=seconds)
+    }, synchronize_session=False)
+    session.commit()
+    _count_commit()
+    return taken == 1
+
+def release_lease(name, holder=HOLDER_ID, result=None):
+    """Снимает аренду и сохраняет результат для других процессов"""
+    session = Session()
+    try:
+        values = {'holder': None, 'expires_at': None}
+        if result is not None:
+            values.update({'result': result, 'finished_at': datetime.utcnow()})
+        session.query(Lease).filter_by(name=name, holder=holder).update(
+            values, synchronize_session=False
+        )
+        session.commit()
+        _count_commit()
+    except Exception as e:
+        print(f"❌ Ошибка снятия блокировки {name}: {e}")
+        session.rollback()
+    finally:
+        session.close()
+
+def get_lease(name):
+    """Читает строку блокировки"""
+    session = Session()
+    try:
+        return session.get(Lease, name)
+    finally:
+        session.close()
+
+class _Flight:
+    """Один идущий запуск операции"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class LeaseTimeout(Exception):
+    """Блокировку не удалось взять за отведённое время"""
+
+class SingleFlight:
+    """Склеивает одновременные запуски операции в потоках и процессах"""
+
+    def __init__(self, name, lease_seconds=SWEEP_LEASE_SECONDS, wait_seconds=None):
+        self.name = name
+        self.lease_seconds = lease_seconds
+        # Аренда держателя истекает за lease_seconds — дольше ждать незачем
+        self.wait_seconds = lease_seconds if wait_seconds is None else wait_seconds
+        self._lock = threading.Lock()
+        self._flight = None
+        self._last_result = None
+        self._last_at = 0.0
+        self.joined = 0
+        self.reused = 0
+
+    def run(self, func, max_age=0):
+        """Запускает func или присоединяется к уже идущему запуску"""
+        # Не держим блокировки записи SQLite, пока ждём чужую проверку
+        uow = current_unit_of_work()
+        if uow is not None:
+            uow.commit()
+        
+        with self._lock:
+            if max_age and self._last_at and time.time() - self._last_at <= max_age:
+                self.reused += 1
+                return self._last_result
+            
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._flight = _Flight()
+            else:
+                self.joined += 1
+        
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        
+        try:
+            flight.result = self._run_locked(func, max_age)
+            with self._lock:
+                self._last_result = flight.result
+                self._last_at = time.time()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flight = None
+            flight.done.set()
+
+    def _run_locked(self, func, max_age):
+        """Выполняет func под межпроцессной блокировкой в БД"""
+        waiting_since = datetime.utcnow()
+        deadline = time.monotonic() + self.wait_seconds
+        while not acquire_lease(self.name, self.lease_seconds):
+            if time.monotonic() >= deadline:
+                raise LeaseTimeout(f"{self.name}: блокировка занята дольше {self.wait_seconds} с")
+            time.sleep(min(1, self.wait_seconds))
+        
+        result = None
+        try:
+            lease = get_lease(self.name)
+            if lease is not None and lease.finished_at is not None:
+                age = (datetime.utcnow() - lease.finished_at).total_seconds()
+                # Другой процесс закончил, пока мы ждали, или результат свежий
+                if lease.finished_at >= waiting_since or (max_age and age <= max_age):
+                    with self._lock:
+                        self.joined += 1
+                    return lease.result
+            
+            with unit_of_work() as uow:
+                result = func()
+                # Игры должны попасть в БД до снятия блокировки
+                uow.commit()
+            return result
+        finally:
+            release_lease(self.name, result=result)
+
+def claim_rows(table, columns, due, order, limit, lease_seconds, holder=HOLDER_ID):
+    """Берёт в аренду до limit строк table, подходящих под условие due"""
+    now = datetime.utcnow()
+    params = {
+        'holder': holder,
+        'now': now,
+        'expires': now + timedelta(seconds=lease_seconds),
+        'limit': limit
+    }
+    free = "(lease_holder IS NULL OR lease_expires_at < :now)"
+    
+    with write_transaction() as conn:
+        if engine.dialect.name == 'postgresql':
+            return conn.execute(text(f"""
+                UPDATE {table} SET lease_holder = :holder, lease_expires_at = :expires
+                WHERE id IN (
+                    SELECT id FROM {table}
+                    WHERE {due} AND {free}
+                    ORDER BY {order}
+                    LIMIT :limit
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING {columns}
+            """), params).all()
+        
+        # SQLite: SKIP LOCKED нет — берём кандидатов условным UPDATE по одному
+        candidates = conn.execute(text(f"""
+            SELECT {columns} FROM {table}
+            WHERE {due} AND {free}
+            ORDER BY {order}
+            LIMIT :limit
+        """), params).all()
+        
+        claimed = []
+        for row in candidates:
+            taken = conn.execute(text(f"""
+                UPDATE {table} SET lease_holder = :holder, lease_expires_at = :expires
+                WHERE id = :id AND {free}
+            """), dict(params, id=row.id)).rowcount
+            if taken:
+                claimed.append(row)
+        return claimed
+
+sweep_flight = SingleFlight('check_all_sources')
+
+def run_check(max_age=0):
+    """Проверка всех источников без параллельных дублей"""
+    return sweep_flight.run(check_all_sources, max_age)
+
+# ========================================
+# РАСПРЕДЕЛЁННЫЙ ОПРОС
+# ========================================
+
+JOB_HANDLERS = {
+    'reddit': check_reddit_group,
+    'dealabs': check_dealabs_feed,
+    'steamdb': lambda target: check_steamdb(),
+    'epic': lambda target: check_epic_games(),
+}
+
+# Источники, задания которых синхронизируются с конфигурацией
+CONFIG_JOB_SOURCES = ('reddit', 'dealabs', 'steamdb', 'epic')
+
+ClaimedJob = namedtuple('ClaimedJob', 'id source target interval')
+
+def configured_jobs():
+    """(source, target) для каждого URL из конфигурации"""
+    jobs = [('reddit', '+'.join(group)) for group in reddit_groups()]
+    jobs += [('dealabs', url) for url in RSS_SOURCES['dealabs']]
+    jobs += [('steamdb', DIRECT_SOURCES['steamdb']), ('epic', DIRECT_SOURCES['epic'])]
+    return jobs
+
+def sync_jobs():
+    """Приводит таблицу заданий в соответствие с конфигурацией"""
+    wanted = set(configured_jobs())
+    try:
+        with db_session(write=True) as session:
+            existing = {
+                (job.source, job.target): job
+                for job in session.query(PollJob).filter(PollJob.source.in_(CONFIG_JOB_SOURCES))
+            }
+            for source, target in wanted - existing.keys():
+                session.add(PollJob(
+                    source=source,
+                    target=target,
+                    interval=POLL_INTERVAL,
+                    enabled=True,
+                    next_run_at=datetime.utcnow()
+                ))
+            for key, job in existing.items():
+                job.enabled = key in wanted
+    except Exception as e:
+        # Задания одновременно создал другой воркер
+        print(f"⚠️ Синхронизация заданий: {e}")
+
+def claim_jobs(limit=1, holder=HOLDER_ID):
+    """Берёт в аренду до limit созревших заданий"""
+    rows = claim_rows(
+        'poll_jobs', 'id, source, target, interval',
+        'enabled AND next_run_at <= :now', 'next_run_at',
+        limit, JOB_LEASE_SECONDS, holder
+    )
+    return [ClaimedJob(*row) for row in rows]
+
+def renew_jobs(job_ids, holder=HOLDER_ID):
+    """Продлевает аренду заданий, которые ещё выполняются"""
+    if not job_ids:
+        return
+    with write_transaction() as conn:
+        conn.execute(
+            update(PollJob.__table__)
+            .where(PollJob.id.in_(job_ids), PollJob.lease_holder == holder)
+            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS))
+        )
+
+def release_job(job, started_at, error=None, holder=HOLDER_ID):
+    """Снимает аренду и назначает следующий запуск через интервал"""
+    with write_transaction() as conn:
+        conn.execute(
+            update(PollJob.__table__)
+            .where(PollJob.id == job.id, PollJob.lease_holder == holder)
+            .values(
+                lease_holder=None,
+                lease_expires_at=None,
+                next_run_at=started_at + timedelta(seconds=job.interval),
+                last_run_at=started_at,
+                last_error=error,
+                runs=PollJob.runs + 1
+            )
+        )
+
+def next_job_due():
+    """Через сколько секунд созреет ближайшее задание"""
+    with db_session() as session:
+        due = session.query(func.min(PollJob.next_run_at)).filter(PollJob.enabled.is_(True)).scalar()
+    if due is None:
+        return POLL_INTERVAL
+    return max(0.0, (due - datetime.utcnow()).total_seconds())
+
+def run_worker(stop=None, sync=True, batch=1, idle=5):
+    """Воркер распределённого опроса: берёт задания, пока не остановят"""
+    stop = stop or threading.Event()
+    held = set()
+    held_lock = threading.Lock()
+    
+    def renew_loop():
+        while not stop.wait(JOB_LEASE_SECONDS / 3):
+            with held_lock:
+                job_ids = list(held)
+            try:
+                renew_jobs(job_ids)
+            except Exception as e:
+                print(f"❌ Продление аренды: {e}")
+    
+    threading.Thread(target=renew_loop, name='lease-renewer', daemon=True).start()
+    
+    synced_at = 0.0
+    while not stop.is_set():
+        try:
+            if sync and time.time() - synced_at > REDDIT_REGROUP_SECONDS:
+                sync_jobs()
+                synced_at = time.time()
+            
+            jobs = claim_jobs(batch)
+            if not jobs:
+                stop.wait(min(idle, next_job_due()) or 0.1)
+                continue
+            
+            for job in jobs:
+                with held_lock:
+                    held.add(job.id)
+                started_at = datetime.utcnow()
+                error = None
+                try:
+                    with unit_of_work(), trace(f"job:{job.source}", target=job.target):
+                        JOB_HANDLERS[job.source](job.target)
+                except Exception as e:
+                    error = repr(e)
+                    print(f"❌ Задание {job.source} {job.target}: {e}")
+                finally:
+                    release_job(job, started_at, error)
+                    with held_lock:
+                        held.discard(job.id)
+                    stats_runtime['total_checks'] += 1
+                    stats_runtime['last_check'] = started_at.strftime('%H:%M:%S')
+        
+        except Exception as e:
+            print(f"❌ Воркер: {e}")
+            stop.wait(idle)
+
+# ========================================
+# ОЧЕРЕДЬ УВЕДОМЛЕНИЙ
+# ========================================
+
+outbox_wakeup = threading.Event()
+
+outbox_metrics = {
+    'sent': 0,
+    'retried': 0,
+    'dropped': 0,
+    'failed': 0
+}
+
+OutboxItem = namedtuple('OutboxItem', 'id game_id chat_id text reply_markup attempts')
+
+def claim_notifications(limit=OUTBOX_BATCH):
+    """Берёт в аренду пачку уведомлений, которым пора уйти"""
+    rows = claim_rows(
+        'outbox', 'id, game_id, chat_id, text, reply_markup, attempts',
+        'next_attempt_at <= :now', 'id',
+        limit, limit * (OUTBOX_SEND_DELAY + 15)
+    )
+    return [OutboxItem(*row) for row in rows]
+
+def complete_notification(item, delivered=True):
+    """Удаляет уведомление; доставленное помечает игру как отправленную"""
+    with write_transaction() as conn:
+        conn.execute(Notification.__table__.delete().where(Notification.id == item.id))
+        if delivered and item.game_id is not None:
+            conn.execute(
+                update(Game.__table__).where(Game.id == item.game_id).values(sent=True)
+            )
+
+def retry_notification(item, error, retry_after=None):
+    """Откладывает уведомление с экспоненциальной паузой"""
+    attempts = item.attempts + 1
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        # Больше не пробуем: next_attempt_at = NULL, ошибка остаётся в строке
+        next_attempt_at = None
+        outbox_metrics['failed'] += 1
+    else:
+        delay = retry_after or min(OUTBOX_MAX_BACKOFF, 5 * 2 ** item.attempts)
+        next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        outbox_metrics['retried'] += 1
+    
+    with write_transaction() as conn:
+        conn.execute(
+            update(Notification.__table__).where(Notification.id == item.id).values(
+                attempts=attempts,
+                next_attempt_at=next_attempt_at,
+                last_error=(error or '')[:500],
+                lease_holder=None,
+                lease_expires_at=None
+            )
+        )
+
+def release_notifications(items, holder=HOLDER_ID):
+    """Снимает аренду с уведомлений, до которых пачка не дошла"""
+    with write_transaction() as conn:
+        conn.execute(
+            update(Notification.__table__)
+            .where(Notification.id.in_([item.id for item in items]), Notification.lease_holder == holder)
+            .values(lease_holder=None, lease_expires_at=None)
+        )
+
+def dispatch_outbox(limit=OUTBOX_BATCH):
+    """Отправляет одну пачку уведомлений; возвращает её размер"""
+    items = claim_notifications(limit)
+    pending = deque(items)
+    enabled = {}
+    
+    try:
+        while pending:
+            item = pending.popleft()
+            # Настройки читаем один раз на чат за пачку
+            if item.chat_id not in enabled:
+                enabled[item.chat_id] = get_user_settings(item.chat_id).notifications
+            
+            if not enabled[item.chat_id]:
+                complete_notification(item, delivered=False)
+                outbox_metrics['dropped'] += 1
+                continue
+            
+            ok, error, retry_after = deliver_telegram(item.text, item.chat_id, item.reply_markup)
+            if ok:
+                complete_notification(item)
+                outbox_metrics['sent'] += 1
+            else:
+                print(f"⚠️ Уведомление {item.id}: {error}")
+                retry_notification(item, error, retry_after)
+            
+            time.sleep(OUTBOX_SEND_DELAY)
+    finally:
+        # Сбой посреди пачки: неотправленные сразу возвращаем в очередь,
+        # а не ждём конца аренды всей пачки
+        if pending:
+            try:
+                release_notifications(pending)
+            except Exception as e:
+                print(f"❌ Возврат уведомлений в очередь: {e}")
+    
+    return len(items)
+
+def run_outbox(stop=None):
+    """Диспетчер: разбирает очередь уведомлений, в т.ч. оставшуюся после рестарта"""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            if dispatch_outbox():
+                continue
+        except Exception as e:
+            print(f"❌ Диспетчер уведомлений: {e}")
+        
+        outbox_wakeup.wait(OUTBOX_IDLE)
+        outbox_wakeup.clear()
+
 # ========================================
 # КОМАНДЫ
 # ========================================
@@ -631,7 +3201,7 @@ def handle_command(text, chat_id):
     
     elif text == '🔍 Проверить' or text == '/check':
         send_telegram("🔍 Запускаю проверку...", chat_id)
-        found = check_all_sources()
+        found = run_check(MANUAL_CHECK_FRESH)
         
         if found > 0:
                         send_telegram(f"✅ Найдено: <b>{found}</b> игр!\n\nСмотрите выше ⬆️", chat_id)
@@ -662,14 +3232,18 @@ def handle_command(text, chat_id):
         
         sources_text = "\n".join(source_list) if source_list else "Нет данных"
         
+        subreddits = [subreddit_name(url) for url in RSS_SOURCES['reddit']]
+        found = {name: stats['by_feed'].get(f"reddit:{name.lower()}") for name in subreddits if name}
+        reddit_text = "\n".join(
+            f"• r/{name}" + (f" ({count})" if count else "")
+            for name, count in found.items()
+        )
+        
         send_telegram(f"""
 📈 <b>АКТИВНЫЕ ИСТОЧНИКИ</b>
 
 <b>Reddit (RSS):</b>
-• r/FreeGamesOnSteam
-• r/FreeGameFindings
-• r/freegames
-• r/GameDeals
+{reddit_text}
 
 <b>Прямые:</b>
 • SteamDB (парсинг)
@@ -726,6 +3300,30 @@ def handle_command(text, chat_id):
 Продолжить?
         """, chat_id, confirm_buttons)
     
+    elif text.split()[:1] == ['/search']:
+        query, filters = parse_search_command(text)
+        
+        if not query:
+            send_telegram("🔎 Использование: <code>/search название [source:reddit] [platform:steam]</code>", chat_id)
+            return
+        
+        games = search_games(query, limit=10, **filters)
+        # Запрос и названия — текст пользователя и источников, а сообщение — HTML
+        query = html.escape(query)
+        
+        if games:
+            games_text = "\n\n".join([
+                f"🎮 <b>{html.escape(g['title'][:60])}</b>\n   📦 {g['source']} • {g['found_at'].strftime('%d.%m.%Y')}\n   🔗 {html.escape(g['link'])}"
+                for g in games
+            ])
+            send_telegram(f"""
+🔎 <b>ПОИСК: {query}</b>
+
+{games_text}
+            """, chat_id)
+        else:
+            send_telegram(f"🔎 По запросу «{query}» ничего не найдено", chat_id)
+    
     elif text == '/help' or text == '❓ Помощь':
         send_telegram("""
 ❓ <b>ПОМОЩЬ</b>
@@ -737,6 +3335,7 @@ def handle_command(text, chat_id):
 📈 Источники - Список источников
 🎮 Последние игры - История находок
 🗑️ Очистить - Очистить базу
+🔎 /search - Поиск по истории
 
 <b>Возможности:</b>
 ✅ Автопроверка каждые 5 минут
@@ -749,6 +3348,9 @@ def handle_command(text, chat_id):
 🎮 Steam, Epic, GOG, и другие
         """, chat_id)
 
+# Пороги кнопки «Цена»: раздачи дешевле порога не присылаются
+PRICE_STEPS = [0, 5, 10, 20, 50]
+
 def handle_callback(callback_query):
     """Обработка кнопок"""
     callback_id = callback_query['id']
@@ -756,8 +3358,6 @@ def handle_callback(callback_query):
     chat_id = callback_query['message']['chat']['id']
     message_id = callback_query['message']['message_id']
     
-    answer_url = f"https://api.telegram.org/bot{TOKEN}/answerCallbackQuery"
-    edit_url = f"https://api.telegram.org/bot{TOKEN}/editMessageText"
     
     if data == "toggle_notif":
         settings = get_user_settings(chat_id)
@@ -765,49 +3365,39 @@ def handle_callback(callback_query):
         update_settings(chat_id, notifications=new_status)
         
         status = "включены" if new_status else "выключены"
-        requests.post(answer_url, json={
-            "callback_query_id": callback_id,
-            "text": f"Уведомления {status}!"
-        })
+        answer_callback(callback_id, f"Уведомления {status}!")
         
         # Обновляем клавиатуру
-        requests.post(edit_url, json={
-            "chat_id": chat_id,
-            "message_id": message_id,
-            "text": "⚙️ <b>НАСТРОЙКИ</b>\n\nИспользуйте кнопки ниже:",
-            "parse_mode": "HTML",
-            "reply_markup": get_settings_keyboard(chat_id)
-        })
+        edit_message(chat_id, message_id, "⚙️ <b>НАСТРОЙКИ</b>\n\nИспользуйте кнопки ниже:",
+                     get_settings_keyboard(chat_id))
     
     elif data.startswith("plat_"):
         platform = data.replace("plat_", "")
         update_settings(chat_id, platforms=platform)
         
-        requests.post(answer_url, json={
-            "callback_query_id": callback_id,
-            "text": f"Платформа: {platform.upper()}"
-        })
+        answer_callback(callback_id, f"Платформа: {platform.upper()}")
         
-        requests.post(edit_url, json={
-            "chat_id": chat_id,
-            "message_id": message_id,
-            "text": "⚙️ <b>НАСТРОЙКИ</b>\n\nИспользуйте кнопки ниже:",
-            "parse_mode": "HTML",
-            "reply_markup": get_settings_keyboard(chat_id)
-        })
+        edit_message(chat_id, message_id, "⚙️ <b>НАСТРОЙКИ</b>\n\nИспользуйте кнопки ниже:",
+                     get_settings_keyboard(chat_id))
+    
+    elif data == "menu_price":
+        # Перебираем пороги по кругу
+        settings = get_user_settings(chat_id)
+        higher = [step for step in PRICE_STEPS if step > settings.min_price]
+        min_price = float(higher[0] if higher else PRICE_STEPS[0])
+        update_settings(chat_id, min_price=min_price)
+        
+        answer_callback(callback_id, f"Мин. цена: ${int(min_price)}")
+        
+        edit_message(chat_id, message_id, "⚙️ <b>НАСТРОЙКИ</b>\n\nИспользуйте кнопки ниже:",
+                     get_settings_keyboard(chat_id))
     
     elif data == "settings_done":
-        requests.post(answer_url, json={
-            "callback_query_id": callback_id,
-            "text": "✅ Настройки сохранены!"
-        })
+        answer_callback(callback_id, "✅ Настройки сохранены!")
         
         settings = get_user_settings(chat_id)
         
-        requests.post(edit_url, json={
-            "chat_id": chat_id,
-            "message_id": message_id,
-            "text": f"""
+        edit_message(chat_id, message_id, f"""
 ✅ <b>НАСТРОЙКИ СОХРАНЕНЫ</b>
 
 🔔 Уведомления: {'ВКЛ' if settings.notifications else 'ВЫКЛ'}
@@ -815,15 +3405,10 @@ def handle_callback(callback_query):
 💰 Мин. цена: ${settings.min_price}
 
 <i>Настройки применены!</i>
-            """,
-            "parse_mode": "HTML"
-        })
+            """)
     
     elif data == "confirm_clear":
-        requests.post(answer_url, json={
-            "callback_query_id": callback_id,
-            "text": "🗑️ Очищаю..."
-        })
+        answer_callback(callback_id, "🗑️ Очищаю...")
         
         old_count = get_total_games()
         clear_database()
@@ -836,7 +3421,7 @@ def handle_callback(callback_query):
 🔄 Запускаю проверку...
         """, chat_id)
         
-        found = check_all_sources()
+        found = run_check()
         
         send_telegram(f"""
 ✅ <b>ГОТОВО!</b>
@@ -848,17 +3433,11 @@ def handle_callback(callback_query):
         """, chat_id)
     
     elif data == "cancel_clear":
-        requests.post(answer_url, json={
-            "callback_query_id": callback_id,
-            "text": "❌ Отменено"
-        })
+        answer_callback(callback_id, "❌ Отменено")
         send_telegram("❌ Очистка отменена", chat_id)
     
     else:
-        requests.post(answer_url, json={
-            "callback_query_id": callback_id,
-            "text": "✅"
-        })
+        answer_callback(callback_id, "✅")
 
 # ========================================
 # FLASK
@@ -1033,36 +3612,215 @@ def health():
         "status": "ok",
         "uptime_hours": int((datetime.utcnow() - stats_runtime['started_at']).total_seconds() // 3600),
         "total_games": get_total_games(),
-        "checks": stats_runtime['total_checks']
+        "checks": stats_runtime['total_checks'],
+        "db_commits": db_metrics['commits'],
+        "db_commits_last_cycle": db_metrics['last_cycle_commits'],
+        "checks_joined": sweep_flight.joined,
+        "checks_reused": sweep_flight.reused,
+        "stream_subscribers": game_broker.subscriber_count(),
+        "stream_dropped": game_broker.dropped,
+        "fetch_bytes": fetch_metrics['bytes'],
+        "fetch_too_large": fetch_metrics['too_large'],
+        "feed_gaps": fetch_metrics['feed_gaps'],
+        "reddit_requests": reddit_state['requests'],
+        "reddit_rate_limited": reddit_state['rate_limited'],
+        "reddit_splits": reddit_state['splits'],
+        "reddit_gaps": reddit_state['gaps'],
+        "epic_requests": epic_state['requests'],
+        "outbox": outbox_metrics,
+        "enrich": dict(enrich_metrics, cached=len(store_cache)),
+        "parse": parse_metrics,
+        "archive": archive_metrics,
+        "updates": dict(updates_metrics, mode=UPDATES_MODE),
+        "epic_next_window": next_epic_window().isoformat() if next_epic_window() else None
     })
 
 @app.route('/api/stats')
 def api_stats():
     """API статистики"""
     stats = get_statistics(7)
+    by_source, by_platform = get_game_counts()
     return jsonify({
         "total_games": get_total_games(),
         "week_stats": stats,
-        "recent_games": get_recent_games(10)
+        "recent_games": get_recent_games(10),
+        "games_by_source": by_source,
+        "games_by_platform": by_platform
+    })
+
+def _request_filters():
+    """Фильтры source/platform/since/until из query string"""
+    since = request.args.get('since')
+    until = request.args.get('until')
+    return {
+        'source': request.args.get('source'),
+        'platform': request.args.get('platform'),
+        'since': datetime.fromisoformat(since) if since else None,
+        'until': datetime.fromisoformat(until) if until else None
+    }
+
+def _game_json(game):
+    """Игра в JSON-совместимом виде"""
+    return dict(game, found_at=game['found_at'].isoformat() if game['found_at'] else None)
+
+@app.route('/api/search')
+def api_search():
+    """API поиска по истории"""
+    query = request.args.get('q', '')
+    try:
+        games = search_games(
+            query,
+            limit=max(1, min(int(request.args.get('limit', 20)), 100)),
+            **_request_filters()
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({
+        "query": query,
+        "backend": SEARCH_BACKEND or 'like',
+        "results": [_game_json(g) for g in games]
+    })
+
+@app.route('/api/games')
+def api_games():
+    """API истории с курсорной пагинацией"""
+    try:
+        games, next_cursor = list_games(
+            limit=max(1, min(int(request.args.get('limit', 50)), 500)),
+            cursor=request.args.get('cursor'),
+            **_request_filters()
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({
+        "games": [_game_json(g) for g in games],
+        "next_cursor": next_cursor
+    })
+
+@app.route('/api/games/export')
+def api_games_export():
+    """Потоковая выгрузка всей истории в NDJSON или CSV"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    try:
+        filters = _request_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    def generate_ndjson():
+        for game in iter_games(**filters):
+            yield json.dumps(_game_json(game), ensure_ascii=False) + "\n"
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(GAME_COLUMNS)
+        for game in iter_games(**filters):
+            writer.writerow(_game_json(game)[name] for name in GAME_COLUMNS)
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    if fmt == 'csv':
+        return Response(generate_csv(), mimetype='text/csv', headers={
+            'Content-Disposition': 'attachment; filename=games.csv'
+        })
+    return Response(generate_ndjson(), mimetype='application/x-ndjson')
+
+@app.route('/api/stream')
+def api_stream():
+    """Живая лента новых игр (Server-Sent Events)"""
+    if game_broker.subscriber_count() >= SSE_MAX_CLIENTS:
+        return jsonify({"error": "too many subscribers"}), 503
+    
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({"error": "invalid Last-Event-ID"}), 400
+    
+    stream_poller.start()
+    # Подписываемся до чтения отметки: игра, закоммиченная между ними, останется в буфере
+    buffer = game_broker.subscribe()
+    try:
+        # Новый клиент получает игры начиная с текущей последней
+        start_id = last_game_id() if last_id is None else last_id
+    except Exception:
+        game_broker.unsubscribe(buffer)
+        raise
+    
+    # Простаивающий клиент спит на брокере и не ходит в БД: игры других процессов
+    # публикует общий stream_poller. Поток Werkzeug на клиента ограничивает SSE_MAX_CLIENTS
+    def stream():
+        sent_id = start_id
+        try:
+            yield f"retry: {SSE_HEARTBEAT * 1000}\n\n"
+            for game in games_since(sent_id):
+                sent_id = game['id']
+                yield format_sse(game)
+            
+            while True:
+                games = game_broker.wait(buffer, SSE_HEARTBEAT)
+                if not games:
+                    yield ": ping\n\n"
+                    continue
+                for game in sorted(games, key=lambda g: g['id']):
+                    if game['id'] > sent_id:
+                        sent_id = game['id']
+                        yield format_sse(game)
+        finally:
+            game_broker.unsubscribe(buffer)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
+@app.route('/debug/profile')
+def debug_profile():
+    """Семплирующий профиль всех потоков в свёрнутых стеках"""
+    token = request.headers.get('X-Debug-Token') or request.args.get('token') or ''
+    # compare_digest принимает str только из ASCII — сравниваем байты
+    if not DEBUG_TOKEN or not hmac.compare_digest(token.encode(), DEBUG_TOKEN.encode()):
+        return jsonify({"error": "not found"}), 404
+    
+    try:
+        seconds = min(max(float(request.args.get('seconds', 10)), 0.1), 60)
+        interval = min(max(float(request.args.get('interval', 0.005)), 0.001), 1)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    counts = sample_stacks(seconds, interval)
+    body = "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
+    return Response(body + "\n", mimetype='text/plain')
+
+def dispatch_update(update):
+    """Передаёт апдейт обработчику кнопок или команд"""
+    if 'callback_query' in update:
+        handle_callback(update['callback_query'])
+        return
+    
+    if 'message' in update:
+        message = update['message']
+        text = message.get('text', '')
+        chat_id = message['chat']['id']
+        
+        if str(chat_id) == str(CHAT_ID):
+            handle_command(text, chat_id)
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Webhook Telegram"""
     try:
         update = request.get_json()
         
-        if 'callback_query' in update:
-            handle_callback(update['callback_query'])
-            return {"ok": True}
-        
-        if 'message' in update:
-            message = update['message']
-            text = message.get('text', '')
-            chat_id = message['chat']['id']
-            
-            if str(chat_id) == str(CHAT_ID):
-                handle_command(text, chat_id)
+        with unit_of_work():
+            dispatch_update(update)
         
         return {"ok": True}
     except Exception as e:
@@ -1077,15 +3835,21 @@ def setup_webhook():
     """Устанавливает webhook"""
     time.sleep(10)
     
-    webhook_url = f"https://botiphone.onrender.com/webhook"
-    api_url = f"https://api.telegram.org/bot{TOKEN}/setWebhook"
+    api_url = f"{TELEGRAM_API}/bot{TOKEN}/setWebhook"
     
     try:
-        response = requests.post(api_url, json={"url": webhook_url})
+        response = requests.post(api_url, json={"url": WEBHOOK_URL})
         if response.status_code == 200:
-            print(f"✅ Webhook: {webhook_url}")
-            
-            send_telegram(f"""
+            print(f"✅ Webhook: {WEBHOOK_URL}")
+            announce_start()
+        else:
+            print(f"⚠️ Webhook error: {response.text}")
+    except Exception as e:
+        print(f"❌ Setup error: {e}")
+
+def announce_start():
+    """Сообщение о запуске бота"""
+    send_telegram(f"""
 🚀 <b>МЕГА-БОТ v2.0 ЗАПУЩЕН!</b>
 
 ✅ PostgreSQL подключена
@@ -1096,11 +3860,136 @@ def setup_webhook():
 💾 История сохраняется навсегда
 
 <i>Работаю в фоне...</i>
-            """)
-        else:
-            print(f"⚠️ Webhook error: {response.text}")
+    """)
+
+# ========================================
+# ПРИЁМ АПДЕЙТОВ (getUpdates)
+# ========================================
+
+# Отметка последнего обработанного апдейта в feed_marks
+UPDATES_MARK = 'telegram:updates'
+
+UpdateMark = namedtuple('UpdateMark', 'id published')
+
+updates_metrics = {
+    'batches': 0,
+    'updates': 0,
+    'errors': 0,
+    'offset': None
+}
+
+def load_update_offset():
+    """offset для getUpdates: следующий после последнего обработанного"""
+    mark = get_feed_marks(UPDATES_MARK).get(UPDATES_MARK)
+    return int(mark.entry_id) + 1 if mark and mark.entry_id else None
+
+def save_update_offset(update_id):
+    """Запоминает последний обработанный апдейт"""
+    set_feed_mark(UPDATES_MARK, UpdateMark(str(update_id), datetime.utcnow()))
+
+def get_updates(offset, timeout=UPDATES_TIMEOUT):
+    """Пачка апдейтов long polling: ответ приходит сразу или через timeout секунд"""
+    params = {
+        "limit": UPDATES_LIMIT,
+        "timeout": timeout,
+        "allowed_updates": ["message", "callback_query"]
+    }
+    if offset is not None:
+        params["offset"] = offset
+    
+    response = requests.post(f"{TELEGRAM_API}/bot{TOKEN}/getUpdates", json=params, timeout=timeout + 10)
+    if response.status_code != 200:
+        raise FetchError(f"getUpdates HTTP {response.status_code}: {response.text[:200]}", response.status_code)
+    return response.json().get('result') or []
+
+# Команды, запускающие проверку всех источников
+CHECK_COMMANDS = ('/check', '🔍 Проверить')
+CHECK_CALLBACKS = ('confirm_clear',)
+
+# Проверки из апдейтов — по одной в своём потоке, приём апдейтов их не ждёт
+check_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='check')
+
+def starts_check(update):
+    """Апдейт запускает проверку всех источников"""
+    if 'callback_query' in update:
+        return update['callback_query'].get('data') in CHECK_CALLBACKS
+    return update.get('message', {}).get('text') in CHECK_COMMANDS
+
+def dispatch_check(update):
+    """Апдейт с проверкой вне пачки: своя единица работы, ответы уходят сразу"""
+    try:
+        with unit_of_work():
+            dispatch_update(update)
     except Exception as e:
-        print(f"❌ Setup error: {e}")
+        updates_metrics['errors'] += 1
+        print(f"❌ Апдейт {update.get('update_id')}: {e}")
+
+def process_updates(updates):
+    """Пачка апдейтов одной единицей работы: настройки читаются и ответы уходят один раз на чат"""
+    checks = []
+    with reply_batch(), unit_of_work():
+        for update in updates:
+            if starts_check(update):
+                # Проверка идёт минутами: запускаем её после коммита пачки, а не в ней
+                checks.append(update)
+                continue
+            try:
+                dispatch_update(update)
+            except Exception as e:
+                updates_metrics['errors'] += 1
+                print(f"❌ Апдейт {update.get('update_id')}: {e}")
+        # Отметка коммитится вместе с результатами пачки
+        save_update_offset(updates[-1]['update_id'])
+    
+    # Пачка закоммичена и её ответы отправлены: повтор по одному не запустит проверки дважды
+    for update in checks:
+        check_executor.submit(dispatch_check, update)
+    
+    updates_metrics['batches'] += 1
+    updates_metrics['updates'] += len(updates)
+    return updates[-1]['update_id'] + 1
+
+def process_updates_safely(updates):
+    """Пачка целиком, при сбое — по одному апдейту; сбойный пропускается"""
+    try:
+        return process_updates(updates)
+    except Exception as e:
+        print(f"⚠️ Пачка апдейтов: {e}, обрабатываю по одному")
+    
+    for update in updates:
+        try:
+            process_updates([update])
+        except Exception as e:
+            updates_metrics['errors'] += 1
+            print(f"❌ Апдейт {update['update_id']} пропущен: {e}")
+            save_update_offset(update['update_id'])
+    return updates[-1]['update_id'] + 1
+
+def run_updates(stop=None):
+    """Long polling getUpdates вместо вебхука"""
+    stop = stop or threading.Event()
+    
+    # Пока установлен webhook, getUpdates отвечает 409
+    try:
+        requests.post(f"{TELEGRAM_API}/bot{TOKEN}/deleteWebhook", json={}, timeout=10)
+        announce_start()
+    except Exception as e:
+        print(f"⚠️ deleteWebhook: {e}")
+    
+    offset = load_update_offset()
+    print(f"📥 getUpdates: offset {offset}")
+    
+    while not stop.is_set():
+        try:
+            updates = get_updates(offset)
+        except Exception as e:
+            print(f"❌ getUpdates: {e}")
+            stop.wait(5)
+            continue
+        
+        if updates:
+            offset = process_updates_safely(updates)
+            updates_metrics['offset'] = offset
 
 # ========================================
 # ОСНОВНОЙ ЦИКЛ
@@ -1110,6 +3999,10 @@ def run_bot():
     """Главный цикл"""
     time.sleep(15)
     
+    if POLL_MODE == 'jobs':
+        run_worker()
+        return
+    
     while True:
         try:
             current_time = datetime.utcnow().strftime('%H:%M:%S')
@@ -1118,7 +4011,7 @@ def run_bot():
             print(f"💾 В базе: {get_total_games()} игр")
             print(f"{'='*50}")
             
-            found = check_all_sources()
+            found = run_check()
             
             stats_runtime['total_checks'] += 1
             stats_runtime['last_check'] = current_time
@@ -1128,10 +4021,10 @@ def run_bot():
             else:
                 print("ℹ️ Нет новых")
             
-            print(f"💤 Следующая через 5 минут...")
+            print(f"💤 Следующая через {POLL_INTERVAL // 60} мин...")
             print(f"{'='*50}\n")
             
-            time.sleep(300)
+            time.sleep(POLL_INTERVAL)
             
         except Exception as e:
             print(f"❌ Error: {e}")
@@ -1141,6 +4034,10 @@ def run_bot():
 # ЗАПУСК
 # ========================================
 
+setup_search_index()
+migrate_item_keys()
+game_store.ready()
+
 print("=" * 50)
 print("🚀 МЕГА-БОТ v2.0 ЗАГРУЖАЕТСЯ...")
 print("=" * 50)
@@ -1148,15 +4045,34 @@ print(f"💾 PostgreSQL: {'✅' if 'postgresql' in DATABASE_URL else '⚠️ SQL
 print(f"📊 В базе: {get_total_games()} игр")
 print("=" * 50)
 
-if __name__ == '__main__':
-    # Webhook
-    webhook_thread = threading.Thread(target=setup_webhook, daemon=True)
-    webhook_thread.start()
+if __name__ == '__main__' and sys.argv[1:2] == ['worker']:
+    # Отдельный воркер распределённого опроса: python main.py worker
+    print(f"👷 Воркер {HOLDER_ID}")
+    # Пул — до первого потока: fork многопоточного процесса небезопасен
+    start_parse_pool()
+    threading.Thread(target=run_outbox, name='outbox', daemon=True).start()
+    run_worker()
+
+elif __name__ == '__main__':
+    # Пул разбора — до первого потока: fork многопоточного процесса небезопасен
+    start_parse_pool()
+    
+    # Апдейты: webhook или long polling
+    if UPDATES_MODE == 'polling':
+        updates_thread = threading.Thread(target=run_updates, name='updates', daemon=True)
+        updates_thread.start()
+    else:
+        webhook_thread = threading.Thread(target=setup_webhook, name='webhook-setup', daemon=True)
+        webhook_thread.start()
     
     # Бот
-    bot_thread = threading.Thread(target=run_bot, daemon=True)
+    bot_thread = threading.Thread(target=run_bot, name='poller', daemon=True)
     bot_thread.start()
     
+    # Уведомления
+    outbox_thread = threading.Thread(target=run_outbox, name='outbox', daemon=True)
+    outbox_thread.start()
+    
     # Flask
     port = int(os.environ.get('PORT', 10000))
     print(f"🌐 Flask: {port}")
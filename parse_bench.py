@@ -0,0 +1,199 @@
+"""Задержка /webhook во время цикла опроса: разбор в потоке против пула процессов
+
+Локальный сервер отдаёт большую RSS-ленту и таблицу в стиле SteamDB, поток
+«опроса» без остановки скачивает и разбирает их, а в /webhook с заданной
+частотой идут апдейты. Каждый режим (PARSE_WORKERS=0 и N) — отдельный процесс.
+
+Пример:
+    python parse_bench.py --workers 2 --duration 10 --rate 50
+"""
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from fake_telegram import FakeTelegram
+from loadtest import CHAT_ID, percentile, start_app, synthetic_corpus
+
+Mark = namedtuple('Mark', 'entry_id published')
+
+def synthetic_feed(items):
+    """RSS-лента из items записей с HTML в описании"""
+    parts = ['<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>bench</title>']
+    for i in range(items):
+        parts.append(
+            f"<item><title>[Steam] Bench game {i} is free</title>"
+            f"<link>https://example.com/deal/{i}</link><guid>bench-{i}</guid>"
+            f"<pubDate>Mon, 19 Oct 2026 12:{i % 60:02d}:00 +0000</pubDate>"
+            f"<description>&lt;p&gt;Grab it on &lt;a href=&quot;https://store.steampowered.com/app/{i}/&quot;&gt;Steam&lt;/a&gt;"
+            f" before the offer ends. {'Lorem ipsum dolor sit amet. ' * 12}&lt;/p&gt;</description></item>"
+        )
+    parts.append('</channel></rss>')
+    return ''.join(parts).encode()
+
+def synthetic_table(rows):
+    """Страница с таблицей пакетов, как у SteamDB"""
+    parts = ['<html><body><table>']
+    for i in range(rows):
+        parts.append(
+            f'<tr class="app"><td><a href="/sub/{i}/">Bench package {i}</a></td>'
+            f'<td>Free</td><td><span title="2026-10-19">today</span></td></tr>'
+        )
+    parts.append('</table></body></html>')
+    return ''.join(parts).encode()
+
+def serve(pages):
+    """HTTP-сервер со статическими страницами"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            body = pages.get(self.path, b'')
+            self.send_response(200 if body else 404)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='bench-pages', daemon=True).start()
+    return server
+
+def run_mode(workers, args, results):
+    """Один режим: задержки /webhook под разбором в цикле"""
+    fake = FakeTelegram().start()
+    pages = serve({'/feed.rss': synthetic_feed(args.items), '/packages': synthetic_table(args.rows)})
+    base = f"http://127.0.0.1:{pages.server_address[1]}"
+
+    os.environ.update({
+        'TELEGRAM_API': fake.url,
+        'TOKEN': 'bench',
+        'CHAT_ID': CHAT_ID,
+        'TRACE_ENABLED': '0',
+        'PARSE_WORKERS': str(workers),
+        'FETCH_MAX_BYTES': str(16 * 1024 * 1024),
+        'DATABASE_URL': f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    })
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    import main
+    sys.stdout = stdout
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    # Пул разбора main поднимает только при запуске как скрипт
+    main.start_parse_pool()
+
+    server = start_app(main, 0)
+    url = f"http://127.0.0.1:{server.server_port}/webhook"
+    corpus = synthetic_corpus(main, 500)
+
+    stop = threading.Event()
+    cycles = {'count': 0, 'entries': 0}
+
+    def cycle():
+        # Отметка из прошлого: читаем ленту целиком
+        mark = Mark(None, datetime(1970, 1, 1))
+        while not stop.is_set():
+            entries = main.fetch_new_entries(f"{base}/feed.rss", 'bench', mark)
+            rows = main.fetch_steamdb_rows(f"{base}/packages", limit=args.rows)
+            cycles['count'] += 1
+            cycles['entries'] += len(entries) + len(rows)
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    http = requests.Session()
+    http.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+    def send(update):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            ok = http.post(url, json=update, timeout=30).status_code == 200
+        except Exception:
+            ok = False
+        with lock:
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    poller = threading.Thread(target=cycle, name='poller', daemon=True)
+    if args.cycle:
+        poller.start()
+
+    total = int(args.rate * args.duration)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in range(total):
+            delay = started + i / args.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, corpus[i % len(corpus)])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    if args.cycle:
+        poller.join()
+    main.stop_parse_pool()
+    server.shutdown()
+    fake.stop()
+    pages.shutdown()
+
+    latencies.sort()
+    results.put({
+        'parse_workers': workers,
+        'cycles_per_s': round(cycles['count'] / elapsed, 2),
+        'parsed_per_s': round(cycles['entries'] / elapsed),
+        'webhook_p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'webhook_p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'webhook_p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'webhook_max_ms': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        'errors': errors
+    })
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='Задержка /webhook во время разбора лент')
+    parser.add_argument('--workers', type=int, default=2, help='PARSE_WORKERS для режима с пулом')
+    parser.add_argument('--duration', type=float, default=10, help='длительность режима, сек')
+    parser.add_argument('--rate', type=float, default=50, help='апдейтов в секунду')
+    parser.add_argument('--concurrency', type=int, default=8, help='параллельных соединений')
+    parser.add_argument('--items', type=int, default=2000, help='записей в ленте')
+    parser.add_argument('--rows', type=int, default=5000, help='строк в таблице')
+    parser.add_argument('--no-cycle', dest='cycle', action='store_false', help='без цикла опроса (базовая линия)')
+    parser.add_argument('--json', action='store_true', help='отчёт в JSON')
+    args = parser.parse_args(argv)
+
+    ctx = mp.get_context('spawn')
+    reports = []
+    for workers in (0, args.workers):
+        results = ctx.Queue()
+        process = ctx.Process(target=run_mode, args=(workers, args, results))
+        process.start()
+        reports.append(results.get())
+        process.join()
+
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False))
+        return
+
+    print("=" * 50)
+    print(f"🧵 /webhook под разбором: {args.rate:g} апд/с, лента {args.items}, таблица {args.rows}")
+    print("=" * 50)
+    for key in reports[0]:
+        print(f"{key:18} {reports[0][key]!s:>12} {reports[1][key]!s:>12}")
+    print("=" * 50)
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,162 @@
+"""Разбор лент и страниц источников без БД и сети
+
+Функции принимают байты и возвращают компактные кортежи, поэтому их можно
+выполнять и в потоке опроса, и в пуле процессов (PARSE_WORKERS).
+"""
+import codecs
+import re
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from html.parser import HTMLParser
+
+import feedparser
+
+# links — ссылки из текста записи через пробел (для поиска ссылки на магазин)
+FeedEntry = namedtuple('FeedEntry', 'id title link published links', defaults=('',))
+
+_URL = re.compile(r"""https?://[^\s"'<>]+""")
+
+def _links(text):
+    """Ссылки из HTML/текста записи"""
+    return ' '.join(_URL.findall(text or ''))
+
+def _local_name(tag):
+    """Имя тега без пространства имён"""
+    return tag.rsplit('}', 1)[-1]
+
+def parse_feed_date(value):
+    """Дата RSS (RFC 822) или Atom (ISO 8601) в naive UTC"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _feed_entry(element):
+    """FeedEntry из элемента <item> (RSS) или <entry> (Atom)"""
+    fields = {}
+    for child in element:
+        tag = _local_name(child.tag)
+        if tag == 'link':
+            href = child.get('href')
+            if href is None:
+                fields.setdefault('link', (child.text or '').strip())
+            elif child.get('rel', 'alternate') == 'alternate':
+                fields.setdefault('link', href)
+        else:
+            fields.setdefault(tag, (child.text or '').strip())
+    
+    link = fields.get('link', '')
+    return FeedEntry(
+        id=fields.get('id') or fields.get('guid') or link,
+        title=fields.get('title', ''),
+        link=link,
+        published=parse_feed_date(fields.get('published') or fields.get('updated') or fields.get('pubDate')),
+        links=_links(fields.get('content') or fields.get('description') or fields.get('summary'))
+    )
+
+def _feedparser_entry(entry):
+    """FeedEntry из записи feedparser"""
+    published = entry.get('published_parsed') or entry.get('updated_parsed')
+    return FeedEntry(
+        id=entry.get('id') or entry.get('link', ''),
+        title=entry.get('title', ''),
+        link=entry.get('link', ''),
+        published=datetime(*published[:6]) if published else None,
+        links=_links(entry.get('summary'))
+    )
+
+def iter_feed_entries(chunks):
+    """Разбирает RSS/Atom по мере чтения и отдаёт записи по одной"""
+    parser = ET.XMLPullParser(events=('end',))
+    received = bytearray()
+    yielded = 0
+    try:
+        for chunk in chunks:
+            received += chunk
+            parser.feed(chunk)
+            for _, element in parser.read_events():
+                if _local_name(element.tag) in ('item', 'entry'):
+                    yielded += 1
+                    yield _feed_entry(element)
+                    element.clear()
+            # Разобранное уже не нужно — держим в памяти только хвост
+            if yielded:
+                received = bytearray()
+        parser.close()
+        for _, element in parser.read_events():
+            if _local_name(element.tag) in ('item', 'entry'):
+                yield _feed_entry(element)
+    except ET.ParseError:
+        # Невалидный XML (HTML-сущности и т.п.) — дочитываем в пределах лимита
+        # и отдаём терпимому feedparser
+        if yielded:
+            return
+        for chunk in chunks:
+            received += chunk
+        for entry in feedparser.parse(bytes(received)).entries:
+            yield _feedparser_entry(entry)
+
+def parse_feed(body):
+    """Все записи ленты из байтов тела ответа"""
+    return list(iter_feed_entries([body]))
+
+class SteamDBRows(HTMLParser):
+    """Инкрементальный разбор таблицы SteamDB: первая ссылка каждой строки"""
+
+    def __init__(self, limit):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.rows = []
+        self.done = False
+        self._in_row = False
+        self._in_link = False
+        self._row_link = None
+        self._href = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'tr':
+            if self._in_row:
+                self._finish_row()
+            self._in_row = True
+            self._row_link = None
+        elif tag == 'a' and self._in_row and self._row_link is None and not self._in_link:
+            self._in_link = True
+            self._href = dict(attrs).get('href')
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self._in_link:
+            self._in_link = False
+            self._row_link = (''.join(self._text).strip(), self._href)
+        elif tag == 'tr' and self._in_row:
+            self._finish_row()
+
+    def handle_data(self, data):
+        if self._in_link:
+            self._text.append(data)
+
+    def _finish_row(self):
+        self._in_row = False
+        self.rows.append(self._row_link)
+        if len(self.rows) >= self.limit:
+            self.done = True
+
+def parse_steamdb(body, limit):
+    """(title, href) первых limit строк таблицы SteamDB из байтов страницы"""
+    parser = SteamDBRows(limit)
+    parser.feed(codecs.decode(body, 'utf-8', errors='replace'))
+    parser.close()
+    return parser.rows
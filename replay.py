@@ -0,0 +1,322 @@
+"""Повтор архива ответов (ARCHIVE_DIR): разбор → дедупликация → фильтры без сети и Telegram
+
+Ответы читаются из архива в порядке записи и проходят тот же путь, что в
+цикле опроса: parsing.py, канонические ключи, ключевые слова, цены из
+записанных ответов Steam Store и фильтры пользователя. Дедупликация — по
+64-битным ключам в памяти, база — временная SQLite. Отчёт — ответов и игр
+в секунду по источникам; с --against тот же архив разбирается parsing.py
+из другой ревизии git (или файла) и выводятся ответы, где записи разошлись.
+
+Пример:
+    python replay.py archive/
+    python replay.py archive/ --source reddit dealabs --since 2026-10-01
+    python replay.py archive/ --against HEAD~1 --json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from collections import Counter, defaultdict
+from datetime import datetime
+from urllib.parse import parse_qsl, urlsplit
+
+from archive import iter_records, read_index
+
+FEED_SOURCES = ('reddit', 'dealabs')
+# Сколько расхождений показывать в текстовом отчёте
+SHOW_DIFFERENCES = 10
+
+def load_bot():
+    """Импортирует бота на временной базе, без архива и пула разбора"""
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'replay.db')}",
+        'TRACE_ENABLED': '0',
+        'PARSE_WORKERS': '0',
+        'CHAT_ID': os.environ.get('CHAT_ID') or '100500'
+    })
+    os.environ.pop('ARCHIVE_DIR', None)
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        import main
+    finally:
+        sys.stdout = stdout
+    return main
+
+def load_parsing(version):
+    """parsing.py из файла или из ревизии git"""
+    if os.path.isfile(version):
+        spec = importlib.util.spec_from_file_location('parsing_against', version)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    source = subprocess.run(
+        ['git', 'show', f'{version}:parsing.py'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+    ).stdout
+    module = types.ModuleType('parsing_against')
+    exec(compile(source, f'{version}:parsing.py', 'exec'), module.__dict__)
+    return module
+
+def load_store_prices(main, directory, entries):
+    """Заполняет кэш цен записанными ответами Steam Store API"""
+    # Кэш бота рассчитан на живой цикл — для повтора снимаем ограничения
+    main.store_cache.maxsize = sys.maxsize
+    main.store_cache.ttl = float('inf')
+    loaded = 0
+    for record in iter_records(directory, [e for e in entries if e.source == 'store']):
+        parts = urlsplit(record.url)
+        endpoint = parts.path.rsplit('/', 1)[-1]
+        if endpoint not in main.STEAM_ENDPOINTS:
+            continue
+        store, param, price_key = main.STEAM_ENDPOINTS[endpoint]
+        ids = dict(parse_qsl(parts.query)).get(param, '').split(',')
+        for store_id, price in main.parse_steam_prices(json.loads(record.body), ids, price_key).items():
+            main.store_cache.set((store, store_id), price)
+            loaded += 1
+    return loaded
+
+def parse_record(main, parsing, record):
+    """Записи ответа в том виде, в каком их получает цикл опроса"""
+    if record.source in FEED_SOURCES:
+        return parsing.parse_feed(record.body)
+    if record.source == 'steamdb':
+        return parsing.parse_steamdb(record.body, main.STEAMDB_ROWS)
+    if record.source == 'epic':
+        return main.parse_epic_offers(json.loads(record.body))
+    return None
+
+class Pipeline:
+    """Дедупликация и фильтры по записям ответов; счётчики по источникам"""
+
+    def __init__(self, main):
+        self.main = main
+        self.seen = set()
+        self.counts = defaultdict(Counter)
+
+    def is_new(self, source, *keys):
+        """Ключа ещё нет среди принятых игр"""
+        if any(self.main.item_key(key) in self.seen for key in keys):
+            self.counts[source]['duplicate'] += 1
+            return False
+        return True
+
+    def offer(self, source, key, title, link, platform, price):
+        """Фильтры пользователя; прошедшая игра считается записанной"""
+        if not self.main.check_game_filter(title, link, source, self.main.CHAT_ID, platform, price):
+            self.counts[source]['filtered'] += 1
+            return
+        self.seen.add(self.main.item_key(key))
+        self.counts[source]['accepted'] += 1
+
+    def skip(self, source):
+        self.counts[source]['skipped'] += 1
+
+    def run(self, record, items):
+        """Пропускает записи одного ответа через конвейер"""
+        main = self.main
+        source = record.source
+        self.counts[source]['items'] += len(items)
+
+        if source in FEED_SOURCES:
+            keywords = main.REDDIT_KEYWORDS if source == 'reddit' else main.DEALABS_KEYWORDS
+            # Цикл объявляет записи в хронологическом порядке
+            for entry in reversed(items):
+                key = main.canonical_key(entry.link)
+                if not self.is_new(source, key):
+                    continue
+                if not any(word in entry.title.lower() for word in keywords):
+                    self.skip(source)
+                    continue
+                info = main.store_info(entry.link, entry.links)
+                if source == 'reddit':
+                    platform = main.reddit_platform(entry, info)
+                else:
+                    platform = info.platform if info else 'unknown'
+                self.offer(source, key, entry.title, entry.link, platform, info.price if info else None)
+
+        elif source == 'steamdb':
+            for package in items:
+                if not package or not package[1]:
+                    self.skip(source)
+                    continue
+                title, href = package
+                link = f"https://steamdb.info{href}"
+                key = main.canonical_key(link)
+                if not self.is_new(source, key):
+                    continue
+                info = main.store_info(link)
+                self.offer(source, key, title, link, 'steam', info.price if info else None)
+
+        elif source == 'epic':
+            for offer in items:
+                # Окно раздачи — на момент загрузки ответа
+                if not offer.start <= record.fetched_at < offer.end:
+                    self.skip(source)
+                    continue
+                if not self.is_new(source, offer.item_id, main.epic_title_key(offer.title)):
+                    continue
+                self.offer(source, offer.item_id, offer.title, offer.link, 'epic', offer.price)
+
+def difference(record, current, other):
+    """Расхождение записей двух версий разбора одного ответа (или None)"""
+    current = [tuple(item) if item is not None else None for item in current]
+    other = [tuple(item) if item is not None else None for item in other]
+    if current == other:
+        return None
+    added = Counter(current) - Counter(other)
+    removed = Counter(other) - Counter(current)
+    return {
+        'source': record.source,
+        'url': record.url,
+        'fetched_at': record.fetched_at.isoformat(),
+        'added': sum(added.values()),
+        'removed': sum(removed.values()),
+        'reordered': not added and not removed,
+        'example': repr(next(iter(added or removed), None))
+    }
+
+def replay(main, directory, entries, against=None):
+    """Повтор записей индекса; сводка по источникам и расхождения версий"""
+    import parsing
+
+    prices = load_store_prices(main, directory, entries)
+    pipeline = Pipeline(main)
+    timings = defaultdict(Counter)
+    differences = []
+
+    class Rollback(Exception):
+        pass
+
+    started = time.perf_counter()
+    try:
+        # Одна единица работы: настройки пользователя читаются один раз
+        with main.unit_of_work():
+            records = iter_records(directory, [e for e in entries if e.source != 'store'])
+            while True:
+                mark = time.perf_counter()
+                record = next(records, None)
+                if record is None:
+                    break
+                stats = timings[record.source]
+                stats['read_s'] += time.perf_counter() - mark
+                stats['payloads'] += 1
+                stats['bytes'] += len(record.body)
+                # Ответ записан не целиком: разбор дойдёт только до обрыва
+                stats['truncated'] += record.truncated
+
+                mark = time.perf_counter()
+                try:
+                    items = parse_record(main, parsing, record)
+                except Exception:
+                    stats['parse_errors'] += 1
+                    continue
+                stats['parse_s'] += time.perf_counter() - mark
+                if items is None:
+                    continue
+
+                mark = time.perf_counter()
+                pipeline.run(record, items)
+                stats['pipeline_s'] += time.perf_counter() - mark
+
+                if against is not None and record.source != 'epic':
+                    try:
+                        other = parse_record(main, against, record)
+                    except Exception as e:
+                        other = [('error', repr(e))]
+                    diff = difference(record, items, other)
+                    if diff:
+                        differences.append(diff)
+            raise Rollback()
+    except Rollback:
+        pass
+    elapsed = time.perf_counter() - started
+
+    sources = {}
+    for source, stats in sorted(timings.items()):
+        counts = pipeline.counts[source]
+        busy = stats['parse_s'] + stats['pipeline_s']
+        sources[source] = {
+            'payloads': stats['payloads'],
+            'mb': round(stats['bytes'] / 1024 / 1024, 2),
+            'truncated': stats['truncated'],
+            'items': counts['items'],
+            'accepted': counts['accepted'],
+            'duplicate': counts['duplicate'],
+            'skipped': counts['skipped'],
+            'filtered': counts['filtered'],
+            'parse_errors': stats['parse_errors'],
+            'read_ms': round(stats['read_s'] * 1000, 1),
+            'parse_ms': round(stats['parse_s'] * 1000, 1),
+            'pipeline_ms': round(stats['pipeline_s'] * 1000, 1),
+            'items_per_s': round(counts['items'] / busy) if busy else 0
+        }
+
+    items = sum(s['items'] for s in sources.values())
+    return {
+        'payloads': sum(s['payloads'] for s in sources.values()),
+        'items': items,
+        'accepted': sum(s['accepted'] for s in sources.values()),
+        'store_prices': prices,
+        'seconds': round(elapsed, 3),
+        'items_per_s': round(items / elapsed) if elapsed else 0,
+        'payloads_per_s': round(sum(s['payloads'] for s in sources.values()) / elapsed, 1) if elapsed else 0,
+        'mb_per_s': round(sum(s['mb'] for s in sources.values()) / elapsed, 1) if elapsed else 0,
+        'sources': sources,
+        'differences': differences
+    }
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='Повтор архива ответов источников без сети и Telegram')
+    parser.add_argument('directory', help='каталог архива (ARCHIVE_DIR)')
+    parser.add_argument('--source', nargs='+', help='только эти источники')
+    parser.add_argument('--since', type=datetime.fromisoformat, help='ответы не раньше (UTC, ISO 8601)')
+    parser.add_argument('--until', type=datetime.fromisoformat, help='ответы раньше (UTC, ISO 8601)')
+    parser.add_argument('--against', metavar='REF|FILE', help='сравнить разбор с parsing.py из ревизии git или файла')
+    parser.add_argument('--platforms', help='фильтр платформ пользователя, например steam,epic')
+    parser.add_argument('--min-price', type=float, help='фильтр минимальной цены пользователя')
+    parser.add_argument('--json', action='store_true', help='отчёт в JSON')
+    args = parser.parse_args(argv)
+
+    entries = read_index(args.directory, args.source and set(args.source) | {'store'}, args.since, args.until)
+    against = load_parsing(args.against) if args.against else None
+    main = load_bot()
+
+    settings = {}
+    if args.platforms:
+        settings['platforms'] = args.platforms
+    if args.min_price is not None:
+        settings['min_price'] = args.min_price
+    if settings:
+        main.update_settings(main.CHAT_ID, **settings)
+
+    report = replay(main, args.directory, entries, against)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+
+    print("=" * 60)
+    print(f"⏪ Повтор архива: {report['payloads']} ответов, {report['items']} записей за {report['seconds']} с")
+    print("=" * 60)
+    keys = [key for key in next(iter(report['sources'].values()), {})]
+    print(f"{'':14}" + ''.join(f"{source:>12}" for source in report['sources']))
+    for key in keys:
+        print(f"{key:14}" + ''.join(f"{stats[key]!s:>12}" for stats in report['sources'].values()))
+    print("=" * 60)
+    print(f"📈 {report['items_per_s']} записей/с, {report['payloads_per_s']} ответов/с, {report['mb_per_s']} МБ/с; "
+          f"принято {report['accepted']}, цен из архива {report['store_prices']}")
+    if against is not None:
+        differences = report['differences']
+        print(f"🔀 Расхождения с {args.against}: {len(differences)} ответов")
+        for diff in differences[:SHOW_DIFFERENCES]:
+            print(f"   {diff['fetched_at']} {diff['source']} {diff['url']}: "
+                  f"+{diff['added']} -{diff['removed']}{' (порядок)' if diff['reordered'] else ''} {diff['example'][:80]}")
+    print("=" * 60)
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,130 @@
+"""Масштабирование распределённого опроса: N процессов-воркеров разбирают задания
+
+Каждое задание имитирует запрос к источнику (sleep). Скрипт меряет
+пропускную способность для разного числа воркеров и проверяет, что ни
+одно задание не выполнилось дважды за интервал.
+
+Пример:
+    python shard_bench.py --workers 1 2 4 --jobs 200 --job-ms 50
+    python shard_bench.py --database-url postgresql://localhost/bench
+"""
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+def worker(database_url, job_seconds, ready, stop, results):
+    """Процесс-воркер: импортирует бота и разбирает задания bench"""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['TRACE_ENABLED'] = '0'
+    sys.stdout = open(os.devnull, 'w')
+
+    import main
+
+    def handler(target):
+        time.sleep(job_seconds)
+        results.put((target, os.getpid()))
+
+    main.JOB_HANDLERS['bench'] = handler
+    main.HOLDER_ID = f"bench:{os.getpid()}"
+    ready.wait()
+    main.run_worker(stop=stop, sync=False, idle=0.05)
+
+def prepare(database_url, jobs):
+    """Чистая таблица заданий с jobs заданиями bench, созревшими сейчас"""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['TRACE_ENABLED'] = '0'
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        import main
+    finally:
+        sys.stdout = stdout
+
+    with main.engine.begin() as conn:
+        conn.execute(main.PollJob.__table__.delete())
+        conn.execute(main.PollJob.__table__.insert(), [{
+            'source': 'bench',
+            'target': f"https://example.com/feed/{i}",
+            'interval': 3600,
+            'enabled': True,
+            'next_run_at': datetime.utcnow(),
+            'runs': 0
+        } for i in range(jobs)])
+
+def run(database_url, workers, jobs, job_seconds, timeout):
+    """Один прогон: возвращает (секунды, выполнено, дубликаты)"""
+    prepare(database_url, jobs)
+
+    ctx = mp.get_context('spawn')
+    ready = ctx.Barrier(workers + 1)
+    stop = ctx.Event()
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(database_url, job_seconds, ready, stop, results), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    ready.wait()
+    started = time.perf_counter()
+    done = []
+    while len(done) < jobs and time.perf_counter() - started < timeout:
+        try:
+            done.append(results.get(timeout=0.5))
+        except queue.Empty:
+            continue
+    elapsed = time.perf_counter() - started
+
+    # Даём шанс проявиться повторным запускам
+    time.sleep(0.5)
+    while True:
+        try:
+            done.append(results.get_nowait())
+        except queue.Empty:
+            break
+
+    stop.set()
+    for process in processes:
+        process.join(timeout=10)
+
+    counts = Counter(target for target, _ in done)
+    duplicates = sum(n - 1 for n in counts.values() if n > 1)
+    return elapsed, len(counts), duplicates
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='Масштабирование распределённого опроса')
+    parser.add_argument('--database-url', help='БД для прогона (по умолчанию временный SQLite)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--jobs', type=int, default=200)
+    parser.add_argument('--job-ms', type=float, default=50, help='время одного задания, мс')
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+    print("=" * 60)
+    print(f"👷 {args.jobs} заданий по {args.job_ms:g} мс • {database_url.split(':')[0]}")
+    print("=" * 60)
+    print(f"{'воркеров':>9} {'секунд':>8} {'заданий/с':>10} {'ускорение':>10} {'дубли':>6}")
+
+    base = None
+    for workers in args.workers:
+        elapsed, completed, duplicates = run(database_url, workers, args.jobs, args.job_ms / 1000, args.timeout)
+        rate = completed / elapsed if elapsed else 0.0
+        base = base or rate
+        print(f"{workers:>9} {elapsed:>8.2f} {rate:>10.1f} {rate / base:>9.2f}x {duplicates:>6}")
+        if completed < args.jobs:
+            print(f"⚠️ Выполнено только {completed} из {args.jobs}")
+
+    print("=" * 60)
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,130 @@
+"""Задержка чтения SQLite под нагрузкой записи: SQLITE_TUNED=0 против 1
+
+Писатели имитируют цикл опроса (пачки add_game в единице работы) и
+вебхук (update_settings), читатели — веб-панель (list_games, статистика).
+Каждая роль — отдельный процесс, каждый режим — на своей временной базе.
+
+Пример:
+    python sqlite_bench.py --duration 10 --readers 4
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+def percentile(values, p):
+    """Перцентиль отсортированного списка"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+def load_bot(tuned, database_url):
+    """Импортирует бота с настройками режима"""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['SQLITE_TUNED'] = '1' if tuned else '0'
+    os.environ['TRACE_ENABLED'] = '0'
+    os.environ['CHAT_ID'] = '100500'
+    sys.stdout = open(os.devnull, 'w')
+
+    import main
+    return main
+
+def role(kind, tuned, database_url, duration, batch, ready, results):
+    """Процесс одной роли: poller, webhook или reader"""
+    main = load_bot(tuned, database_url)
+
+    stats = {'kind': kind, 'latencies': [], 'ops': 0, 'errors': 0}
+    ready.wait()
+    deadline = time.perf_counter() + duration
+    i = 0
+
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if kind == 'poller':
+                # Пачка игр за цикл, между циклами — «сеть»
+                with main.unit_of_work():
+                    for _ in range(batch):
+                        i += 1
+                        main.add_game(f"bench:{os.getpid()}:{i}", f"Bench game {i}", f"https://example.com/{i}", 'bench')
+                    main.add_statistics('bench', batch, 1)
+                time.sleep(0.01)
+            elif kind == 'webhook':
+                with main.unit_of_work():
+                    main.update_settings(main.CHAT_ID, notifications=bool(i % 2))
+                i += 1
+                time.sleep(0.005)
+            else:
+                main.list_games(limit=50)
+                main.count_games()
+                main.get_statistics()
+        except Exception:
+            stats['errors'] += 1
+            continue
+        stats['latencies'].append(time.perf_counter() - started)
+        stats['ops'] += 1
+
+    results.put(stats)
+
+def bench(tuned, duration, readers, batch, directory=None):
+    """Один режим на свежей базе: сводка по ролям"""
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(dir=directory), 'bench.db')}"
+    ctx = mp.get_context('spawn')
+    kinds = ['poller', 'webhook'] + ['reader'] * readers
+
+    # Схему создаём заранее, чтобы процессы не гонялись за create_all
+    setup = ctx.Process(target=load_bot, args=(tuned, database_url))
+    setup.start()
+    setup.join()
+
+    ready = ctx.Barrier(len(kinds))
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=role, args=(kind, tuned, database_url, duration, batch, ready, results))
+        for kind in kinds
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    reads = sorted(t for r in reports if r['kind'] == 'reader' for t in r['latencies'])
+    webhook = sorted(t for r in reports if r['kind'] == 'webhook' for t in r['latencies'])
+    by_kind = {r['kind']: r for r in reports}
+    return {
+        'mode': 'tuned' if tuned else 'default',
+        'reads_per_s': round(len(reads) / duration, 1),
+        'read_p50_ms': round(percentile(reads, 50) * 1000, 2),
+        'read_p95_ms': round(percentile(reads, 95) * 1000, 2),
+        'read_p99_ms': round(percentile(reads, 99) * 1000, 2),
+        'read_max_ms': round(reads[-1] * 1000, 2) if reads else 0.0,
+        'games_per_s': round(by_kind['poller']['ops'] * batch / duration, 1),
+        'webhook_p99_ms': round(percentile(webhook, 99) * 1000, 2),
+        'errors': sum(r['errors'] for r in reports)
+    }
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='Задержка чтения SQLite под нагрузкой записи')
+    parser.add_argument('--duration', type=float, default=10, help='длительность каждого режима, сек')
+    parser.add_argument('--readers', type=int, default=4, help='процессов-читателей')
+    parser.add_argument('--batch', type=int, default=20, help='игр в одной единице работы')
+    parser.add_argument('--dir', help='каталог для базы (tmpfs не показывает цену fsync)')
+    args = parser.parse_args(argv)
+
+    reports = [bench(tuned, args.duration, args.readers, args.batch, args.dir) for tuned in (False, True)]
+
+    keys = [key for key in reports[0] if key != 'mode']
+    print("=" * 50)
+    print(f"💾 SQLite: опросчик + вебхук + {args.readers} читателя(ей), {args.duration:g} с")
+    print("=" * 50)
+    print(f"{'':18} {'default':>14} {'tuned':>14}")
+    for key in keys:
+        print(f"{key:18} {reports[0][key]!s:>14} {reports[1][key]!s:>14}")
+    print("=" * 50)
+
+if __name__ == '__main__':
+    main_cli()
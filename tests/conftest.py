@@ -0,0 +1,83 @@
+"""Общие фикстуры: бот на временной SQLite и заглушка Telegram"""
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_telegram import FakeTelegram
+
+# main читает окружение при импорте — задаём его до первого import main
+telegram = FakeTelegram().start()
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}",
+    'TELEGRAM_API': telegram.url,
+    'TOKEN': 'test',
+    'CHAT_ID': '100500',
+    'TRACE_ENABLED': '0',
+    'PARSE_WORKERS': '0',
+})
+os.environ.pop('ARCHIVE_DIR', None)
+
+import main as bot_module
+
+@pytest.fixture
+def bot():
+    """Модуль бота на пустой базе"""
+    yield bot_module
+    with bot_module.engine.begin() as conn:
+        for table in reversed(bot_module.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    bot_module.game_store.clear()
+    bot_module.game_broker.forget()
+    bot_module.store_cache.clear()
+
+class _Source(BaseHTTPRequestHandler):
+    """Отдаёт routes[path] = (статус, заголовки, куски тела)"""
+    protocol_version = 'HTTP/1.1'
+    routes = {}
+
+    def do_GET(self):
+        status, headers, chunks = self.routes.get(self.path, (404, {}, [b'']))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if 'Content-Length' not in headers:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                if 'Content-Length' in headers:
+                    self.wfile.write(chunk)
+                else:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            if 'Content-Length' not in headers:
+                self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def source():
+    """Локальный источник: source.route(path, ...) -> URL"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Source)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    host, port = server.server_address[:2]
+
+    class Routes:
+        def route(self, path, chunks, status=200, headers=None):
+            _Source.routes[path] = (status, headers or {}, chunks)
+            return f"http://{host}:{port}{path}"
+
+    yield Routes()
+    _Source.routes.clear()
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,70 @@
+import json
+import os
+
+import pytest
+
+from archive import INDEX_NAME, PayloadArchive, iter_records, read_index
+
+@pytest.fixture
+def archive(bot, tmp_path, monkeypatch):
+    payload_archive = PayloadArchive(str(tmp_path))
+    monkeypatch.setattr(bot, 'payload_archive', payload_archive)
+    yield str(tmp_path)
+    payload_archive.close()
+
+def records(directory):
+    return list(iter_records(directory, read_index(directory)))
+
+def test_complete_body_is_archived(bot, source, archive):
+    url = source.route('/feed', [b'a' * 100, b'b' * 100])
+
+    assert bot.read_body(url, 'reddit') == b'a' * 100 + b'b' * 100
+
+    [record] = records(archive)
+    assert record.body == b'a' * 100 + b'b' * 100 and not record.truncated
+
+def test_early_stop_archives_only_read_bytes(bot, source, archive):
+    served = []
+
+    def endless():
+        while True:
+            served.append(1)
+            yield b'x' * 1024
+
+    url = source.route('/feed', endless())
+    body = bot.stream_body(url, 'reddit', chunk_size=1024)
+    read = [next(body), next(body)]
+    body.close()
+
+    [record] = records(archive)
+    assert record.truncated
+    assert record.body == b''.join(read)
+
+def test_capped_body_is_archived_truncated(bot, source, archive, monkeypatch):
+    monkeypatch.setitem(bot.SOURCE_MAX_BYTES, 'test', 1000)
+    url = source.route('/big', [b'y' * 100] * 50)
+
+    with pytest.raises(bot.ResponseTooLarge):
+        bot.read_body(url, 'test')
+
+    [record] = records(archive)
+    assert record.truncated and len(record.body) <= 1000
+
+def test_failed_request_is_not_archived(bot, source, archive):
+    url = source.route('/missing', [b'gone'], status=404, headers={'Content-Length': '4'})
+
+    with pytest.raises(bot.FetchError):
+        bot.read_body(url, 'test')
+
+    assert records(archive) == []
+
+def test_old_index_lines_read_as_complete(tmp_path):
+    payload_archive = PayloadArchive(str(tmp_path))
+    entry = payload_archive.append('reddit', 'https://example.com/feed', b'<rss/>')
+    payload_archive.close()
+    line = {key: value for key, value in entry._asdict().items() if key != 'truncated'}
+    with open(os.path.join(tmp_path, INDEX_NAME), 'w') as f:
+        f.write(json.dumps(line) + '\n')
+
+    [record] = records(str(tmp_path))
+    assert record.body == b'<rss/>' and record.truncated is False
@@ -0,0 +1,21 @@
+def test_profile_hidden_without_token(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'DEBUG_TOKEN', None)
+
+    response = bot.app.test_client().get('/debug/profile?token=anything')
+
+    assert response.status_code == 404
+
+def test_profile_rejects_non_ascii_token(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'DEBUG_TOKEN', 'секрет')
+    client = bot.app.test_client()
+
+    assert client.get('/debug/profile?token=неверно').status_code == 404
+    assert client.get('/debug/profile?token=secret').status_code == 404
+
+def test_profile_accepts_token(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'DEBUG_TOKEN', 'секрет')
+
+    response = bot.app.test_client().get('/debug/profile?token=секрет&seconds=0.1')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
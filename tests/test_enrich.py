@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from fake_store import FakeStore
+
+@pytest.fixture
+def store(bot, monkeypatch):
+    fake = FakeStore(apps={str(n): 100 * n for n in range(1, 200)}, subs={'7': 499, '8': 0}).start()
+    monkeypatch.setattr(bot, 'STORE_API', fake.url)
+    yield fake
+    fake.stop()
+
+def app(n):
+    return f"https://store.steampowered.com/app/{n}/Game_{n}/"
+
+def test_prices_are_batched_per_store(bot, store, monkeypatch):
+    monkeypatch.setattr(bot, 'ENRICH_BATCH', 50)
+
+    bot.prefetch_store_info([app(n) for n in range(1, 121)] + [
+        'https://store.steampowered.com/sub/7/', 'https://steamdb.info/sub/8/', app(1)
+    ])
+
+    # 120 приложений — три запроса по ≤50, пакеты — один общий
+    assert store.calls == {'appdetails': 3, 'packagedetails': 1}
+    assert sum(store.ids.values()) == 122
+    assert bot.store_info(app(120)).price == 120.0
+    assert bot.store_info('https://store.steampowered.com/sub/7/').price == 4.99
+    # Бесплатный навсегда пакет — цена 0, не «неизвестна»
+    assert bot.store_info('https://steamdb.info/sub/8/').price == 0.0
+
+def test_cached_prices_are_not_requested_again(bot, store, monkeypatch):
+    monkeypatch.setitem(bot.enrich_metrics, 'hits', 0)
+    bot.prefetch_store_info([app(1), app(2)])
+    bot.prefetch_store_info([app(1), app(2), 'https://www.gog.com/game/witcher'])
+
+    assert store.total_calls() == 1
+    assert bot.enrich_metrics['hits'] == 2
+
+def test_unknown_id_is_cached_as_unknown_price(bot, store):
+    bot.prefetch_store_info([app(999)])
+    bot.prefetch_store_info([app(999)])
+
+    assert store.total_calls() == 1
+    assert bot.store_info(app(999)).price is None
+
+def test_ttl_expiry_and_lru_eviction(bot):
+    cache = bot.TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    # Вытеснена давняя по обращению запись, а не первая добавленная
+    assert 'b' not in cache and cache.get('a') == 1 and cache.get('c') == 3
+
+    short = bot.TTLCache(maxsize=10, ttl=0.05)
+    short.set('a', None)
+    assert 'a' in short and short.get('a', 'missing') is None
+    time.sleep(0.1)
+    assert 'a' not in short and len(short) == 0
+
+def test_expired_price_is_requested_again(bot, store, monkeypatch):
+    monkeypatch.setattr(bot.store_cache, 'ttl', 0.05)
+    bot.prefetch_store_info([app(3)])
+    time.sleep(0.1)
+    bot.prefetch_store_info([app(3)])
+
+    assert store.calls['appdetails'] == 2
+
+@pytest.mark.parametrize('price, passes', [(None, True), (0.0, False), (4.99, False), (5.0, True), (19.99, True)])
+def test_min_price_filter(bot, price, passes):
+    bot.update_settings(bot.CHAT_ID, min_price=5.0)
+
+    assert bot.check_game_filter('Game', app(1), 'reddit', bot.CHAT_ID, 'steam', price) is passes
+
+def test_min_price_uses_prefetched_price(bot, store):
+    bot.update_settings(bot.CHAT_ID, min_price=5.0)
+    bot.prefetch_store_info([app(2), app(10), app(999)])
+
+    def passes(link):
+        info = bot.store_info(link)
+        return bot.check_game_filter('Game', link, 'reddit', bot.CHAT_ID, 'steam', info.price)
+
+    assert not passes(app(2)) and passes(app(10))
+    # Цена неизвестна — игру не отсекаем
+    assert passes(app(999))
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+@pytest.fixture
+def offers(bot, monkeypatch):
+    start = datetime.utcnow() + timedelta(hours=1)
+    monkeypatch.setitem(bot.epic_state, 'offers', [
+        bot.EpicOffer('epic:ns:1', 'Game', 'https://store.epicgames.com/p/game', start, start + timedelta(days=7), 19.99)
+    ])
+    monkeypatch.setitem(bot.epic_state, 'timers', [])
+    yield
+    for timer in bot.epic_state['timers']:
+        timer.cancel()
+
+def test_timers_are_armed_by_one_process(bot, offers):
+    assert bot.acquire_lease(bot.EPIC_TIMERS_LEASE, 3600, holder='other-process')
+
+    bot.schedule_epic_timers()
+
+    assert bot.epic_state['timers'] == []
+
+def test_timer_holder_keeps_rescheduling(bot, offers):
+    bot.schedule_epic_timers()
+    bot.schedule_epic_timers()
+
+    assert len(bot.epic_state['timers']) == 1
+    assert bot.get_lease(bot.EPIC_TIMERS_LEASE).holder == bot.HOLDER_ID
+
+def test_window_is_skipped_after_takeover(bot, offers, monkeypatch):
+    bot.schedule_epic_timers()
+    with bot.engine.begin() as conn:
+        conn.execute(bot.Lease.__table__.update().values(holder='other-process'))
+    announced = []
+    monkeypatch.setattr(bot, 'announce_epic_offers', lambda: announced.append(1) or 0)
+
+    bot.on_epic_window()
+
+    assert announced == []
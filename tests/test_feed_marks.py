@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+from parsing import FeedEntry
+
+START = datetime(2026, 1, 1)
+
+def entry(n):
+    return FeedEntry(f"t3_e{n}", f"Free game {n}", f"https://example.com/deal/{n}", START + timedelta(minutes=n))
+
+def rss(entries):
+    items = ''.join(
+        f"<item><guid>{e.id}</guid><title>{e.title}</title><link>{e.link}</link>"
+        f"<pubDate>{e.published.strftime('%a, %d %b %Y %H:%M:%S')} +0000</pubDate></item>"
+        for e in entries
+    )
+    return f"<rss><channel>{items}</channel></rss>".encode()
+
+def mark_at(bot, n):
+    return bot.FeedMark(feed='test', entry_id=f"t3_e{n}", published=entry(n).published)
+
+def newest_first(first, last):
+    return [entry(n) for n in range(last, first - 1, -1)]
+
+def test_mark_stops_before_failed_entry(bot):
+    processed = []
+
+    def process(item):
+        if item.id == 't3_e3':
+            raise RuntimeError('store is down')
+        processed.append(item.id)
+        return True
+
+    found = bot.process_new_entries('test:feed', newest_first(1, 4), process)
+
+    assert found == 2 and processed == ['t3_e1', 't3_e2']
+    assert bot.get_feed_marks('test:')['test:feed'].entry_id == 't3_e2'
+
+def test_mark_moves_to_newest_when_all_processed(bot):
+    found = bot.process_new_entries('test:feed', newest_first(1, 3), lambda item: item.id != 't3_e2')
+
+    assert found == 2
+    assert bot.get_feed_marks('test:')['test:feed'].entry_id == 't3_e3'
+
+def test_failed_entry_is_read_again_next_cycle(bot, source, monkeypatch):
+    url = source.route('/deals', [rss(newest_first(0, 3))])
+    bot.set_feed_mark(f"dealabs:{url}", entry(0))
+    seen = []
+
+    def flaky(item):
+        seen.append(item.id)
+        if item.id == 't3_e2' and seen.count('t3_e2') == 1:
+            raise RuntimeError('temporary')
+        return True
+
+    monkeypatch.setattr(bot, 'process_dealabs_entry', flaky)
+    mark = lambda: bot.get_feed_marks('dealabs:')[f"dealabs:{url}"]
+
+    assert bot.poll_dealabs_feed(url, mark()) == 1
+    assert mark().entry_id == 't3_e1'
+    assert bot.poll_dealabs_feed(url, mark()) == 2
+    assert seen == ['t3_e1', 't3_e2', 't3_e2', 't3_e3']
+    assert mark().entry_id == 't3_e3'
+
+def test_full_window_pages_back_to_mark(bot, source):
+    first = source.route('/r/sub?limit=3', [rss(newest_first(8, 10))])
+    source.route('/r/sub?limit=3&after=t3_e8', [rss(newest_first(5, 7))])
+    source.route('/r/sub?limit=3&after=t3_e5', [rss(newest_first(2, 4))])
+
+    entries = bot.fetch_new_entries(first, 'reddit', mark_at(bot, 3), bot.reddit_next_page)
+
+    assert [e.id for e in entries] == [f"t3_e{n}" for n in range(10, 3, -1)]
+
+def test_window_without_mark_is_reported(bot, source, monkeypatch):
+    monkeypatch.setitem(bot.fetch_metrics, 'feed_gaps', 0)
+    url = source.route('/deals', [rss(newest_first(5, 9))])
+
+    entries = bot.fetch_new_entries(url, 'dealabs', mark_at(bot, 1))
+
+    assert len(entries) == 5
+    assert bot.fetch_metrics['feed_gaps'] == 1
+
+def test_failed_insert_is_picked_up_next_poll(bot, source, monkeypatch):
+    url = source.route('/deals', [rss(newest_first(0, 3))])
+    bot.set_feed_mark(f"dealabs:{url}", entry(0))
+    mark = lambda: bot.get_feed_marks('dealabs:')[f"dealabs:{url}"]
+    game_event = bot.game_event
+
+    def broken_event(game):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(bot, 'game_event', broken_event)
+    with bot.unit_of_work():
+        assert bot.poll_dealabs_feed(url, mark()) == 0
+    assert mark().entry_id == 't3_e0'
+    assert bot.get_total_games() == 0
+
+    monkeypatch.setattr(bot, 'game_event', game_event)
+    with bot.unit_of_work():
+        assert bot.poll_dealabs_feed(url, mark()) == 3
+    assert mark().entry_id == 't3_e3'
+    assert bot.get_total_games() == 3
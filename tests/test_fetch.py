@@ -0,0 +1,48 @@
+import gzip
+
+import pytest
+
+def test_body_within_limit_is_read_whole(bot, source, monkeypatch):
+    monkeypatch.setitem(bot.SOURCE_MAX_BYTES, 'test', 1000)
+    url = source.route('/ok', [b'a' * 400, b'b' * 400])
+
+    assert bot.read_body(url, 'test') == b'a' * 400 + b'b' * 400
+
+def test_declared_length_over_limit_is_refused(bot, source, monkeypatch):
+    monkeypatch.setitem(bot.SOURCE_MAX_BYTES, 'test', 1000)
+    url = source.route('/declared', [b'x' * 2000], headers={'Content-Length': '2000'})
+
+    with pytest.raises(bot.ResponseTooLarge):
+        bot.read_body(url, 'test')
+
+def test_streamed_body_stops_at_limit(bot, source, monkeypatch):
+    monkeypatch.setitem(bot.SOURCE_MAX_BYTES, 'test', 1000)
+    sent = []
+
+    def endless():
+        while True:
+            sent.append(1)
+            yield b'x' * 100
+
+    url = source.route('/endless', endless())
+    received = []
+    with pytest.raises(bot.ResponseTooLarge):
+        for chunk in bot.stream_body(url, 'test', chunk_size=100):
+            received.append(chunk)
+
+    assert sum(map(len, received)) <= 1000
+
+def test_limit_applies_after_decompression(bot, source, monkeypatch):
+    monkeypatch.setitem(bot.SOURCE_MAX_BYTES, 'test', 1000)
+    body = gzip.compress(b'x' * 100000)
+    url = source.route('/bomb', [body], headers={'Content-Encoding': 'gzip', 'Content-Length': str(len(body))})
+
+    with pytest.raises(bot.ResponseTooLarge):
+        bot.read_body(url, 'test')
+
+def test_http_errors_raise_fetch_error(bot, source):
+    url = source.route('/missing', [b'gone'], status=404, headers={'Content-Length': '4'})
+
+    with pytest.raises(bot.FetchError) as error:
+        bot.read_body(url, 'test')
+    assert error.value.status == 404
@@ -0,0 +1,84 @@
+import time
+from datetime import datetime, timedelta
+
+START = datetime(2026, 1, 1)
+
+def insert_game(bot, n, source='reddit', platform='steam'):
+    """Игра мимо add_game — как её пишет другой процесс; возвращает RecentGame"""
+    with bot.engine.begin() as conn:
+        game_id = conn.execute(bot.Game.__table__.insert().values(
+            item_id=f"game-{n}", item_key=bot.item_key(f"game-{n}"), title=f"Game {n}",
+            link=f"https://example.com/{n}", source=source, platform=platform,
+            found_at=START + timedelta(minutes=n)
+        )).inserted_primary_key[0]
+    return bot.RecentGame(game_id, f"Game {n}", source, platform, START + timedelta(minutes=n))
+
+def test_hydrate_loads_counts_and_recent(bot):
+    for n in range(5):
+        insert_game(bot, n, source='reddit' if n % 2 else 'epic', platform='epic' if n % 2 == 0 else 'steam')
+    store = bot.GameStore(size=3, ttl=0)
+
+    assert store.ready()
+
+    assert store.total == 5
+    assert store.counts() == ({'epic': 3, 'reddit': 2}, {'epic': 3, 'steam': 2})
+    assert [game['title'] for game in store.recent(10)] == ['Game 4', 'Game 3', 'Game 2']
+
+def test_add_counts_only_after_hydrate(bot):
+    store = bot.GameStore(size=3, ttl=0)
+    store.add(insert_game(bot, 0))
+    assert store.total == 0
+
+    store.ready()
+    store.add(insert_game(bot, 1, source='epic'))
+
+    assert store.total == 2 and store.by_source == {'reddit': 1, 'epic': 1}
+    assert store.recent(1)[0]['title'] == 'Game 1'
+
+def test_refresh_between_commit_and_add_counts_once(bot):
+    store = bot.GameStore(size=3, ttl=60)
+    store.ready()
+    record = insert_game(bot, 0)
+    # Перезагрузка по TTL успела между коммитом и on_commit
+    store.hydrate()
+    store.add(record)
+
+    assert store.total == 1 and len(store.recent(10)) == 1
+
+def test_ttl_refresh_picks_up_other_processes(bot):
+    store = bot.GameStore(size=3, ttl=0.05)
+    store.ready()
+    insert_game(bot, 0)
+    assert store.ready() and store.total == 0
+
+    time.sleep(0.1)
+    assert store.ready() and store.total == 1
+
+def test_clear_resets_counts(bot):
+    store = bot.GameStore(size=3, ttl=0)
+    insert_game(bot, 0)
+    store.ready()
+
+    store.clear()
+    record = insert_game(bot, 1)
+    store.add(record)
+
+    assert store.total == 1 and store.by_source == {'reddit': 1}
+    assert [game['title'] for game in store.recent(10)] == ['Game 1']
+
+def test_api_stats_counts_without_loaded_store(bot, monkeypatch):
+    insert_game(bot, 0)
+    insert_game(bot, 1, source='epic', platform='epic')
+    store = bot.GameStore()
+
+    def broken():
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(store, 'hydrate', broken)
+    monkeypatch.setattr(bot, 'game_store', store)
+
+    stats = bot.app.test_client().get('/api/stats').get_json()
+
+    assert stats['total_games'] == 2
+    assert stats['games_by_source'] == {'reddit': 1, 'epic': 1}
+    assert stats['games_by_platform'] == {'steam': 1, 'epic': 1}
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+def insert_legacy(bot, item_id, link, title='Game'):
+    """Строка в формате до item_key"""
+    with bot.engine.begin() as conn:
+        return conn.execute(bot.Game.__table__.insert().values(
+            item_id=item_id, item_key=None, title=title, link=link, source='reddit',
+            platform='steam', found_at=datetime(2025, 1, 1), sent=True
+        )).inserted_primary_key[0]
+
+def rows(bot, table):
+    with bot.engine.connect() as conn:
+        return conn.execute(table.select().order_by(table.c.id)).mappings().all()
+
+def test_link_variants_are_canonicalized(bot):
+    assert bot.canonical_key('https://www.reddit.com/r/FreeGames/comments/Abc12/some_title/') == 'reddit:abc12'
+    assert bot.canonical_key('https://old.reddit.com/r/freegames/comments/abc12/') == 'reddit:abc12'
+    assert bot.canonical_key('https://store.steampowered.com/app/42/Game/?utm_source=x') == 'steam:app:42'
+    assert bot.canonical_key('https://www.example.com/deal/?utm_medium=rss#top') == \
+        bot.canonical_key('http://example.com/deal')
+
+def test_migration_rekeys_in_batches_and_archives_duplicates(bot):
+    first = insert_legacy(bot, 'post-1', 'https://www.reddit.com/r/a/comments/abc12/title/')
+    other = insert_legacy(bot, 'post-2', 'https://store.steampowered.com/app/42/')
+    dup = insert_legacy(bot, 'post-3', 'https://old.reddit.com/r/a/comments/abc12/')
+    epic = insert_legacy(bot, 'epic_Some Game', '')
+    with bot.engine.begin() as conn:
+        conn.execute(bot.Notification.__table__.insert().values(
+            game_id=dup, chat_id='100500', text='dup', attempts=0, next_attempt_at=datetime.utcnow()
+        ))
+
+    assert bot.migrate_item_keys(batch=2) == 3
+
+    games = {row['id']: row for row in rows(bot, bot.Game.__table__)}
+    assert sorted(games) == [first, other, epic]
+    assert games[first]['item_id'] == 'reddit:abc12'
+    assert games[other]['item_id'] == 'steam:app:42'
+    assert games[epic]['item_id'] == 'epic:title:some game'
+    assert all(game['item_key'] == bot.item_key(game['item_id']) for game in games.values())
+
+    dropped = rows(bot, bot.DroppedGame.__table__)
+    assert [(row['id'], row['duplicate_of'], row['item_id']) for row in dropped] == [(dup, first, 'post-3')]
+    assert rows(bot, bot.Notification.__table__) == []
+
+def test_duplicate_of_already_migrated_row(bot):
+    bot.add_game('reddit:abc12', 'New', 'https://www.reddit.com/r/a/comments/abc12/', 'reddit')
+    legacy = insert_legacy(bot, 'post-9', 'https://reddit.com/r/a/comments/ABC12/x/')
+
+    assert bot.migrate_item_keys() == 0
+
+    dropped = rows(bot, bot.DroppedGame.__table__)
+    assert [row['id'] for row in dropped] == [legacy]
+    assert bot.game_exists('reddit:abc12')
+
+def test_migration_is_idempotent(bot):
+    insert_legacy(bot, 'post-1', 'https://www.reddit.com/r/a/comments/abc12/title/')
+
+    assert bot.migrate_item_keys() == 1
+    assert bot.migrate_item_keys() == 0
@@ -0,0 +1,84 @@
+import pytest
+
+def enqueue(bot, count):
+    for n in range(count):
+        bot.add_game(f"game-{n}", f"Game {n}", f"https://example.com/{n}", 'reddit',
+                     notify=(f"New game {n}", None))
+
+def outbox(bot):
+    with bot.engine.connect() as conn:
+        return conn.execute(
+            bot.Notification.__table__.select().order_by(bot.Notification.id)
+        ).mappings().all()
+
+def claim_as(bot, holder, limit=10, lease_seconds=60):
+    return bot.claim_rows(
+        'outbox', 'id', 'next_attempt_at <= :now', 'id', limit, lease_seconds, holder
+    )
+
+def test_claimed_rows_are_not_claimed_twice(bot):
+    enqueue(bot, 3)
+
+    first = claim_as(bot, 'worker-a', limit=2)
+    second = claim_as(bot, 'worker-b')
+
+    assert len(first) == 2 and len(second) == 1
+    assert {row.id for row in first}.isdisjoint(row.id for row in second)
+    assert claim_as(bot, 'worker-c') == []
+
+def test_expired_claim_is_taken_over(bot):
+    enqueue(bot, 1)
+    assert len(claim_as(bot, 'crashed', lease_seconds=-1)) == 1
+
+    assert len(claim_as(bot, 'worker-b')) == 1
+
+def test_batch_is_delivered_and_completed(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'OUTBOX_SEND_DELAY', 0)
+    enqueue(bot, 3)
+
+    assert bot.dispatch_outbox() == 3
+
+    assert outbox(bot) == []
+    with bot.engine.connect() as conn:
+        assert all(row.sent for row in conn.execute(bot.Game.__table__.select()))
+
+def test_failure_mid_batch_releases_unsent_rows(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'OUTBOX_SEND_DELAY', 0)
+    enqueue(bot, 4)
+    complete = bot.complete_notification
+    calls = []
+
+    def flaky(item, delivered=True):
+        calls.append(item.id)
+        if len(calls) == 2:
+            raise RuntimeError('database is locked')
+        complete(item, delivered)
+
+    monkeypatch.setattr(bot, 'complete_notification', flaky)
+    with pytest.raises(RuntimeError):
+        bot.dispatch_outbox()
+
+    rows = outbox(bot)
+    # Первое ушло и удалено; второе ушло, но не закрыто — остаётся в аренде
+    assert len(rows) == 3 and rows[0].id == calls[1]
+    assert rows[0].lease_holder == bot.HOLDER_ID
+    assert [row.lease_holder for row in rows[1:]] == [None, None]
+    assert len(claim_as(bot, 'worker-b')) == 2
+
+def test_clear_database_drops_pending_notifications(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'OUTBOX_SEND_DELAY', 0)
+    sent = []
+    monkeypatch.setattr(bot, 'deliver_telegram', lambda text, *args: sent.append(text) or (True, None, None))
+    enqueue(bot, 2)
+    with bot.engine.begin() as conn:
+        conn.execute(bot.Notification.__table__.insert().values(
+            chat_id=bot.CHAT_ID, text='Service message', attempts=0, next_attempt_at=bot.datetime.utcnow()
+        ))
+
+    assert bot.clear_database()
+    # Повторная проверка находит те же игры
+    enqueue(bot, 2)
+    bot.dispatch_outbox()
+
+    assert sorted(sent) == ['New game 0', 'New game 1', 'Service message']
+    assert outbox(bot) == []
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+def add_games(bot, count, found_at=None):
+    for n in range(count):
+        bot.add_game(f"game-{n}", f"Game {n}", f"https://example.com/{n}",
+                     'reddit' if n % 2 else 'steamdb')
+    if found_at is not None:
+        with bot.engine.begin() as conn:
+            conn.execute(bot.Game.__table__.update().values(found_at=found_at))
+
+def walk(bot, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        games, cursor = bot.list_games(limit=limit, cursor=cursor, **filters)
+        pages.append(games)
+        if cursor is None:
+            return pages
+
+def test_pages_cover_all_games_once_with_tied_timestamps(bot):
+    add_games(bot, 23, found_at=datetime(2026, 1, 1))
+
+    pages = walk(bot, 5)
+    ids = [game['id'] for page in pages for game in page]
+
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 23
+
+def test_exact_multiple_has_no_empty_last_page(bot):
+    add_games(bot, 10)
+
+    pages = walk(bot, 5)
+
+    assert [len(page) for page in pages] == [5, 5]
+
+def test_cursor_respects_filters(bot):
+    add_games(bot, 12)
+
+    pages = walk(bot, 4, source='reddit')
+
+    assert {game['source'] for page in pages for game in page} == {'reddit'}
+    assert sum(len(page) for page in pages) == 6
+
+def test_api_games_rejects_bad_cursor(bot):
+    client = bot.app.test_client()
+
+    response = client.get('/api/games?cursor=garbage')
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'invalid cursor'}
+
+def test_api_games_follows_next_cursor(bot):
+    add_games(bot, 7)
+    client = bot.app.test_client()
+
+    first = client.get('/api/games?limit=4').get_json()
+    second = client.get(f"/api/games?limit=4&cursor={first['next_cursor']}").get_json()
+
+    assert len(first['games']) == 4
+    assert len(second['games']) == 3 and second['next_cursor'] is None
+    assert not {g['title'] for g in first['games']} & {g['title'] for g in second['games']}
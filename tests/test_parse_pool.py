@@ -0,0 +1,25 @@
+from concurrent.futures import Future
+
+def test_pool_is_not_started_on_import(bot):
+    assert bot._parse_pool is None
+
+def test_pool_parses_and_stops(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'PARSE_WORKERS', 1)
+    bot.start_parse_pool()
+    try:
+        assert bot.parse_in_pool(len, b'abc') == 3
+    finally:
+        bot.stop_parse_pool()
+    assert bot._parse_pool is None
+
+def test_stuck_pool_falls_back_to_inline(bot, monkeypatch):
+    class StuckPool:
+        def submit(self, func, *args):
+            return Future()
+
+    monkeypatch.setattr(bot, '_parse_pool', StuckPool())
+    monkeypatch.setattr(bot, 'PARSE_TIMEOUT', 0.1)
+    timeouts = bot.parse_metrics['timeouts']
+
+    assert bot.parse_in_pool(len, b'abcd') == 4
+    assert bot.parse_metrics['timeouts'] == timeouts + 1
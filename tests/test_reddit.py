@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+from parsing import FeedEntry
+
+START = datetime(2026, 1, 1)
+
+def post(sub, n, minutes, title='Free game'):
+    link = f"https://www.reddit.com/r/{sub}/comments/{sub}{n}/"
+    return FeedEntry(f"t3_{sub}{n}", f"{title} {sub} {n}", link, START + timedelta(minutes=minutes))
+
+def atom(posts):
+    """Лента Atom от новых к старым"""
+    entries = ''.join(
+        f"<entry><id>{p.id}</id><title>{p.title}</title>"
+        f"<link href=\"{p.link}\"/><updated>{p.published.isoformat()}Z</updated></entry>"
+        for p in posts
+    )
+    return f'<feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'.encode()
+
+def serve_reddit(bot, source, monkeypatch, group_feed, sub_feeds=None):
+    group_url = source.route('/group', [atom(group_feed)])
+    urls = {sub: source.route(f"/r/{sub}", [atom(feed)]) for sub, feed in (sub_feeds or {}).items()}
+    monkeypatch.setattr(bot, 'multireddit_url', lambda group: group_url)
+    monkeypatch.setattr(bot, 'subreddit_feed_url', lambda sub: urls[sub])
+
+def test_busy_sub_does_not_hide_quiet_sub(bot, source, monkeypatch):
+    group = ['Busy', 'Quiet']
+    monkeypatch.setitem(bot.reddit_state, 'groups', [group])
+    monkeypatch.setitem(bot.reddit_state, 'grouped_at', float('inf'))
+    mark = post('quiet', 0, 0)
+    bot.set_feed_mark('reddit:quiet', mark)
+    bot.set_feed_mark('reddit:busy', post('busy', 0, 0))
+
+    # Окно общей ленты целиком из постов Busy — новые посты Quiet в него не попали
+    busy = [post('busy', n, 1000 - n) for n in range(1, bot.REDDIT_WINDOW + 1)]
+    quiet = [post('quiet', 2, 20), post('quiet', 1, 10), mark]
+    serve_reddit(bot, source, monkeypatch, busy, {'quiet': quiet, 'busy': busy + [post('busy', 0, 0)]})
+
+    found = bot.poll_reddit_groups([group])
+
+    assert found == bot.REDDIT_WINDOW + 2
+    assert bot.game_exists(bot.canonical_key(quiet[0].link), bot.canonical_key(quiet[1].link))
+    assert bot.reddit_state['groups'] == [['Busy'], ['Quiet']]
+    assert bot.get_feed_marks('reddit:')['reddit:quiet'].entry_id == 't3_quiet2'
+
+def test_group_within_window_needs_no_fallback(bot, source, monkeypatch):
+    group = ['Alpha', 'Beta']
+    monkeypatch.setitem(bot.reddit_state, 'groups', [group])
+    monkeypatch.setitem(bot.reddit_state, 'grouped_at', float('inf'))
+    bot.set_feed_mark('reddit:alpha', post('alpha', 0, 0))
+    bot.set_feed_mark('reddit:beta', post('beta', 0, 0))
+    serve_reddit(bot, source, monkeypatch, [
+        post('alpha', 1, 30), post('beta', 1, 20), post('alpha', 0, 0), post('beta', 0, 0)
+    ])
+
+    assert bot.poll_reddit_groups([group]) == 2
+    assert bot.reddit_state['groups'] == [group]
+
+def test_per_sub_counts_are_persisted(bot, source, monkeypatch):
+    bot.set_feed_mark('reddit:alpha', post('alpha', 0, 0))
+    serve_reddit(bot, source, monkeypatch, [post('alpha', 2, 20), post('alpha', 1, 10), post('alpha', 0, 0)])
+
+    with bot.unit_of_work():
+        bot.check_reddit_group('Alpha')
+
+    stats = bot.get_statistics(1)
+    assert stats['by_feed'] == {'reddit:alpha': 2}
+    assert stats['by_source']['reddit']['games'] == 2
+    assert stats['total_games'] == 2
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+def test_api_search_clamps_limit(bot):
+    for n in range(3):
+        bot.add_game(f"game-{n}", f"Portal {n}", f"https://example.com/{n}", 'reddit')
+    client = bot.app.test_client()
+
+    for limit, expected in (('0', 1), ('-5', 1), ('2', 2), ('1000', 3)):
+        response = client.get(f"/api/search?q=portal&limit={limit}")
+        assert response.status_code == 200
+        assert len(response.get_json()['results']) == expected
+
+def test_search_command_escapes_html(bot, monkeypatch):
+    bot.add_game('game-xss', 'Tom & Jerry <b>', 'https://example.com/?a=1&b=2', 'reddit')
+    sent = []
+    monkeypatch.setattr(bot, 'send_telegram', lambda text, *args, **kwargs: sent.append(text))
+
+    bot.handle_command('/search tom <i>', bot.CHAT_ID)
+    bot.handle_command('/search jerry', bot.CHAT_ID)
+
+    assert '&lt;i&gt;' in sent[0] and '<i>' not in sent[0]
+    assert 'Tom &amp; Jerry &lt;b&gt;' in sent[1]
+    assert 'a=1&amp;b=2' in sent[1]
+
+def insert_game(bot, n, title, source='reddit', platform='steam', days_ago=0):
+    with bot.engine.begin() as conn:
+        return conn.execute(bot.Game.__table__.insert().values(
+            item_id=f"game-{n}", item_key=bot.item_key(f"game-{n}"), title=title,
+            link=f"https://example.com/{n}", source=source, platform=platform,
+            found_at=datetime.utcnow() - timedelta(days=days_ago)
+        )).inserted_primary_key[0]
+
+def titles(games):
+    return [game['title'] for game in games]
+
+def test_prefix_matching_on_every_word(bot):
+    assert bot.SEARCH_BACKEND == 'fts5'
+    insert_game(bot, 1, 'Portal 2')
+    insert_game(bot, 2, 'Portal Knights')
+    insert_game(bot, 3, 'Knights of Honor')
+
+    assert sorted(titles(bot.search_games('port'))) == ['Portal 2', 'Portal Knights']
+    assert titles(bot.search_games('port kni')) == ['Portal Knights']
+    assert titles(bot.search_games('knight')) != []
+    assert bot.search_games('ortal') == []
+    assert bot.search_games('!!!') == []
+
+def test_source_platform_and_date_filters(bot):
+    insert_game(bot, 1, 'Free Racer', source='reddit', platform='steam', days_ago=10)
+    insert_game(bot, 2, 'Free Racer Turbo', source='epic', platform='epic', days_ago=3)
+    insert_game(bot, 3, 'Free Racer Drift', source='reddit', platform='gog', days_ago=0)
+    week_ago = datetime.utcnow() - timedelta(days=7)
+
+    assert titles(bot.search_games('racer', source='epic')) == ['Free Racer Turbo']
+    assert titles(bot.search_games('racer', platform='gog')) == ['Free Racer Drift']
+    assert sorted(titles(bot.search_games('racer', since=week_ago))) == ['Free Racer Drift', 'Free Racer Turbo']
+    assert titles(bot.search_games('racer', until=week_ago)) == ['Free Racer']
+    assert titles(bot.search_games('racer', source='reddit', since=week_ago)) == ['Free Racer Drift']
+
+def test_closer_title_ranks_first_then_newest(bot):
+    insert_game(bot, 1, 'Celeste Farewell Deluxe Soundtrack Bundle', days_ago=0)
+    insert_game(bot, 2, 'Celeste', days_ago=5)
+    insert_game(bot, 3, 'Celeste', days_ago=1)
+
+    games = bot.search_games('celeste')
+
+    assert titles(games) == ['Celeste', 'Celeste', 'Celeste Farewell Deluxe Soundtrack Bundle']
+    assert games[0]['found_at'] > games[1]['found_at']
+
+def test_index_follows_inserts_updates_and_deletes(bot):
+    bot.add_game('game-1', 'Hollow Knight', 'https://example.com/1', 'reddit')
+    game_id = insert_game(bot, 2, 'Hades')
+    assert titles(bot.search_games('hollow')) == ['Hollow Knight']
+    assert titles(bot.search_games('hades')) == ['Hades']
+
+    with bot.engine.begin() as conn:
+        conn.execute(bot.Game.__table__.update().where(bot.Game.id == game_id).values(title='Hades II'))
+        conn.execute(bot.Game.__table__.delete().where(bot.Game.item_id == 'game-1'))
+
+    assert bot.search_games('hollow') == []
+    assert titles(bot.search_games('hades ii')) == ['Hades II']
+    assert bot.clear_database()
+    assert bot.search_games('hades') == []
+
+def test_search_command_needs_exact_name(bot, monkeypatch):
+    insert_game(bot, 1, 'Portal 2')
+    sent = []
+    monkeypatch.setattr(bot, 'send_telegram', lambda text, *args, **kwargs: sent.append(text))
+
+    bot.handle_command('/searchfoo portal', bot.CHAT_ID)
+    assert not any('ПОИСК' in text or 'Использование' in text for text in sent)
+
+    bot.handle_command('/search portal platform:steam', bot.CHAT_ID)
+    assert 'Portal 2' in sent[-1]
+    bot.handle_command('/search portal source:epic', bot.CHAT_ID)
+    assert 'ничего не найдено' in sent[-1]
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+def test_concurrent_runs_share_one_call(bot):
+    flight = bot.SingleFlight('test_shared', lease_seconds=30)
+    calls = []
+    started = threading.Event()
+
+    def work():
+        calls.append(1)
+        started.set()
+        time.sleep(0.3)
+        return 'done'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.run(work)))
+    leader.start()
+    started.wait(5)
+    results.append(flight.run(work))
+    leader.join()
+
+    assert calls == [1]
+    assert results == ['done', 'done']
+    assert flight.joined == 1
+
+def test_wait_for_held_lease_is_bounded(bot):
+    assert bot.acquire_lease('test_held', 60, holder='other-process')
+    flight = bot.SingleFlight('test_held', lease_seconds=60, wait_seconds=1)
+
+    started = time.monotonic()
+    with pytest.raises(bot.LeaseTimeout):
+        flight.run(lambda: 'never')
+    assert time.monotonic() - started < 5
+
+def test_lease_errors_are_not_treated_as_held(bot, monkeypatch):
+    def broken(*args):
+        raise RuntimeError('database is down')
+
+    monkeypatch.setattr(bot, '_acquire_lease', broken)
+    flight = bot.SingleFlight('test_broken', lease_seconds=60)
+
+    started = time.monotonic()
+    with pytest.raises(RuntimeError):
+        flight.run(lambda: 'never')
+    assert time.monotonic() - started < 5
+
+def test_expired_lease_is_taken_over(bot):
+    assert bot.acquire_lease('test_expired', 0, holder='crashed-process')
+    time.sleep(0.01)
+    flight = bot.SingleFlight('test_expired', lease_seconds=60, wait_seconds=5)
+
+    assert flight.run(lambda: 'ok') == 'ok'
+    assert bot.get_lease('test_expired').holder is None
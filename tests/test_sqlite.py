@@ -0,0 +1,36 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+def test_read_pool_is_read_only(bot):
+    with bot.read_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM games")).scalar() == 0
+        with pytest.raises(OperationalError):
+            conn.execute(text("DELETE FROM games"))
+
+def test_read_connection_falls_back_without_wal_files(bot, monkeypatch):
+    connect = sqlite3.connect
+
+    class Unopenable:
+        def execute(self, *args):
+            raise sqlite3.OperationalError('unable to open database file')
+
+        def close(self):
+            pass
+
+    def fake_connect(database, *args, uri=False, **kwargs):
+        if uri:
+            return Unopenable()
+        return connect(database, *args, **kwargs)
+
+    monkeypatch.setattr(sqlite3, 'connect', fake_connect)
+
+    connection = bot._sqlite_read_connection()
+    try:
+        assert connection.execute("SELECT count(*) FROM games").fetchone() == (0,)
+        with pytest.raises(sqlite3.OperationalError):
+            connection.execute("DELETE FROM games")
+    finally:
+        connection.close()
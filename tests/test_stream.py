@@ -0,0 +1,96 @@
+import json
+from datetime import datetime
+
+def insert_games(bot, first, count):
+    """Игры мимо брокера — как их пишет отдельный процесс воркера"""
+    with bot.engine.begin() as conn:
+        conn.execute(bot.Game.__table__.insert(), [{
+            'item_id': f"game-{n}",
+            'item_key': bot.item_key(f"game-{n}"),
+            'title': f"Game {n}",
+            'link': f"https://example.com/{n}",
+            'source': 'reddit',
+            'platform': 'steam',
+            'found_at': datetime.utcnow()
+        } for n in range(first, first + count)])
+
+def open_stream(bot, query=''):
+    response = bot.app.test_client().get(f"/api/stream{query}", buffered=False)
+    return response, iter(response.response)
+
+def read_events(chunks, count):
+    events = []
+    while len(events) < count:
+        chunk = next(chunks)
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        for line in chunk.splitlines():
+            if line.startswith('data: '):
+                events.append(json.loads(line[len('data: '):]))
+    return events
+
+def test_resume_replays_more_than_one_batch(bot):
+    insert_games(bot, 0, 1203)
+
+    response, chunks = open_stream(bot, '?last_event_id=0')
+    events = read_events(chunks, 1203)
+    response.close()
+
+    ids = [event['id'] for event in events]
+    assert ids == sorted(ids) and len(set(ids)) == 1203
+
+def test_resume_starts_after_last_event_id(bot):
+    insert_games(bot, 0, 10)
+    last_id = bot.last_game_id()
+
+    response, chunks = open_stream(bot, f"?last_event_id={last_id - 3}")
+    events = read_events(chunks, 3)
+    response.close()
+
+    assert [event['id'] for event in events] == [last_id - 2, last_id - 1, last_id]
+
+def test_new_client_gets_only_new_games(bot):
+    insert_games(bot, 0, 5)
+
+    response, chunks = open_stream(bot)
+    next(chunks)
+    bot.add_game('fresh', 'Fresh game', 'https://example.com/fresh', 'steamdb')
+    events = read_events(chunks, 1)
+    response.close()
+
+    assert [event['title'] for event in events] == ['Fresh game']
+
+def test_games_from_other_processes_arrive_via_shared_poller(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'SSE_HEARTBEAT', 0.2)
+    queries = []
+    games_since = bot.games_since
+    monkeypatch.setattr(bot, 'games_since', lambda last_id: queries.append(last_id) or games_since(last_id))
+
+    streams = [open_stream(bot) for _ in range(3)]
+    for response, chunks in streams:
+        # retry, затем догонялка из БД и пинг
+        next(chunks), next(chunks)
+    # Отметка опроса — на текущую последнюю игру
+    bot.stream_poller.poll()
+    insert_games(bot, 100, 2)
+    queries.clear()
+    bot.stream_poller.poll()
+
+    for response, chunks in streams:
+        assert [event['title'] for event in read_events(chunks, 2)] == ['Game 100', 'Game 101']
+        response.close()
+    # Один запрос на все подписки, клиенты в БД не ходят
+    assert len(queries) == 1
+    assert bot.game_broker.subscriber_count() == 0
+
+def test_poller_does_not_repeat_local_games(bot):
+    response, chunks = open_stream(bot)
+    next(chunks)
+    bot.stream_poller.poll()
+    published = bot.game_broker.published
+    bot.add_game('fresh', 'Fresh game', 'https://example.com/fresh', 'steamdb')
+    bot.stream_poller.poll()
+    events = read_events(chunks, 1)
+    response.close()
+
+    assert [event['title'] for event in events] == ['Fresh game']
+    assert bot.game_broker.published == published + 1
@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+def games(bot):
+    with bot.engine.connect() as conn:
+        return [row.item_id for row in conn.execute(bot.Game.__table__.select().order_by(bot.Game.id))]
+
+def commits(bot):
+    return bot.db_metrics['commits']
+
+def test_writes_commit_once_at_the_end(bot):
+    before = commits(bot)
+    with bot.unit_of_work():
+        bot.add_game('a', 'A', 'https://example.com/a', 'reddit')
+        bot.add_game('b', 'B', 'https://example.com/b', 'reddit')
+        bot.add_statistics('reddit', 2, 1)
+        assert games(bot) == []
+
+    assert games(bot) == ['a', 'b']
+    assert commits(bot) == before + 1
+
+def test_read_only_work_is_not_counted_as_commit(bot):
+    bot.get_user_settings(bot.CHAT_ID)
+    before = commits(bot)
+
+    with bot.unit_of_work():
+        bot.get_user_settings(bot.CHAT_ID)
+        bot.get_total_games()
+
+    assert commits(bot) == before
+
+def test_error_rolls_back_everything(bot):
+    called = []
+
+    with pytest.raises(RuntimeError):
+        with bot.unit_of_work():
+            bot.add_game('a', 'A', 'https://example.com/a', 'reddit')
+            bot.on_commit(lambda: called.append('commit'))
+            raise RuntimeError('boom')
+
+    assert games(bot) == [] and called == []
+
+def test_failed_write_rolls_back_only_its_savepoint(bot):
+    with bot.unit_of_work():
+        bot.add_game('a', 'A', 'https://example.com/a', 'reddit')
+        with pytest.raises(RuntimeError):
+            with bot.db_session(write=True) as session:
+                session.add(bot.Game(item_id='b', item_key=bot.item_key('b'), title='B',
+                                     link='https://example.com/b', source='reddit'))
+                session.flush()
+                raise RuntimeError('boom')
+        bot.add_game('c', 'C', 'https://example.com/c', 'reddit')
+
+    assert games(bot) == ['a', 'c']
+
+def test_callbacks_run_after_commit(bot):
+    seen = []
+
+    with bot.unit_of_work():
+        bot.add_game('a', 'A', 'https://example.com/a', 'reddit')
+        bot.on_commit(lambda: seen.append(games(bot)))
+        assert seen == []
+
+    assert seen == [['a']]
+    # Вне единицы работы — сразу
+    bot.on_commit(lambda: seen.append('now'))
+    assert seen[-1] == 'now'
+
+def test_callback_error_does_not_break_commit(bot):
+    with bot.unit_of_work():
+        bot.add_game('a', 'A', 'https://example.com/a', 'reddit')
+        bot.on_commit(lambda: 1 / 0)
+
+    assert games(bot) == ['a']
+
+@pytest.mark.parametrize('in_unit_of_work', [True, False])
+def test_concurrent_first_settings(bot, in_unit_of_work):
+    start = threading.Barrier(8)
+    errors = []
+
+    def first_update():
+        start.wait()
+        try:
+            if in_unit_of_work:
+                with bot.unit_of_work():
+                    bot.get_user_settings('42')
+            else:
+                bot.get_user_settings('42')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=first_update) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with bot.engine.connect() as conn:
+        assert conn.execute(bot.UserSettings.__table__.select()).all()[0].user_id == '42'
+        assert len(conn.execute(bot.UserSettings.__table__.select()).all()) == 1
@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+@pytest.fixture
+def sent(bot, monkeypatch):
+    messages = []
+    monkeypatch.setattr(bot, 'deliver_telegram',
+                        lambda text, chat_id, reply_markup=None: messages.append(text) or (True, None, None))
+    return messages
+
+def message(bot, update_id, text):
+    return {'update_id': update_id, 'message': {'message_id': update_id, 'chat': {'id': int(bot.CHAT_ID)}, 'text': text}}
+
+def drain(bot):
+    bot.check_executor.submit(lambda: None).result(timeout=10)
+
+def test_broken_fragment_is_escaped_before_coalescing(bot):
+    replies = [("<b>Статистика</b>", None), ("Игра <3 & друзья", None), ('<a href="https://x.y/?a=1&amp;b=2">ссылка</a>', None)]
+
+    [(text, markup)] = bot.coalesce_messages(replies)
+
+    assert text == '<b>Статистика</b>\n\nИгра &lt;3 &amp; друзья\n\n<a href="https://x.y/?a=1&amp;b=2">ссылка</a>'
+    assert bot.telegram_html("<b>не закрыт") == "&lt;b&gt;не закрыт"
+    assert bot.telegram_html("<br>") == "&lt;br&gt;"
+
+def test_check_does_not_block_batch(bot, sent, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_check(max_age=0):
+        started.set()
+        release.wait(10)
+        return 0
+
+    monkeypatch.setattr(bot, 'run_check', slow_check)
+    try:
+        assert bot.process_updates([message(bot, 1, '/check'), message(bot, 2, '/start')]) == 3
+        # Пачка отправила свои ответы, пока проверка ещё идёт
+        assert started.wait(5)
+        assert any('МЕГА-БОТ' in text for text in sent)
+    finally:
+        release.set()
+    drain(bot)
+
+    assert sent[-1] == "ℹ️ Новых раздач пока нет"
+    assert bot.load_update_offset() == 3
+
+def test_retry_sends_each_reply_once(bot, sent, monkeypatch):
+    checks = []
+    monkeypatch.setattr(bot, 'run_check', lambda max_age=0: checks.append(max_age) or 0)
+    save = bot.save_update_offset
+    failures = iter([RuntimeError('database is locked')])
+
+    def flaky_save(update_id):
+        error = next(failures, None)
+        if error:
+            raise error
+        save(update_id)
+
+    monkeypatch.setattr(bot, 'save_update_offset', flaky_save)
+    updates = [message(bot, 1, '/start'), message(bot, 2, '/check'), message(bot, 3, '/start')]
+
+    assert bot.process_updates_safely(updates) == 4
+    drain(bot)
+
+    assert sum('МЕГА-БОТ' in text for text in sent) == 2
+    assert sent.count("🔍 Запускаю проверку...") == 1
+    assert len(checks) == 1
+    assert bot.load_update_offset() == 4
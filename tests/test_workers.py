@@ -0,0 +1,142 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+from shard_bench import worker
+
+LEASE_SECONDS = 2
+
+@pytest.fixture
+def jobs_db(bot, tmp_path, monkeypatch):
+    """Временная SQLite для процессов-воркеров: url и движок для проверок"""
+    url = f"sqlite:///{tmp_path / 'jobs.db'}"
+    engine = create_engine(url)
+    bot.Base.metadata.create_all(engine)
+    # Дочерние процессы читают окружение при импорте main
+    monkeypatch.setenv('JOB_LEASE_SECONDS', str(LEASE_SECONDS))
+    yield url, engine
+    engine.dispose()
+
+def add_jobs(bot, engine, count, **values):
+    with engine.begin() as conn:
+        conn.execute(bot.PollJob.__table__.insert(), [dict({
+            'source': 'bench',
+            'target': f"https://example.com/feed/{i}",
+            'interval': 3600,
+            'enabled': True,
+            'next_run_at': datetime.utcnow(),
+            'runs': 0
+        }, **values) for i in range(count)])
+
+def job_rows(bot, engine):
+    with engine.connect() as conn:
+        return conn.execute(bot.PollJob.__table__.select().order_by(bot.PollJob.id)).all()
+
+def wait_for(read, ready, timeout=30):
+    """Последнее прочитанное значение, как только ready(value) истинно"""
+    deadline = time.monotonic() + timeout
+    value = read()
+    while not ready(value) and time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = read()
+    return value
+
+class Workers:
+    """Процессы-воркеры shard_bench на общей базе"""
+
+    def __init__(self, url):
+        self.url = url
+        self.ctx = mp.get_context('spawn')
+        self.stop = self.ctx.Event()
+        self.results = self.ctx.Queue()
+        self.processes = []
+
+    def start(self, count, job_seconds):
+        ready = self.ctx.Barrier(count + 1)
+        processes = [
+            self.ctx.Process(target=worker, args=(self.url, job_seconds, ready, self.stop, self.results), daemon=True)
+            for _ in range(count)
+        ]
+        for process in processes:
+            process.start()
+        ready.wait(timeout=60)
+        self.processes += processes
+        return processes
+
+    def collect(self, count, timeout=30):
+        done = []
+        deadline = time.monotonic() + timeout
+        while len(done) < count and time.monotonic() < deadline:
+            try:
+                done.append(self.results.get(timeout=0.2))
+            except queue.Empty:
+                continue
+        return done
+
+    def close(self):
+        # Event убитого воркера трогать нельзя: его блокировка могла остаться занятой
+        if any(process.is_alive() for process in self.processes):
+            self.stop.set()
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+
+@pytest.fixture
+def workers(jobs_db):
+    pools = []
+
+    def make():
+        pools.append(Workers(jobs_db[0]))
+        return pools[-1]
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+def test_each_job_runs_once_per_interval(bot, jobs_db, workers):
+    url, engine = jobs_db
+    add_jobs(bot, engine, 30)
+
+    pool = workers()
+    pool.start(2, job_seconds=0.02)
+    done = pool.collect(30)
+    # Повторный запуск проявился бы за это время
+    time.sleep(1)
+    done += pool.collect(1, timeout=0)
+
+    assert Counter(target for target, _ in done) == Counter(f"https://example.com/feed/{i}" for i in range(30))
+    assert len({pid for _, pid in done}) == 2
+    for job in job_rows(bot, engine):
+        assert job.runs == 1 and job.lease_holder is None and job.last_error is None
+        assert job.next_run_at == job.last_run_at + timedelta(seconds=3600)
+
+def test_job_of_dead_worker_is_taken_over_after_lease(bot, jobs_db, workers):
+    url, engine = jobs_db
+    add_jobs(bot, engine, 1)
+
+    # Первый воркер берёт задание и умирает посреди него. Свои Event и Queue:
+    # убитый процесс может унести с собой их блокировки
+    [dead] = workers().start(1, job_seconds=60)
+    held = wait_for(lambda: job_rows(bot, engine)[0], lambda job: job.lease_holder)
+    assert held.lease_holder.endswith(f":{dead.pid}")
+    dead.kill()
+    dead.join()
+    expires = job_rows(bot, engine)[0].lease_expires_at
+
+    pool = workers()
+    [alive] = pool.start(1, job_seconds=0.02)
+    [(target, pid)] = pool.collect(1, timeout=LEASE_SECONDS * 5)
+
+    assert pid == alive.pid
+    # Результат приходит до release_job — ждём снятия аренды
+    job = wait_for(lambda: job_rows(bot, engine)[0], lambda job: job.runs)
+    assert job.runs == 1 and job.lease_holder is None
+    # Живая аренда не перехвачена: запуск — только после её истечения
+    assert job.last_run_at >= expires
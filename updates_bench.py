@@ -0,0 +1,143 @@
+"""Пропускная способность приёма апдейтов: /webhook против long polling getUpdates
+
+Оба режима обрабатывают один и тот же корпус апдейтов (loadtest.synthetic_corpus)
+как можно быстрее, Telegram — локальная заглушка. Вебхук получает апдейты
+параллельными POST, polling забирает их пачками по UPDATES_LIMIT. Каждый режим —
+отдельный процесс на своей временной базе.
+
+Пример:
+    python updates_bench.py --count 2000 --concurrency 8 --telegram-latency 0.02
+"""
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from fake_telegram import FakeTelegram
+from loadtest import CHAT_ID, count_queries, start_app, synthetic_corpus
+
+def load_bot(fake, batch):
+    """Импортирует бота с заглушкой Telegram и временной базой"""
+    os.environ.update({
+        'TELEGRAM_API': fake.url,
+        'TOKEN': 'bench',
+        'CHAT_ID': CHAT_ID,
+        'TRACE_ENABLED': '0',
+        'UPDATES_LIMIT': str(batch),
+        'UPDATES_TIMEOUT': '1',
+        'DATABASE_URL': f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    })
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    import main
+    sys.stdout = stdout
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    return main
+
+def run_webhook(main, corpus, args):
+    """Апдейты параллельными POST в /webhook"""
+    server = start_app(main, 0)
+    url = f"http://127.0.0.1:{server.server_port}/webhook"
+    http = requests.Session()
+    http.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+    errors = 0
+
+    def send(update):
+        nonlocal errors
+        try:
+            ok = http.post(url, json=update, timeout=30).status_code == 200
+        except Exception:
+            ok = False
+        if not ok:
+            errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(send, corpus))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    return elapsed, errors
+
+def run_polling(main, fake, corpus, args):
+    """Апдейты из очереди заглушки через getUpdates"""
+    stop = threading.Event()
+    fake.push_updates(corpus)
+
+    started = time.perf_counter()
+    poller = threading.Thread(target=main.run_updates, args=(stop,), name='updates', daemon=True)
+    poller.start()
+    while main.updates_metrics['updates'] < len(corpus):
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    poller.join()
+    return elapsed, main.updates_metrics['errors']
+
+def run_mode(mode, args, results):
+    """Один режим: время на корпус, вызовы Telegram и SQL на апдейт"""
+    fake = FakeTelegram(latency=args.telegram_latency).start()
+    main = load_bot(fake, args.batch)
+    corpus = synthetic_corpus(main, args.count)
+    # Настройки чата создаём заранее: гонка первого создания — не предмет замера
+    main.get_user_settings(CHAT_ID)
+    counter = count_queries(main)
+
+    calls_before = fake.calls.copy()
+    if mode == 'webhook':
+        elapsed, errors = run_webhook(main, corpus, args)
+    else:
+        elapsed, errors = run_polling(main, fake, corpus, args)
+    calls = fake.calls - calls_before
+    fake.stop()
+
+    total = len(corpus)
+    results.put({
+        'mode': mode,
+        'updates_per_s': round(total / elapsed, 1),
+        'seconds': round(elapsed, 2),
+        'send_per_update': round(calls['sendMessage'] / total, 3),
+        'edit_per_update': round(calls['editMessageText'] / total, 3),
+        'answer_per_update': round(calls['answerCallbackQuery'] / total, 3),
+        'get_updates_calls': calls['getUpdates'],
+        'db_queries_per_update': round(counter['queries'] / total, 2),
+        'errors': errors
+    })
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='Приём апдейтов: /webhook против getUpdates')
+    parser.add_argument('--count', type=int, default=2000, help='апдейтов в корпусе')
+    parser.add_argument('--concurrency', type=int, default=8, help='параллельных POST в /webhook')
+    parser.add_argument('--batch', type=int, default=100, help='UPDATES_LIMIT для getUpdates')
+    parser.add_argument('--telegram-latency', type=float, default=0.0, help='задержка заглушки Telegram, сек')
+    parser.add_argument('--json', action='store_true', help='отчёт в JSON')
+    args = parser.parse_args(argv)
+
+    ctx = mp.get_context('spawn')
+    reports = []
+    for mode in ('webhook', 'polling'):
+        results = ctx.Queue()
+        process = ctx.Process(target=run_mode, args=(mode, args, results))
+        process.start()
+        reports.append(results.get())
+        process.join()
+
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False))
+        return
+
+    print("=" * 50)
+    print(f"📥 Приём {args.count} апдейтов, Telegram +{args.telegram_latency * 1000:g} мс")
+    print("=" * 50)
+    for key in reports[0]:
+        print(f"{key:22} {reports[0][key]!s:>12} {reports[1][key]!s:>12}")
+    print("=" * 50)
+
+if __name__ == '__main__':
+    main_cli()